@@ -1,21 +1,82 @@
+import os
+import hashlib
+import tempfile
 import numpy as np
-from mpl_toolkits.mplot3d import Axes3D
-import seaborn as sns
-from scipy.interpolate import griddata
-from scipy.interpolate import griddata
-import sympy as sp
-import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
-from matplotlib.colors import LinearSegmentedColormap, TwoSlopeNorm, BoundaryNorm, ListedColormap
 
-A_sym, L_sym = sp.symbols('A L', real=True, positive=True)
+# sympy, scipy and matplotlib are imported where they are first needed: the symbolic expression on
+# first use, griddata when scattered data is interpolated, pyplot when a figure is drawn.
+_SYMBOLIC = {}
+# The betterness expression in A (tile count) and L (layers). z_expr is parsed from this text, and the
+# surface cache is keyed on it, so a cached default surface is found without importing sympy.
+Z_EXPR_TEXT = "sqrt(A*L) / (sqrt(A) + L**Rational(3, 2)/2)"
+
+def _symbolic():
+    """A_sym, L_sym, the betterness expression z_expr and its NumPy form z_func, built on first use."""
+    if not _SYMBOLIC:
+        import sympy as sp
+        A_sym, L_sym = sp.symbols('A L', real=True, positive=True)
+        z_expr = sp.sympify(Z_EXPR_TEXT, locals={'A': A_sym, 'L': L_sym})
+        _SYMBOLIC.update(A_sym=A_sym, L_sym=L_sym, z_expr=z_expr, z_func=sp.lambdify((A_sym, L_sym), z_expr, 'numpy'))
+    return _SYMBOLIC
 
-z_expr = sp.sqrt(A_sym * L_sym) / (sp.sqrt(A_sym) + (L_sym**(sp.Rational(3,2)) / 2))
-import matplotlib.pyplot as plt
+def __getattr__(name):
+    if name in ('A_sym', 'L_sym', 'z_expr', 'z_func'):
+        return _symbolic()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 TILES = 1000000
 LAYER_MAX = 800
+BIN_THRESHOLD = 20000   # scattered inputs larger than this are binned instead of interpolated in 'auto' mode
+BIN_CHUNK = 2**22       # samples binned per pass
+
+def bin_scattered(x, y, z, nx, ny, statistic='mean', fill_empty=True, chunk_size=BIN_CHUNK):
+    """
+    Grid scattered samples by binning them into nx x ny cells.
+
+    Samples are processed chunk_size at a time; each cell keeps the mean,
+    min or max of the z values that fall in it. With fill_empty, cells
+    with no samples are interpolated linearly from the centers of the
+    filled cells, so griddata only sees one point per cell instead of
+    every sample.
+
+    Returns:
+        X, Y, Z as (ny, nx) arrays of cell centers and cell values
+    """
+    x, y, z = np.asarray(x).ravel(), np.asarray(y).ravel(), np.asarray(z, dtype=float).ravel()
+    x_min, x_max, y_min, y_max = x.min(), x.max(), y.min(), y.max()
+    x_step = (x_max - x_min) / nx or 1.0
+    y_step = (y_max - y_min) / ny or 1.0
+    counts = np.zeros(nx * ny)
+    if statistic == 'mean':
+        values = np.zeros(nx * ny)
+    elif statistic == 'min':
+        values = np.full(nx * ny, np.inf)
+    elif statistic == 'max':
+        values = np.full(nx * ny, -np.inf)
+    else:
+        raise ValueError(f"statistic must be 'mean', 'min' or 'max', got {statistic!r}")
+    for start in range(0, len(z), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        ix = np.minimum(((x[chunk] - x_min) / x_step).astype(np.int64), nx - 1)
+        iy = np.minimum(((y[chunk] - y_min) / y_step).astype(np.int64), ny - 1)
+        cell = iy * nx + ix
+        counts += np.bincount(cell, minlength=nx * ny)
+        if statistic == 'mean':
+            values += np.bincount(cell, z[chunk], minlength=nx * ny)
+        elif statistic == 'min':
+            np.minimum.at(values, cell, z[chunk])
+        else:
+            np.maximum.at(values, cell, z[chunk])
+    filled = counts > 0
+    Z = np.full(nx * ny, np.nan)
+    Z[filled] = values[filled] / counts[filled] if statistic == 'mean' else values[filled]
+    X, Y = np.meshgrid(x_min + (np.arange(nx) + 0.5) * x_step, y_min + (np.arange(ny) + 0.5) * y_step)
+    Z = Z.reshape(ny, nx)
+    if fill_empty and filled.sum() >= 3 and not filled.all():
+        from scipy.interpolate import griddata
+        filled = filled.reshape(ny, nx)
+        Z[~filled] = griddata((X[filled], Y[filled]), Z[filled], (X[~filled], Y[~filled]), method='linear')
+    return X, Y, Z
 
 class Plot3DFramework:
     """Framework for creating 3D plots and 2D heatmaps from XYZ data."""
@@ -38,6 +99,28 @@ class Plot3DFramework:
         self.x_data = x_data
         self.y_data = y_data
         self.z_data = z_data
+
+    def _gridded(self, n_points, mode='auto', statistic='mean'):
+        """
+        Return (X, Y, Z) on a grid. Gridded data is passed through; 1-D
+        scattered data is cubic-interpolated onto an n_points x n_points
+        grid (mode='interpolate') or binned with bin_scattered (mode='bin').
+        mode='auto' bins once there are more than BIN_THRESHOLD samples.
+        """
+        if self.x_data.ndim != 1:
+            return self.x_data, self.y_data, self.z_data
+        if mode == 'auto':
+            mode = 'bin' if len(self.z_data) > BIN_THRESHOLD else 'interpolate'
+        if mode == 'bin':
+            return bin_scattered(self.x_data, self.y_data, self.z_data, n_points, n_points, statistic)
+        if mode != 'interpolate':
+            raise ValueError(f"mode must be 'auto', 'bin' or 'interpolate', got {mode!r}")
+        xi = np.linspace(self.x_data.min(), self.x_data.max(), n_points)
+        yi = np.linspace(self.y_data.min(), self.y_data.max(), n_points)
+        X, Y = np.meshgrid(xi, yi)
+        from scipy.interpolate import griddata
+        Z = griddata((self.x_data, self.y_data), self.z_data, (X, Y), method='cubic')
+        return X, Y, Z
     
     def plot_3d_scatter(self, title="3D Scatter Plot", xlabel="X", ylabel="Y", zlabel="Z", 
                        color='b', marker='o', figsize=(10, 8)):
@@ -51,6 +134,7 @@ class Plot3DFramework:
             marker: Marker style
             figsize: Figure size tuple
         """
+        import matplotlib.pyplot as plt
         fig = plt.figure(figsize=figsize)
         ax = fig.add_subplot(111, projection='3d')
         
@@ -64,7 +148,7 @@ class Plot3DFramework:
         return fig, ax
     
     def plot_3d_surface(self, title="3D Surface Plot", xlabel="X", ylabel="Y", 
-                       zlabel="Z", cmap='viridis', figsize=(10, 8)):
+                       zlabel="Z", cmap='viridis', figsize=(10, 8), mode='auto', statistic='mean'):
         """
         Create a rotatable 3D surface plot.
         Requires gridded data or will grid the data automatically.
@@ -74,18 +158,15 @@ class Plot3DFramework:
             xlabel, ylabel, zlabel: Axis labels
             cmap: Colormap for surface
             figsize: Figure size tuple
+            mode: How scattered data is gridded: 'auto', 'bin' or 'interpolate'
+            statistic: Per-cell 'mean', 'min' or 'max' when binning
         """
+        import matplotlib.pyplot as plt
         fig = plt.figure(figsize=figsize)
         ax = fig.add_subplot(111, projection='3d')
         
         # If data is not gridded, create a grid
-        if self.x_data.ndim == 1:
-            xi = np.linspace(self.x_data.min(), self.x_data.max(), 50)
-            yi = np.linspace(self.y_data.min(), self.y_data.max(), 50)
-            X, Y = np.meshgrid(xi, yi)
-            Z = griddata((self.x_data, self.y_data), self.z_data, (X, Y), method='cubic')
-        else:
-            X, Y, Z = self.x_data, self.y_data, self.z_data
+        X, Y, Z = self._gridded(50, mode, statistic)
         
         surf = ax.plot_surface(X, Y, Z, cmap=cmap)
         ax.set_xlabel(xlabel)
@@ -98,7 +179,8 @@ class Plot3DFramework:
         return fig, ax
     
     def plot_2d_heatmap(self, title="2D Heatmap", xlabel="Area", ylabel="Number of Layers", 
-                       cmap='viridis', figsize=(10, 8), interpolation='nearest', plot_lines=True, norm=None):
+                       cmap='viridis', figsize=(10, 8), interpolation='nearest', plot_lines=True, norm=None,
+                       mode='auto', statistic='mean', resolution=100):
         """
         Create a 2D heatmap where Z values represent heat intensity.
         
@@ -108,16 +190,14 @@ class Plot3DFramework:
             cmap: Colormap for heatmap
             figsize: Figure size tuple
             interpolation: Interpolation method
+            mode: How scattered data is gridded: 'auto', 'bin' or 'interpolate'
+            statistic: Per-cell 'mean', 'min' or 'max' when binning
+            resolution: Grid cells per side for scattered data
         """
+        import matplotlib.pyplot as plt
         fig, ax = plt.subplots(figsize=figsize)
         
-        if self.x_data.ndim == 1:
-            xi = np.linspace(self.x_data.min(), self.x_data.max(), 100)
-            yi = np.linspace(self.y_data.min(), self.y_data.max(), 100)
-            X, Y = np.meshgrid(xi, yi)
-            Z = griddata((self.x_data, self.y_data), self.z_data, (X, Y), method='cubic')
-        else:
-            X, Y, Z = self.x_data, self.y_data, self.z_data
+        X, Y, Z = self._gridded(resolution, mode, statistic)
         
         im = ax.imshow(Z, extent=[X.min(), X.max(), Y.min(), Y.max()], 
                         origin='lower', cmap=cmap, aspect='auto', interpolation=interpolation, norm=norm)
@@ -151,10 +231,121 @@ class Plot3DFramework:
         plt.show()
         return fig, ax
 
-z_func = sp.lambdify((A_sym, L_sym), z_expr, 'numpy')
+SURFACE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".surface_cache")
+
+def _contour_cells(Z, level):
+    """Cells of a grid whose corners straddle level (or are not finite), grown by one cell."""
+    corners = np.stack([Z[:-1, :-1], Z[1:, :-1], Z[:-1, 1:], Z[1:, 1:]])
+    with np.errstate(invalid='ignore'):
+        flagged = (np.nanmin(corners, axis=0) < level) & (np.nanmax(corners, axis=0) >= level)
+    flagged |= ~np.isfinite(corners).all(axis=0)
+    grown = np.pad(flagged, 1)
+    return (grown[:-2, :-2] | grown[:-2, 1:-1] | grown[:-2, 2:] | grown[1:-1, :-2] | grown[1:-1, 1:-1]
+            | grown[1:-1, 2:] | grown[2:, :-2] | grown[2:, 1:-1] | grown[2:, 2:])
+
+def _expr_key(expr):
+    """Cache key text of an expression: Z_EXPR_TEXT for the default (given or not), else its srepr."""
+    if expr is None:
+        return Z_EXPR_TEXT
+    import sympy as sp
+    return Z_EXPR_TEXT if expr == _symbolic()['z_expr'] else sp.srepr(expr)
+
+def _fill_error_cells(Z, rtol):
+    """
+    Cells whose bilinear fill may be off by more than rtol (relative): the
+    midpoint error of linear interpolation is about 1/8 of the second
+    difference, taken here at each cell's worst corner along both axes.
+    """
+    d2 = np.zeros(Z.shape)
+    with np.errstate(invalid='ignore'):
+        d2[:, 1:-1] += np.abs(Z[:, :-2] - 2 * Z[:, 1:-1] + Z[:, 2:])
+        d2[1:-1] += np.abs(Z[:-2] - 2 * Z[1:-1] + Z[2:])
+        d2[:, [0, -1]] = d2[:, [1, -2]]
+        d2[[0, -1]] = d2[[1, -2]]
+        error = np.max(np.stack([d2[:-1, :-1], d2[1:, :-1], d2[:-1, 1:], d2[1:, 1:]]), axis=0) / 8
+        scale = np.min(np.abs(np.stack([Z[:-1, :-1], Z[1:, :-1], Z[:-1, 1:], Z[1:, 1:]])), axis=0)
+        return ~(error <= rtol * scale)
+
+def _refine_surface(func, a_range, l_range, coarse, depth, level, rtol):
+    """The refinement loop of evaluate_surface for a NumPy function func(A, L)."""
+    a_vals = np.linspace(a_range[0], a_range[1], coarse)
+    l_vals = np.linspace(l_range[0], l_range[1], coarse)
+    Z = np.asarray(func(*np.meshgrid(a_vals, l_vals)), dtype=float)
+    exact = np.ones(Z.shape, dtype=bool)
+    for _ in range(depth):
+        cells = _contour_cells(Z, level) | _fill_error_cells(Z, rtol)
+        n_l, n_a = Z.shape
+        a_vals = np.linspace(a_range[0], a_range[1], 2 * n_a - 1)
+        l_vals = np.linspace(l_range[0], l_range[1], 2 * n_l - 1)
+        fine = np.empty((2 * n_l - 1, 2 * n_a - 1))
+        fine[::2, ::2] = Z
+        fine[1::2, ::2] = (Z[:-1] + Z[1:]) / 2
+        fine[:, 1::2] = (fine[:, :-1:2] + fine[:, 2::2]) / 2
+        fine_exact = np.zeros(fine.shape, dtype=bool)
+        fine_exact[::2, ::2] = exact
+        # Every new point inside a flagged cell gets an exact value.
+        todo = np.zeros(fine.shape, dtype=bool)
+        rows, cols = np.nonzero(cells)
+        for dr in range(3):
+            for dc in range(3):
+                todo[2 * rows + dr, 2 * cols + dc] = True
+        todo &= ~fine_exact
+        rows, cols = np.nonzero(todo)
+        fine[rows, cols] = func(a_vals[cols], l_vals[rows])
+        fine_exact[rows, cols] = True
+        Z, exact = fine, fine_exact
+    return a_vals, l_vals, Z, exact
+
+def evaluate_surface(expr=None, a_range=(1, TILES), l_range=(1, LAYER_MAX), coarse=129, depth=4, level=1.0,
+                     rtol=1e-3, cache_dir=SURFACE_CACHE_DIR):
+    """
+    Evaluate expr(A, L) on a grid that is only fine near the Z=level contour.
+
+    The coarse x coarse grid is evaluated in full. Each refinement halves
+    the spacing: new points are evaluated exactly in cells the contour
+    crosses (and their neighbours) and in cells whose curvature puts the
+    bilinear fill's estimated error above rtol; the rest are filled in
+    bilinearly from the coarser grid. Only the contour's cells are
+    guaranteed exact; elsewhere the error bound is an estimate from second
+    differences, so sharp features narrower than a coarse cell can slip
+    through. The final grid has (coarse-1)*2**depth+1 points per side.
+    expr defaults to z_expr. Results are cached as .npz in cache_dir, keyed
+    by the expression, bounds, resolution and rtol; a cached default
+    surface loads without importing sympy.
+
+    Returns:
+        (A_vals, L_vals, Z, exact): axis values, the (len(L_vals), len(A_vals))
+        grid as used by meshgrid, and a mask of the exactly evaluated points
+    """
+    key = repr((_expr_key(expr), [float(v) for v in a_range], [float(v) for v in l_range], coarse, depth, float(level),
+                float(rtol)))
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest()[:16] + ".npz")
+        if os.path.exists(cache_path):
+            with np.load(cache_path) as cached:
+                return cached['A_vals'], cached['L_vals'], cached['Z'], cached['exact']
+
+    symbolic = _symbolic()
+    if expr is None or expr == symbolic['z_expr']:
+        func = symbolic['z_func']
+    else:
+        import sympy as sp
+        func = sp.lambdify((symbolic['A_sym'], symbolic['L_sym']), expr, 'numpy')
+    a_vals, l_vals, Z, exact = _refine_surface(func, a_range, l_range, coarse, depth, level, rtol)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written under a temporary name and renamed, so an interrupted run never leaves a truncated cache.
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False, suffix='.tmp') as f:
+            np.savez(f, A_vals=a_vals, L_vals=l_vals, Z=Z, exact=exact)
+            temp_path = f.name
+        os.replace(temp_path, cache_path)
+    return a_vals, l_vals, Z, exact
 
 def create_binary_red_green_cmap():
     """Create a binary red/green colormap with hard boundary."""
+    from matplotlib.colors import LinearSegmentedColormap
     colors = ['#ffcccb', '#90ee90']
     n_bins = 2  # Only 2 colors
     cmap = LinearSegmentedColormap.from_list('binary_red_green', colors, N=n_bins)
@@ -165,6 +356,7 @@ def create_red_gradient_green_cmap(n_green_bins=256):
     Create a colormap with constant light red below midpoint,
     and gradient from light to dark green above midpoint.
     """
+    from matplotlib.colors import ListedColormap
     red_color = np.array([1.0, 0.8, 0.8, 1.0])   
     light_green = np.array([0.56, 0.93, 0.56, 1.0])
     dark_green = np.array([0.0, 0.5, 0.0, 1.0])
@@ -174,10 +366,9 @@ def create_red_gradient_green_cmap(n_green_bins=256):
     return cmap
 
 if __name__ == "__main__":
-    A_vals = np.linspace(1, TILES, 1000)
-    L_vals = np.linspace(1, LAYER_MAX, 1000)
+    from matplotlib.colors import TwoSlopeNorm, BoundaryNorm
+    A_vals, L_vals, z, _ = evaluate_surface()
     A, L = np.meshgrid(A_vals, L_vals)
-    z = z_func(A, L)
     vmin = np.min(z)
     vmax = np.max(z)
 
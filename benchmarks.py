@@ -0,0 +1,280 @@
+import argparse
+import fnmatch
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+import htreevis
+from htreevis import Mesh3D, HTree3D
+
+# Tile counts from tiny to about a million; every size is a power of two so both topologies reach it exactly.
+SIZES = (8, 512, 2**15, 2**20)
+HISTORY_FILE = "benchmark_history.json"
+BASELINE_FILE = "benchmark_baseline.json"
+# Scalar find_distance calls per measurement, and pairs per vectorized find_distances call.
+SCALAR_PAIRS = 2000
+VECTOR_PAIRS = 2**18
+# A slowdown must also exceed this many interquartile ranges of the run-to-run spread.
+NOISE_IQRS = 3.0
+# Timed runs per measurement never drop below this, so the spread can be estimated.
+MIN_REPEAT = 3
+# Memory differences below this are noise, whatever the ratio.
+MIN_MEMORY_DELTA = 2**20
+
+
+def mesh_dims(n_tiles):
+    """(X,Y,Z) for a power-of-two tile count, spreading the bits over the axes X first."""
+    bits = int(n_tiles).bit_length() - 1
+    if n_tiles != 2**bits:
+        raise ValueError(f"Tile count must be a power of two, got {n_tiles}.")
+    return tuple(2 ** (bits // 3 + (axis < bits % 3)) for axis in range(3))
+
+
+def htree_blueprint(n_tiles):
+    """A blueprint with log2(n_tiles) levels that cycles X, Y, Z."""
+    bits = int(n_tiles).bit_length() - 1
+    if n_tiles != 2**bits:
+        raise ValueError(f"Tile count must be a power of two, got {n_tiles}.")
+    return ("012" * bits)[:bits]
+
+
+def _build(topology, n_tiles):
+    if topology == 'htree':
+        noc = HTree3D()
+        noc.gen_noc_layout(htree_blueprint(n_tiles))
+    else:
+        noc = Mesh3D()
+        noc.gen_noc_layout(mesh_dims(n_tiles), vectorized=True)
+    return noc
+
+
+def _generate(topology, n_tiles):
+    if topology == 'htree':
+        # Templates are cached per blueprint; clear them so every run builds from scratch.
+        htreevis._cached_template.cache_clear()
+        return lambda: _build(topology, n_tiles).segments()
+    return lambda: _build(topology, n_tiles)
+
+
+def _generate_loop(topology, n_tiles):
+    dims = mesh_dims(n_tiles)
+    return lambda: Mesh3D().gen_noc_layout(dims)
+
+
+def _find_distance(topology, n_tiles):
+    noc = _build(topology, n_tiles)
+    rng = np.random.default_rng(0)
+    pairs = [(noc.memory_node(a), noc.memory_node(b)) for a, b in rng.integers(0, n_tiles, (SCALAR_PAIRS, 2)).tolist()]
+    return lambda: [noc.find_distance(a, b) for a, b in pairs]
+
+
+def _find_distances(topology, n_tiles):
+    noc = _build(topology, n_tiles)
+    src, dst = np.random.default_rng(0).integers(0, n_tiles, (2, VECTOR_PAIRS))
+    return lambda: noc.find_distances(src, dst)
+
+
+def _metrics(topology, n_tiles):
+    noc = _build(topology, n_tiles)
+    return lambda: (noc.metrics(), noc.geometry_metrics())
+
+
+def _figure(topology, n_tiles):
+    noc = _build(topology, n_tiles)
+    return lambda: noc.create_plotly_figure()
+
+
+def _write_html(topology, n_tiles):
+    fig = _build(topology, n_tiles).create_plotly_figure()
+    # A fixed scratch directory, so repeated runs overwrite rather than accumulate output.
+    directory = os.path.join(tempfile.gettempdir(), "htree-bench")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{topology}-{n_tiles}.html")
+    # Warm the plotly.js cache and the shared bundle copy so only the figure is timed.
+    htreevis.write_html(fig, path)
+    return lambda: htreevis.write_html(fig, path)
+
+
+# name -> (topologies, prepare, largest tile count). prepare(topology, n_tiles) does the untimed
+# setup and returns the function to measure.
+CASES = {
+    'gen_noc_layout': (('mesh', 'htree'), _generate, None),
+    'gen_noc_layout_loop': (('mesh',), _generate_loop, 2**15),
+    'find_distance': (('mesh', 'htree'), _find_distance, None),
+    'find_distances': (('mesh', 'htree'), _find_distances, None),
+    'metrics': (('mesh', 'htree'), _metrics, None),
+    'create_plotly_figure': (('mesh', 'htree'), _figure, None),
+    'write_html': (('mesh', 'htree'), _write_html, None),
+}
+
+
+def measure(prepare, topology, n_tiles, repeat=MIN_REPEAT):
+    """
+    Median wall time and its interquartile range over repeat runs (at least
+    MIN_REPEAT), then one more run under tracemalloc for the peak memory
+    allocated above what setup left behind. Setup is redone before every
+    run and never timed.
+
+    Returns (seconds, seconds_iqr, peak_bytes).
+    """
+    times = []
+    for _ in range(max(repeat, MIN_REPEAT)):
+        run = prepare(topology, n_tiles)
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run = prepare(topology, n_tiles)
+        floor = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run()
+        peak = tracemalloc.get_traced_memory()[1] - floor
+    finally:
+        tracemalloc.stop()
+    low, median, high = np.percentile(times, (25, 50, 75))
+    return float(median), float(high - low), max(peak, 0)
+
+
+def run_suite(sizes=SIZES, patterns=("*",), repeat=MIN_REPEAT, max_tiles=None, report=print):
+    """
+    Measure every case matching one of patterns (fnmatch against
+    "case" and "case/topology") at every size it supports.
+
+    Returns a list of result dicts (case, topology, tiles, seconds,
+    seconds_iqr, peak_bytes).
+    """
+    results = []
+    for name, (topologies, prepare, case_max) in CASES.items():
+        for topology in topologies:
+            if not any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(f"{name}/{topology}", pattern) for pattern in patterns):
+                continue
+            for n_tiles in sizes:
+                if (case_max is not None and n_tiles > case_max) or (max_tiles is not None and n_tiles > max_tiles):
+                    continue
+                seconds, spread, peak = measure(prepare, topology, n_tiles, repeat)
+                results.append({'case': name, 'topology': topology, 'tiles': n_tiles, 'seconds': seconds,
+                                'seconds_iqr': spread, 'peak_bytes': peak})
+                if report:
+                    report(f"{name:<22} {topology:<6} {n_tiles:>8} tiles  {seconds * 1e3:10.2f} ms "
+                           f"(IQR {spread * 1e3:8.2f})  {peak / 2**20:9.2f} MiB")
+    return results
+
+
+def scaling_exponents(results):
+    """Log-log slope of time against tile count per (case, topology): ~1 is linear, ~0 constant."""
+    curves = {}
+    for result in results:
+        curves.setdefault((result['case'], result['topology']), []).append((result['tiles'], result['seconds']))
+    exponents = {}
+    for key, points in curves.items():
+        points = [(tiles, seconds) for tiles, seconds in points if seconds > 0]
+        if len(points) >= 2:
+            tiles, seconds = np.log(np.array(points, dtype=float)).T
+            exponents[key] = float(np.polyfit(tiles, seconds, 1)[0])
+    return exponents
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def make_record(results):
+    """A run's results with the environment they were measured in."""
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+
+
+def append_history(record, path=HISTORY_FILE):
+    """Append a run record to the JSON history file (a list of records), creating it if needed."""
+    history = []
+    if os.path.exists(path):
+        with open(path) as f:
+            history = json.load(f)
+    history.append(record)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(history, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return history
+
+
+def compare(results, baseline, time_tolerance=0.25, memory_tolerance=0.10):
+    """
+    Flag results that are slower or use more memory than the baseline
+    measurement of the same case, topology and size by more than the given
+    relative tolerance. A slowdown must also exceed NOISE_IQRS times the
+    larger interquartile range of the two measurements, and a memory
+    increase MIN_MEMORY_DELTA.
+
+    Returns a list of (result, metric, baseline value, ratio).
+    """
+    reference = {(entry['case'], entry['topology'], entry['tiles']): entry for entry in baseline['results']}
+    regressions = []
+    for result in results:
+        old = reference.get((result['case'], result['topology'], result['tiles']))
+        if old is None:
+            continue
+        noise = NOISE_IQRS * max(old.get('seconds_iqr', 0.0), result.get('seconds_iqr', 0.0))
+        for metric, tolerance, floor in (('seconds', time_tolerance, noise),
+                                         ('peak_bytes', memory_tolerance, MIN_MEMORY_DELTA)):
+            if result[metric] - old[metric] > max(floor, tolerance * old[metric]):
+                regressions.append((result, metric, old[metric], result[metric] / old[metric] if old[metric] else float('inf')))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NoC generation, distance queries, metrics and rendering.")
+    parser.add_argument("cases", nargs="*", default=["*"], help=f"Case patterns, e.g. 'find_*' or 'metrics/htree' (cases: {', '.join(CASES)})")
+    parser.add_argument("--max-tiles", type=int, default=None, help="Skip sizes above this tile count")
+    parser.add_argument("--repeat", type=int, default=MIN_REPEAT, help=f"Timed runs per measurement (at least {MIN_REPEAT})")
+    parser.add_argument("--history", default=HISTORY_FILE, help="JSON history file every run is appended to")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline record to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    results = run_suite(SIZES, args.cases, args.repeat, args.max_tiles)
+    for (case, topology), exponent in scaling_exponents(results).items():
+        print(f"scaling {case}/{topology}: time ~ tiles^{exponent:.2f}")
+    record = make_record(results)
+    append_history(record, args.history)
+
+    status = 0
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(record, f, indent=1)
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+        for result, metric, old, ratio in regressions:
+            unit = (lambda v: f"{v * 1e3:.2f} ms") if metric == 'seconds' else (lambda v: f"{v / 2**20:.2f} MiB")
+            print(f"REGRESSION {result['case']}/{result['topology']} at {result['tiles']} tiles: "
+                  f"{metric} {unit(old)} -> {unit(result[metric])} ({ratio:.2f}x)")
+        print(f"{len(regressions)} regressions against baseline {baseline.get('commit') or baseline['timestamp']}")
+        status = 1 if regressions else 0
+    raise SystemExit(status)
+
+
+if __name__ == "__main__":
+    main()
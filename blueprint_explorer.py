@@ -0,0 +1,190 @@
+import argparse
+import json
+import math
+import os
+import tempfile
+
+import numpy as np
+
+import htreevis
+from htreevis import GeometryConfig, HTree3D
+
+# Evaluation results are minimized along these keys when building the Pareto front.
+OBJECTIVES = ('total_wire_length', 'avg_energy', 'footprint')
+
+
+def legal_blueprints(n_levels, max_z_splits=None):
+    """
+    Yield every legal blueprint of n_levels symbols: '0'/'1'/'2' with no
+    symbol twice in a row (the rule create_blueprint enforces), and at most
+    max_z_splits '2's.
+    """
+    max_z_splits = n_levels if max_z_splits is None else max_z_splits
+    stack = [("", 0)]
+    while stack:
+        prefix, z_splits = stack.pop()
+        if len(prefix) == n_levels:
+            yield prefix
+            continue
+        for ch in '210':
+            if prefix and prefix[-1] == ch:
+                continue
+            if ch == '2':
+                if z_splits >= max_z_splits:
+                    continue
+                stack.append((prefix + ch, z_splits + 1))
+            else:
+                stack.append((prefix + ch, z_splits))
+
+
+def levels_for(n_leaves, layer_budget):
+    """Convert a leaf count and a layer budget into (levels, max Z splits)."""
+    n_levels = int(n_leaves).bit_length() - 1
+    if n_leaves < 1 or 2**n_levels != n_leaves:
+        raise ValueError(f"An H-tree needs a power-of-two leaf count, got {n_leaves}.")
+    max_z_splits = int(math.floor(math.log2(max(layer_budget, 1))))
+    return n_levels, max_z_splits
+
+
+def default_blueprint(n_leaves, n_layers):
+    """
+    One legal blueprint for n_leaves tiles stacked in n_layers layers.
+
+    The Z splits come from the layer count and the remaining splits are
+    shared evenly between X and Y. Symbols are placed greedily, most
+    remaining first, never repeating the previous one.
+    """
+    n_levels, _ = levels_for(n_leaves, 1)
+    z_splits = int(n_layers).bit_length() - 1
+    if n_layers < 1 or 2**z_splits != n_layers or z_splits > n_levels:
+        raise ValueError(f"Cannot stack {n_leaves} H-tree leaves in {n_layers} layers; use a power-of-two layer count no larger than the leaf count.")
+    remaining = {'0': (n_levels - z_splits + 1) // 2, '1': (n_levels - z_splits) // 2, '2': z_splits}
+    blueprint = ""
+    for _ in range(n_levels):
+        choices = [ch for ch in '012' if remaining[ch] and not blueprint.endswith(ch)]
+        if not choices:
+            raise ValueError(f"No legal blueprint puts {z_splits} Z splits in {n_levels} levels without repeating a symbol.")
+        ch = max(choices, key=lambda c: remaining[c])
+        remaining[ch] -= 1
+        blueprint += ch
+    return blueprint
+
+
+def evaluate_blueprint(blueprint, config: GeometryConfig = None,
+                       h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT):
+    """
+    Wire length, energy and footprint of one blueprint, from closed-form metrics.
+    avg_energy is the expected energy of one bit between two uniformly random leaves.
+    """
+    noc = HTree3D(config)
+    noc.gen_noc_layout(blueprint)
+    metrics = noc.metrics()
+    avg_h, avg_v = noc.avg_distance()
+    (low_x, low_y, _), (high_x, high_y, _) = metrics['bounding_box']
+    return {
+        'blueprint': blueprint,
+        'layers': 2**blueprint.count('2'),
+        'total_wire_length': metrics['total_wire_length'],
+        'tsv_count': metrics['tsv_count'],
+        'avg_energy': avg_h * h_cost + avg_v * v_cost,
+        'max_root_distance': metrics['max_root_distance'],
+        'footprint': (high_x - low_x + noc.config.pe_size) * (high_y - low_y + noc.config.pe_size),
+    }
+
+
+class BlueprintCache:
+    """
+    A JSON file of evaluation results keyed by blueprint and geometry, so
+    re-running a sweep only evaluates blueprints it has not seen before.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(blueprint, geometry, costs):
+        return "|".join([blueprint, *(repr(float(value)) for value in (*geometry, *costs))])
+
+    def save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as f:
+            json.dump(self.entries, f)
+            temp_path = f.name
+        os.replace(temp_path, self.path)
+
+
+def pareto_front(results, objectives=OBJECTIVES):
+    """Return the results not dominated on any objective (all minimized), sorted by the first one."""
+    if not results:
+        return []
+    values = np.array([[result[key] for key in objectives] for result in results], dtype=float)
+    order = np.lexsort(values.T[::-1])
+    front = []
+    for index in order:
+        candidate = values[index]
+        if front:
+            kept = values[front]
+            if np.any(np.all(kept <= candidate, axis=1) & np.any(kept < candidate, axis=1)):
+                continue
+            if np.any(np.all(kept == candidate, axis=1)):
+                continue
+        front.append(index)
+    return [results[index] for index in front]
+
+
+def explore(n_leaves, layer_budget, config: GeometryConfig = None, cache_path="blueprint_cache.json", workers=None,
+            h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT, chunksize=256):
+    """
+    Evaluate every legal blueprint for n_leaves tiles within layer_budget layers.
+
+    Uncached blueprints are evaluated across a process pool; results are
+    cached on disk by (blueprint, pe_size, gutter_width, layer_height) and
+    the energy costs.
+
+    Returns:
+        (all results, Pareto front over OBJECTIVES)
+    """
+    n_levels, max_z_splits = levels_for(n_leaves, layer_budget)
+    geometry = htreevis.default_geometry() if config is None else config
+    costs = (h_cost, v_cost)
+    cache = BlueprintCache(cache_path)
+    blueprints = list(legal_blueprints(n_levels, max_z_splits))
+    missing = [bp for bp in blueprints if BlueprintCache.key(bp, geometry, costs) not in cache.entries]
+    if missing:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            evaluated = pool.map(evaluate_blueprint, missing, [geometry] * len(missing),
+                                 [h_cost] * len(missing), [v_cost] * len(missing), chunksize=chunksize)
+            for bp, result in zip(missing, evaluated):
+                cache.entries[BlueprintCache.key(bp, geometry, costs)] = result
+        cache.save()
+    results = [cache.entries[BlueprintCache.key(bp, geometry, costs)] for bp in blueprints]
+    return results, pareto_front(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enumerate legal H-tree blueprints and report the Pareto front.")
+    parser.add_argument("tiles", type=int, help="Target leaf (memory) count, a power of two")
+    parser.add_argument("layers", type=int, help="Maximum number of layers")
+    parser.add_argument("--cache", default="blueprint_cache.json", help="Result cache file ('' to disable)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--pe-size", type=float, default=htreevis.PE_SIZE)
+    parser.add_argument("--gutter-width", type=float, default=htreevis.GUTTER_WIDTH)
+    parser.add_argument("--layer-height", type=float, default=htreevis.LAYER_HEIGHT)
+    args = parser.parse_args()
+
+    config = GeometryConfig(args.pe_size, args.gutter_width, args.layer_height)
+    results, front = explore(args.tiles, args.layers, config, cache_path=args.cache, workers=args.workers)
+    print(f"Evaluated {len(results)} blueprints, {len(front)} on the Pareto front:")
+    for result in front:
+        print(f"  {result['blueprint']}: wire={result['total_wire_length']:.1f} "
+              f"energy={result['avg_energy']:.2f} footprint={result['footprint']:.1f} layers={result['layers']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import argparse
+
+import numpy as np
+
+from htreevis import DataGraph, Mesh3D, CHUNK_BYTES, iter_traffic
+from noc_sim import PATTERNS, permutation_destinations
+
+
+def _uniform_loads(dims):
+    """
+    Per-link loads of uniform random traffic (every tile sends one packet
+    per cycle, spread evenly over the other N-1 tiles) in closed form.
+
+    Under XYZ routing the link between coordinates c and c+1 of a dimension
+    of size D carries the (c+1) * (D-c-1) source/destination coordinate
+    pairs that straddle it, for N/D of the remaining coordinates, in each
+    direction. Returns one (2, Z, Y, X) array per dimension, extended by one
+    unused slot along its own axis like the difference arrays.
+    """
+    size_x, size_y, size_z = dims
+    n_tiles = size_x * size_y * size_z
+    scale = 1.0 / max(n_tiles - 1, 1)
+    loads = []
+    for axis, size in enumerate(dims):
+        coord = np.arange(size)
+        per_link = scale * (n_tiles / size) * (coord + 1) * (size - coord - 1)
+        shape = [1, 1, 1, 1]
+        shape[3 - axis] = size
+        loads.append(np.broadcast_to(per_link.reshape(shape), (2, size_z, size_y, size_x)).copy())
+    return loads
+
+
+def _accumulate(dims, diffs, src, dst, weight):
+    """
+    Add a chunk of (src, dst, weight) traffic to the per-dimension difference arrays.
+
+    Each dimension's hops form one contiguous run of links on a single
+    row, so a route adds +weight where its run starts and -weight where it
+    ends; a cumulative sum along the row then gives every link's load.
+    """
+    size_x, size_y, size_z = dims
+    n_tiles = size_x * size_y * size_z
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    sx, sy, sz = src % size_x, (src // size_x) % size_y, src // (size_x * size_y)
+    dx, dy, dz = dst % size_x, (dst // size_x) % size_y, dst // (size_x * size_y)
+    # Rows of each dimension's hops: X runs at (sy, sz), Y runs at (dx, sz), Z runs at (dx, dy).
+    runs = (
+        (sx, dx, lambda c: (sz * size_y + sy) * size_x + c),
+        (sy, dy, lambda c: (sz * size_y + c) * size_x + dx),
+        (sz, dz, lambda c: (c * size_y + dy) * size_x + dx),
+    )
+    for diff, (start, end, cell) in zip(diffs, runs):
+        direction = (end < start) * n_tiles
+        low, high = np.minimum(start, end), np.maximum(start, end)
+        diff += np.bincount(direction + cell(low), weight, 2 * n_tiles)
+        diff -= np.bincount(direction + cell(high), weight, 2 * n_tiles)
+
+
+def channel_loads(noc: Mesh3D, traffic='uniform', hotspot_fraction=0.1, hotspots=(0,), chunk_bytes=CHUNK_BYTES):
+    """
+    Load on every link of a mesh under XYZ dimension-ordered routing,
+    without walking any route.
+
+    traffic is one of noc_sim.PATTERNS, normalized so every tile injects one
+    packet per cycle (hotspot sends hotspot_fraction of it to the hotspots
+    and the rest uniformly), or a traffic matrix in packets per cycle in
+    any form iter_traffic accepts (a DataGraph gives its edges). Matrices
+    are worked through chunk by chunk.
+
+    Returns:
+        (E,2) array: loads[link, d] is the packets per cycle crossing link
+        (numbered as in Mesh3D.link_graph) towards its high end (d=0) or its
+        low end (d=1), i.e. channel 2*link + d of noc_sim
+    """
+    dims = tuple(int(size) for size in noc._require_layout())
+    n_tiles = noc.tile_count()
+    diffs = [np.zeros(2 * n_tiles) for _ in range(3)]
+    totals = None
+    if isinstance(traffic, str):
+        tiles = np.arange(n_tiles)
+        if traffic == 'uniform' or traffic == 'hotspot':
+            share = 1.0 if traffic == 'uniform' else 1.0 - hotspot_fraction
+            totals = [share * load for load in _uniform_loads(dims)]
+            if traffic == 'hotspot':
+                for hotspot in hotspots:
+                    _accumulate(dims, diffs, tiles, np.full(n_tiles, hotspot), np.full(n_tiles, hotspot_fraction / len(hotspots)))
+        elif traffic in PATTERNS:
+            _accumulate(dims, diffs, tiles, permutation_destinations(noc, traffic, tiles), np.ones(n_tiles))
+        else:
+            raise ValueError(f"Unknown traffic pattern {traffic!r}; expected one of {PATTERNS}.")
+    else:
+        if isinstance(traffic, DataGraph):
+            traffic = traffic.edges()
+        for src, dst, weight in iter_traffic(traffic, chunk_bytes):
+            _accumulate(dims, diffs, src, dst, weight)
+
+    size_x, size_y, size_z = dims
+    per_axis = []
+    for axis, diff in enumerate(diffs):
+        grid = np.cumsum(diff.reshape(2, size_z, size_y, size_x), axis=3 - axis)
+        if totals is not None:
+            grid += totals[axis]
+        # Drop the slot past the last link of every row, leaving links in _mesh_links order.
+        grid = np.delete(grid, -1, axis=3 - axis)
+        per_axis.append(grid.reshape(2, -1).T)
+    return np.concatenate(per_axis)
+
+
+def bottleneck(noc: Mesh3D, loads, bandwidth=1.0, packet_flits=1):
+    """
+    The most loaded channel and the injection rate it allows.
+
+    With loads for one packet per tile per cycle (channel_loads of a
+    pattern), a channel carrying bandwidth flits per cycle saturates at
+    bandwidth / (packet_flits * max load) packets per tile per cycle.
+    """
+    links, _, _, _ = noc.link_graph()
+    link, direction = np.unravel_index(int(np.argmax(loads)), loads.shape)
+    max_load = float(loads[link, direction])
+    low, high = (int(tile) for tile in links[link])
+    return {
+        'channel': int(2 * link + direction),
+        'link': int(link),
+        'from_tile': high if direction else low,
+        'to_tile': low if direction else high,
+        'max_load': max_load,
+        'mean_load': float(loads.mean()),
+        'max_injection_rate': bandwidth / (packet_flits * max_load) if max_load > 0 else float('inf'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytic channel loads of an XYZ-routed mesh.")
+    parser.add_argument("mesh", type=int, nargs=3, metavar=("X", "Y", "Z"))
+    parser.add_argument("--pattern", default='uniform', help=f"One of {PATTERNS}, or an edge-list file of tile traffic")
+    parser.add_argument("--flits", type=int, default=1)
+    parser.add_argument("--bandwidth", type=float, default=1.0, help="Flits per cycle per channel")
+    args = parser.parse_args()
+
+    noc = Mesh3D()
+    noc.gen_noc_layout(tuple(args.mesh), vectorized=True)
+    traffic = args.pattern if args.pattern in PATTERNS else DataGraph.load(args.pattern)
+    loads = channel_loads(noc, traffic)
+    report = bottleneck(noc, loads, args.bandwidth, args.flits)
+    print(f"bottleneck channel {report['channel']} (tile {report['from_tile']} -> {report['to_tile']}): "
+          f"load {report['max_load']:.4g}, mean {report['mean_load']:.4g}")
+    print(f"max injection rate: {report['max_injection_rate']:.4g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import htreevis
+from htreevis import Mesh3D, HTree3D, CHUNK_BYTES, _row_chunks
+
+
+def random_faults(noc, link_rate=0.0, tsv_rate=None, tile_rate=0.0, rng=None):
+    """
+    Draw a random fault set: every horizontal link fails with probability
+    link_rate, every vertical (TSV) link with tsv_rate (default link_rate)
+    and every tile with tile_rate.
+
+    Returns:
+        (failed_links, failed_tiles): an (E,) mask over noc.link_graph()
+        links and an array of failed tile indices
+    """
+    rng = np.random.default_rng(rng)
+    _, _, vertical, tile_routers = noc.link_graph()
+    tsv_rate = link_rate if tsv_rate is None else tsv_rate
+    failed_links = rng.random(len(vertical)) < np.where(vertical, tsv_rate, link_rate)
+    failed_tiles = np.flatnonzero(rng.random(len(tile_routers)) < tile_rate)
+    return failed_links, failed_tiles
+
+
+class _RelaxationGraph:
+    """
+    The surviving links of a faulted topology as directed edges sorted by
+    head, so one np.minimum.reduceat per sweep relaxes every vertex.
+    """
+    def __init__(self, noc, failed_links=None, failed_tiles=None, weight='energy',
+                 h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT):
+        links, lengths, vertical, tile_routers = noc.link_graph()
+        self.tile_routers = tile_routers
+        self.n_routers = int(links.max()) + 1 if len(links) else len(tile_routers)
+        alive = np.ones(len(links), dtype=bool) if failed_links is None else ~np.asarray(failed_links, dtype=bool)
+        self.dead_tiles = np.zeros(len(tile_routers), dtype=bool)
+        if failed_tiles is not None and len(failed_tiles):
+            self.dead_tiles[failed_tiles] = True
+            dead_routers = np.zeros(self.n_routers, dtype=bool)
+            dead_routers[tile_routers[failed_tiles]] = True
+            alive &= ~dead_routers[links[:, 0]] & ~dead_routers[links[:, 1]]
+        if weight == 'energy':
+            costs = lengths * np.where(vertical, v_cost, h_cost)
+        elif weight == 'length':
+            costs = lengths
+        else:
+            raise ValueError(f"weight must be 'energy' or 'length', got {weight!r}.")
+        tails = np.concatenate((links[alive, 0], links[alive, 1]))
+        heads = np.concatenate((links[alive, 1], links[alive, 0]))
+        costs = np.concatenate((costs[alive], costs[alive]))
+        order = np.argsort(heads, kind='stable')
+        self.tails, self.costs = tails[order], costs[order]
+        self.targets, self.starts = np.unique(heads[order], return_index=True)
+
+    def distances(self, source_routers):
+        """(S, n_routers) shortest path costs from each source router (inf where unreachable)."""
+        dist = np.full((len(source_routers), self.n_routers), np.inf)
+        dist[np.arange(len(source_routers)), source_routers] = 0.0
+        if not len(self.tails):
+            return dist
+        # After k sweeps every cheapest path of at most k links is settled, so a sweep stops improving once k
+        # reaches the most links on any cheapest path. That is below n_routers, so the cap never cuts it short.
+        for _ in range(self.n_routers):
+            best = np.minimum.reduceat(dist[:, self.tails] + self.costs, self.starts, axis=1)
+            current = dist[:, self.targets]
+            if not np.any(best < current):
+                break
+            dist[:, self.targets] = np.minimum(current, best)
+        return dist
+
+
+def shortest_distances(noc, sources, failed_links=None, failed_tiles=None, weight='energy',
+                       h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT,
+                       workers=None, chunk_bytes=CHUNK_BYTES):
+    """
+    Shortest surviving paths from source tiles to every tile.
+
+    Sources are relaxed together in batches sized to chunk_bytes, and the
+    batches run on a thread pool. weight='energy' costs each link by its
+    length times h_cost or v_cost; weight='length' is plain wire length.
+
+    Returns:
+        (S, N) array of path costs between tile indices, inf where the
+        faults disconnect the pair (or either tile failed)
+    """
+    graph = _RelaxationGraph(noc, failed_links, failed_tiles, weight, h_cost, v_cost)
+    sources = np.asarray(sources, dtype=np.int64)
+    batches = list(_row_chunks(len(sources), 2 * len(graph.tails) * 8, chunk_bytes))
+
+    def run(batch):
+        start, stop = batch
+        return graph.distances(graph.tile_routers[sources[start:stop]])[:, graph.tile_routers]
+
+    if len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run, batches))
+    else:
+        results = [run(batch) for batch in batches]
+    dist = np.concatenate(results) if results else np.empty((0, len(graph.tile_routers)))
+    dist[:, graph.dead_tiles] = np.inf
+    dist[graph.dead_tiles[sources]] = np.inf
+    return dist
+
+
+def degradation(noc, failed_links=None, failed_tiles=None, n_sources=64, rng=None,
+                h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT, workers=None):
+    """
+    Compare a fault set against the fault-free topology over the pairs of
+    surviving tiles, from n_sources sampled surviving source tiles to every
+    other surviving tile.
+
+    Returns a dict with the fault-free and faulted average wire length and
+    energy over the pairs that are still connected, their ratios, and the
+    fraction of pairs still connected.
+    """
+    rng = np.random.default_rng(rng)
+    n_tiles = noc.tile_count()
+    alive = np.ones(n_tiles, dtype=bool)
+    if failed_tiles is not None:
+        alive[failed_tiles] = False
+    candidates = np.flatnonzero(alive)
+    sources = rng.choice(candidates, size=min(n_sources, len(candidates)), replace=False)
+    energy = shortest_distances(noc, sources, failed_links, failed_tiles, 'energy', h_cost, v_cost, workers)
+    # Equal non-zero costs make energy a fixed multiple of length; otherwise walk the lengths too.
+    if h_cost == v_cost and h_cost != 0:
+        length = energy / h_cost
+    else:
+        length = shortest_distances(noc, sources, failed_links, failed_tiles, 'length', workers=workers)
+
+    pairs = alive[None, :] & (sources[:, None] != np.arange(n_tiles)[None, :])
+    connected = pairs & np.isfinite(energy)
+    rows, cols = np.nonzero(connected)
+    dist_h, dist_v = noc.find_distances(sources[rows], cols)
+    base_length = float(np.mean(dist_h + dist_v)) if len(rows) else float('nan')
+    base_energy = float(np.mean(dist_h * h_cost + dist_v * v_cost)) if len(rows) else float('nan')
+    fault_length = float(length[connected].mean()) if len(rows) else float('nan')
+    fault_energy = float(energy[connected].mean()) if len(rows) else float('nan')
+    return {
+        'failed_links': int(np.count_nonzero(failed_links)) if failed_links is not None else 0,
+        'failed_tiles': int(n_tiles - alive.sum()),
+        'connected_fraction': float(connected.sum() / max(pairs.sum(), 1)),
+        'base_avg_distance': base_length,
+        'avg_distance': fault_length,
+        'distance_ratio': fault_length / base_length if base_length else float('nan'),
+        'base_avg_energy': base_energy,
+        'avg_energy': fault_energy,
+        'energy_ratio': fault_energy / base_energy if base_energy else float('nan'),
+    }
+
+
+_WORKER_NOC = None
+
+def _init_worker(noc):
+    global _WORKER_NOC
+    _WORKER_NOC = noc
+
+def _run_trial(args):
+    seed, link_rate, tsv_rate, tile_rate, n_sources, h_cost, v_cost = args
+    rng = np.random.default_rng(seed)
+    failed_links, failed_tiles = random_faults(_WORKER_NOC, link_rate, tsv_rate, tile_rate, rng)
+    return degradation(_WORKER_NOC, failed_links, failed_tiles, n_sources, rng, h_cost, v_cost, workers=1)
+
+
+def monte_carlo(noc, n_trials=1000, link_rate=0.0, tsv_rate=None, tile_rate=0.0, n_sources=32, seed=0,
+                h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT, workers=None, chunksize=16,
+                percentiles=(5, 50, 95)):
+    """
+    Evaluate n_trials random fault sets (see random_faults) across a
+    process pool. The topology is sent to each worker once.
+
+    Returns:
+        (per-trial degradation dicts, summary of mean and percentiles of
+        the connected fraction and the distance and energy ratios)
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    seeds = np.random.SeedSequence(seed).generate_state(n_trials)
+    jobs = [(int(trial_seed), link_rate, tsv_rate, tile_rate, n_sources, h_cost, v_cost) for trial_seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(noc,)) as pool:
+        trials = list(pool.map(_run_trial, jobs, chunksize=chunksize))
+    summary = {}
+    for key in ('connected_fraction', 'distance_ratio', 'energy_ratio'):
+        values = np.array([trial[key] for trial in trials], dtype=float)
+        values = values[np.isfinite(values)]
+        summary[key] = {'mean': float(values.mean()) if len(values) else float('nan'),
+                        **{f'p{p}': float(v) for p, v in zip(percentiles, np.percentile(values, percentiles) if len(values) else [np.nan] * len(percentiles))}}
+    return trials, summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo fault injection on a mesh or H-tree NoC.")
+    topology = parser.add_mutually_exclusive_group(required=True)
+    topology.add_argument("--blueprint", help="H-tree blueprint string, e.g. 01201")
+    topology.add_argument("--mesh", type=int, nargs=3, metavar=("X", "Y", "Z"))
+    parser.add_argument("--trials", type=int, default=1000)
+    parser.add_argument("--link-rate", type=float, default=0.01)
+    parser.add_argument("--tsv-rate", type=float, default=None)
+    parser.add_argument("--tile-rate", type=float, default=0.0)
+    parser.add_argument("--sources", type=int, default=32, help="Sampled source tiles per trial")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.blueprint:
+        noc = HTree3D()
+        noc.gen_noc_layout(args.blueprint)
+    else:
+        noc = Mesh3D()
+        noc.gen_noc_layout(tuple(args.mesh), vectorized=True)
+    _, summary = monte_carlo(noc, args.trials, args.link_rate, args.tsv_rate, args.tile_rate, args.sources, workers=args.workers)
+    for key, stats in summary.items():
+        print(f"{key}: " + " ".join(f"{label}={value:.4g}" for label, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
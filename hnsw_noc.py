@@ -0,0 +1,248 @@
+import argparse
+import math
+
+import numpy as np
+
+import htreevis
+from htreevis import DataGraph, Mesh3D, HTree3D, CHUNK_BYTES, _row_chunks
+import placement
+
+
+class HNSWGraph:
+    """
+    A layered proximity graph in the shape of an HNSW index.
+
+    Node v appears on layers 0..levels[v]. neighbors[L] is a padded
+    (N, max_degree) array of node ids (-1 for unused slots) holding the
+    out-links on layer L; rows of nodes absent from that layer are all -1.
+    Search starts at entry_point, the first node on the top layer.
+    """
+    def __init__(self, vectors, levels, neighbors):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.norms = np.einsum('ij,ij->i', self.vectors, self.vectors)
+        self.levels = np.asarray(levels)
+        self.neighbors = neighbors
+        self.entry_point = int(np.flatnonzero(self.levels == self.levels.max())[0])
+
+    @classmethod
+    def build(cls, vectors, m=16, seed=0, chunk_bytes=CHUNK_BYTES):
+        """
+        Build the index with HNSW's level distribution (mL = 1/ln m). Each layer
+        links its nodes to their exact m nearest neighbours on that layer (2m on
+        layer 0), found by blocked brute force. Links are made symmetric and
+        then pruned back to the closest max_degree per node.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        levels = np.floor(-np.log(1.0 - rng.random(len(vectors))) / math.log(m)).astype(np.int64)
+        norms = np.einsum('ij,ij->i', vectors, vectors)
+        neighbors = []
+        for layer in range(int(levels.max()) + 1):
+            members = np.flatnonzero(levels >= layer)
+            degree = 2 * m if layer == 0 else m
+            neighbors.append(_knn_layer(vectors, norms, members, degree, len(vectors), chunk_bytes))
+        return cls(vectors, levels, neighbors)
+
+    def layer_graph(self, layer=0):
+        """The links of one layer as a DataGraph, e.g. for placement."""
+        src, slot = np.nonzero(self.neighbors[layer] >= 0)
+        return DataGraph.from_edges(src, self.neighbors[layer][src, slot], n_vertices=len(self.vectors))
+
+
+def _knn_layer(vectors, norms, members, degree, n_nodes, chunk_bytes):
+    """Symmetrized exact k-nearest-neighbour links among members, as a padded (n_nodes, degree) array."""
+    k = min(degree, len(members) - 1)
+    table = np.full((n_nodes, degree), -1, dtype=np.int64)
+    if k <= 0:
+        return table
+    member_vectors = vectors[members]
+    src, dst, dist = [], [], []
+    for start, stop in _row_chunks(len(members), len(members) * 4, chunk_bytes):
+        scores = norms[members] - 2 * (member_vectors[start:stop] @ member_vectors.T)
+        scores[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        nearest = np.argpartition(scores, k - 1, axis=1)[:, :k]
+        src.append(np.repeat(members[start:stop], k))
+        dst.append(members[nearest].ravel())
+        dist.append(np.take_along_axis(scores, nearest, axis=1).ravel() + np.repeat(norms[members[start:stop]], k))
+    src, dst, dist = np.concatenate(src), np.concatenate(dst), np.concatenate(dist)
+    src, dst, dist = np.concatenate((src, dst)), np.concatenate((dst, src)), np.concatenate((dist, dist))
+    _, unique = np.unique(src * n_nodes + dst, return_index=True)
+    src, dst, dist = src[unique], dst[unique], dist[unique]
+    order = np.lexsort((dist, src))
+    src, dst = src[order], dst[order]
+    rank = np.arange(len(src)) - np.searchsorted(src, src)
+    keep = rank < degree
+    table[src[keep], rank[keep]] = dst[keep]
+    return table
+
+
+def _search_layer(graph, queries, query_norms, start, start_tile, tile_of, noc, layer, ef, h_cost, v_cost):
+    """
+    Best-first search of one layer for a block of queries at once.
+
+    Every query keeps a sorted beam of its ef closest nodes; each step
+    expands the closest unexpanded beam node of every unfinished query.
+    A per-query visited mask keeps nodes already evaluated on this layer
+    from being probed again after they drop out of the beam.
+    The query travels from its current tile to that node's tile (a move),
+    and each new neighbour is probed with a round trip to its tile.
+    Probes of one step run in parallel, so the step's latency is the move
+    plus the longest probe round trip.
+
+    Returns (beam ids, beam distances, final tiles, energy, latency, hops, probes).
+    """
+    n_queries = len(queries)
+    table = graph.neighbors[layer]
+    beam = np.full((n_queries, ef), -1, dtype=np.int64)
+    beam_dist = np.full((n_queries, ef), np.inf, dtype=np.float32)
+    expanded = np.ones((n_queries, ef), dtype=bool)
+    beam[:, 0] = start
+    beam_dist[:, 0] = query_norms - 2 * np.einsum('ij,ij->i', queries, graph.vectors[start]) + graph.norms[start]
+    expanded[:, 0] = False
+    visited = np.zeros((n_queries, len(graph.vectors)), dtype=bool)
+    visited[np.arange(n_queries), start] = True
+    tile = start_tile.copy()
+    energy = np.zeros(n_queries)
+    latency = np.zeros(n_queries)
+    hops = np.zeros(n_queries, dtype=np.int64)
+    probes = np.zeros(n_queries, dtype=np.int64)
+    while True:
+        active = np.flatnonzero(~expanded.all(axis=1))
+        if not len(active):
+            break
+        slot = np.argmin(expanded[active], axis=1)
+        node = beam[active, slot]
+        expanded[active, slot] = True
+
+        node_tile = tile_of[node]
+        move_h, move_v = noc.find_distances(tile[active], node_tile)
+        energy[active] += move_h * h_cost + move_v * v_cost
+        hops[active] += node_tile != tile[active]
+        tile[active] = node_tile
+
+        candidates = table[node]
+        rows = np.broadcast_to(active[:, None], candidates.shape)
+        fresh = (candidates >= 0) & ~visited[rows, np.maximum(candidates, 0)]
+        visited[rows[fresh], candidates[fresh]] = True
+        probe_tiles = tile_of[np.where(fresh, candidates, node[:, None])]
+        probe_h, probe_v = noc.find_distances(node_tile[:, None], probe_tiles)
+        energy[active] += 2 * ((probe_h * h_cost + probe_v * v_cost) * fresh).sum(axis=1)
+        latency[active] += move_h + move_v + 2 * ((probe_h + probe_v) * fresh).max(axis=1, initial=0)
+        probes[active] += fresh.sum(axis=1)
+
+        safe = np.where(fresh, candidates, 0)
+        dist = query_norms[active, None] - 2 * np.einsum('qd,qkd->qk', queries[active], graph.vectors[safe]) + graph.norms[safe]
+        dist = np.where(fresh, dist, np.inf).astype(np.float32)
+        merged_ids = np.concatenate((beam[active], np.where(fresh, candidates, -1)), axis=1)
+        merged_dist = np.concatenate((beam_dist[active], dist), axis=1)
+        merged_expanded = np.concatenate((expanded[active], ~fresh), axis=1)
+        order = np.argsort(merged_dist, axis=1, kind='stable')[:, :ef]
+        beam[active] = np.take_along_axis(merged_ids, order, axis=1)
+        beam_dist[active] = np.take_along_axis(merged_dist, order, axis=1)
+        expanded[active] = np.take_along_axis(merged_expanded, order, axis=1) | (beam[active] < 0)
+    return beam, beam_dist, tile, energy, latency, hops, probes
+
+
+def simulate(graph: HNSWGraph, queries, noc, tile_of, k=10, ef=32, entry_tile=None,
+             h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT, chunk_bytes=CHUNK_BYTES):
+    """
+    Replay a batch of ANN queries over an HNSW graph whose nodes live on NoC tiles.
+
+    Queries are injected at entry_tile (default: the entry point's tile),
+    descend the upper layers greedily and finish with an ef-wide beam search
+    on layer 0. Every move and probe is charged with the topology's
+    find_distances. Query blocks are sized to chunk_bytes.
+
+    Returns a dict of per-query arrays: ids and distances of the k results,
+    energy, latency (wire length along the critical path), hops (tile
+    changes) and probes (distance evaluations).
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    tile_of = np.asarray(tile_of)
+    n_queries = len(queries)
+    ef = max(ef, k)
+    result = {
+        'ids': np.empty((n_queries, k), dtype=np.int64),
+        'distances': np.empty((n_queries, k), dtype=np.float32),
+        'energy': np.zeros(n_queries),
+        'latency': np.zeros(n_queries),
+        'hops': np.zeros(n_queries, dtype=np.int64),
+        'probes': np.zeros(n_queries, dtype=np.int64),
+    }
+    start_tile = tile_of[graph.entry_point] if entry_tile is None else entry_tile
+    max_degree = max(table.shape[1] for table in graph.neighbors)
+    row_bytes = max_degree * (graph.vectors.shape[1] * 4 + ef * 8) + len(graph.vectors)
+    for start, stop in _row_chunks(n_queries, row_bytes, chunk_bytes):
+        block = queries[start:stop]
+        norms = np.einsum('ij,ij->i', block, block)
+        node = np.full(len(block), graph.entry_point, dtype=np.int64)
+        tile = np.full(len(block), start_tile, dtype=np.int64)
+        totals = [np.zeros(len(block)), np.zeros(len(block)), np.zeros(len(block), dtype=np.int64), np.zeros(len(block), dtype=np.int64)]
+        for layer in range(len(graph.neighbors) - 1, -1, -1):
+            width = ef if layer == 0 else 1
+            beam, beam_dist, tile, *costs = _search_layer(graph, block, norms, node, tile, tile_of, noc, layer, width, h_cost, v_cost)
+            for total, cost in zip(totals, costs):
+                total += cost
+            node = beam[:, 0]
+        result['ids'][start:stop] = beam[:, :k]
+        result['distances'][start:stop] = np.maximum(beam_dist[:, :k], 0)
+        for key, total in zip(('energy', 'latency', 'hops', 'probes'), totals):
+            result[key][start:stop] = total
+    return result
+
+
+def summarize(result, percentiles=(50, 90, 99)):
+    """Mean and percentiles of the per-query energy, latency, hops and probes of a simulate() result."""
+    summary = {}
+    for key in ('energy', 'latency', 'hops', 'probes'):
+        values = result[key]
+        summary[key] = {'mean': float(values.mean()), **{f'p{p}': float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}}
+    return summary
+
+
+def recall(ids, queries, vectors, k=10):
+    """Fraction of the exact k nearest neighbours found in ids, the (q, k) ids of a simulate() result (brute force; for small checks)."""
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scores = np.einsum('ij,ij->i', vectors, vectors) - 2 * (queries @ vectors.T)
+    exact = np.argpartition(scores, k - 1, axis=1)[:, :k]
+    found = (ids[:, :k, None] == exact[:, None, :]).any(axis=2)
+    return float(found.mean())
+
+
+def place_graph(graph: HNSWGraph, noc, refine_passes=1):
+    """Place the layer-0 graph onto the NoC's tiles with placement.place; returns tile_of."""
+    return placement.place(graph.layer_graph(0), noc, refine_passes)['tile_of']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare mesh and H-tree NoCs under HNSW query traffic.")
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--tiles", type=int, default=256, help="Tile count, a power of two")
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--ef", type=int, default=32)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    from blueprint_explorer import default_blueprint
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((args.nodes, args.dim)).astype(np.float32)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    graph = HNSWGraph.build(vectors)
+
+    htree = HTree3D()
+    htree.gen_noc_layout(default_blueprint(args.tiles, args.layers))
+    side = 2**((int(args.tiles // args.layers).bit_length() - 1) // 2)
+    mesh = Mesh3D()
+    mesh.gen_noc_layout((args.tiles // args.layers // side, side, args.layers), vectorized=True)
+    for name, noc in (('mesh', mesh), ('htree', htree)):
+        result = simulate(graph, queries, noc, place_graph(graph, noc), args.k, args.ef)
+        print(f"{name}: recall@{args.k}={recall(result['ids'][:1000], queries[:1000], vectors, args.k):.3f}")
+        for key, stats in summarize(result).items():
+            print(f"  {key}: " + " ".join(f"{label}={value:.4g}" for label, value in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,22 @@
-import plotly.graph_objects as go
-from typing import Tuple
+from __future__ import annotations
+from typing import NamedTuple, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
+import functools
 import math
-import webbrowser
+import itertools
+import base64
+import json
+import os
+import shutil
+import numpy as np
+
+import instrumentation
+
+# Plotly is only imported by the functions that build or export figures, so geometry,
+# distance and metric code loads without it.
+if TYPE_CHECKING:
+    import plotly.graph_objects as go
 
 # TODO:
 #   Create reasonable labels for each memory module, and each node (seperate kinds of labels)
@@ -14,15 +28,189 @@ import webbrowser
 PE_SIZE = 10; #Side length of a PE
 LAYER_HEIGHT = 25;
 GUTTER_WIDTH = 1;
-# Set dimensions on the viewer window.
-X_SIZE =  0;
-Y_SIZE = 0;
-Z_SIZE = 0;
+# Energy to move one bit across one unit of wire, horizontally and through TSVs.
+H_ENERGY_PER_UNIT = 1;
+V_ENERGY_PER_UNIT = 1;
+# Working-set size for chunked all-pairs and traffic computations.
+CHUNK_BYTES = 64 * 2**20;
+# Most line segments a figure draws before it switches to a reduced level of detail.
+RENDER_BUDGET = 50000;
+# Where the offline plotly.js bundle is kept, and the write buffer for HTML export.
+PLOTLYJS_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "3dhtree");
+HTML_WRITE_BUFFER = 2**20;
+
+class GeometryConfig(NamedTuple):
+    """
+    Physical dimensions of a layout. Passed to Mesh3D/HTree3D instead of
+    reading the module globals, so layouts with different parameters can be
+    built side by side. Immutable and hashable, so it doubles as a cache key.
+    """
+    pe_size: float = PE_SIZE
+    gutter_width: float = GUTTER_WIDTH
+    layer_height: float = LAYER_HEIGHT
+
+    @property
+    def pitch(self):
+        """Center-to-center spacing of neighbouring tiles in a layer."""
+        return self.pe_size + self.gutter_width
+
+def default_geometry() -> GeometryConfig:
+    """A GeometryConfig from the current values of the module globals."""
+    return GeometryConfig(PE_SIZE, GUTTER_WIDTH, LAYER_HEIGHT)
 
 class DataGraph():
     """
     An object to intake and handle Dev's data network
+
+    The graph is kept in compressed sparse row form: the neighbours of vertex
+    v are indices[indptr[v]:indptr[v+1]] (int32), with optional float32
+    edge weights in the same order. load() streams an edge-list file into
+    this form and keeps a memory-mapped binary copy next to it, so reopening
+    a graph skips parsing the text.
     """
+    def __init__(self, indptr=None, indices=None, weights=None):
+        self.indptr = np.zeros(1, dtype=np.int64) if indptr is None else indptr
+        self.indices = np.zeros(0, dtype=np.int32) if indices is None else indices
+        self.weights = weights
+
+    @property
+    def n_vertices(self):
+        return len(self.indptr) - 1
+
+    @property
+    def n_edges(self):
+        return len(self.indices)
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def neighbors(self, vertex):
+        return self.indices[self.indptr[vertex]:self.indptr[vertex + 1]]
+
+    def edges(self):
+        """All edges as a (src, dst, weight) traffic tuple, the form iter_traffic accepts."""
+        src = np.repeat(np.arange(self.n_vertices, dtype=np.int32), self.degree())
+        weights = np.ones(self.n_edges, dtype=np.float32) if self.weights is None else self.weights
+        return src, self.indices, weights
+
+    @classmethod
+    def from_edges(cls, src, dst, weights=None, n_vertices=None, symmetric=False):
+        """Build the CSR form from edge arrays; symmetric=True adds every edge in both directions."""
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        if symmetric:
+            src, dst = np.concatenate((src, dst)), np.concatenate((dst, src))
+            weights = None if weights is None else np.concatenate((weights, weights))
+        if n_vertices is None:
+            n_vertices = int(max(src.max(initial=-1), dst.max(initial=-1))) + 1
+        if n_vertices > np.iinfo(np.int32).max:
+            raise ValueError(f"{n_vertices} vertices do not fit int32 indices.")
+        order = np.argsort(src, kind='stable')
+        indptr = np.zeros(n_vertices + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n_vertices), out=indptr[1:])
+        indices = dst[order].astype(np.int32)
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float32)[order]
+        return cls(indptr, indices, weights)
+
+    @classmethod
+    def load(cls, path, symmetric=False, cache=True, chunk_bytes=CHUNK_BYTES):
+        """
+        Load an edge list ("src dst" or "src dst weight" per line; spaces, tabs
+        or commas; '#' and '%' comment lines) from PATH_TO_DATA.
+
+        The file is parsed chunk_bytes at a time. With cache=True the CSR
+        arrays are saved in <path>.csr/ and later loads memory-map them
+        instead, as long as the source file has not changed.
+        """
+        cache_dir = path + ".csr"
+        stat = os.stat(path)
+        meta = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'symmetric': symmetric}
+        if cache:
+            graph = cls.open_cache(cache_dir, meta)
+            if graph is not None:
+                return graph
+        columns = [[], [], []]
+        for chunk in _read_edge_chunks(path, chunk_bytes):
+            for column, values in zip(columns, chunk.T):
+                column.append(values)
+        if not columns[0]:
+            graph = cls()
+        else:
+            src = np.concatenate(columns[0]).astype(np.int64)
+            dst = np.concatenate(columns[1]).astype(np.int64)
+            weights = np.concatenate(columns[2]) if columns[2] else None
+            graph = cls.from_edges(src, dst, weights, symmetric=symmetric)
+        if cache:
+            graph.save(cache_dir, meta)
+        return graph
+
+    def save(self, cache_dir, meta=None):
+        """
+        Write the CSR arrays as .npy files (plus a meta.json) for memory-mapped
+        reopening. Each file is written under a temporary name and renamed
+        into place, so loaders running at the same time never map a partly
+        written array and concurrent saves of the same graph cannot mix.
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        arrays = {'indptr': self.indptr, 'indices': self.indices}
+        if self.weights is not None:
+            arrays['weights'] = self.weights
+        for name, array in arrays.items():
+            with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False, suffix='.tmp') as f:
+                np.save(f, array)
+                temp_path = f.name
+            os.replace(temp_path, os.path.join(cache_dir, name + ".npy"))
+        # meta.json goes last, so a cache interrupted mid-write is never trusted.
+        with tempfile.NamedTemporaryFile('w', dir=cache_dir, delete=False, suffix='.tmp') as f:
+            json.dump(dict(meta or {}, weighted=self.weights is not None), f)
+            temp_path = f.name
+        os.replace(temp_path, os.path.join(cache_dir, "meta.json"))
+
+    @classmethod
+    def open_cache(cls, cache_dir, meta=None):
+        """Memory-map a saved graph; returns None if it is missing or its meta does not match."""
+        try:
+            with open(os.path.join(cache_dir, "meta.json")) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta is not None and any(saved.get(key) != value for key, value in meta.items()):
+            return None
+        indptr = np.load(os.path.join(cache_dir, "indptr.npy"), mmap_mode='r')
+        indices = np.load(os.path.join(cache_dir, "indices.npy"), mmap_mode='r')
+        weights = np.load(os.path.join(cache_dir, "weights.npy"), mmap_mode='r') if saved.get('weighted') else None
+        return cls(indptr, indices, weights)
+
+def _read_edge_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield (rows, 2 or 3) float arrays parsed from an edge-list file, reading
+    about chunk_bytes at a time and always splitting on a line boundary.
+    """
+    n_columns = None
+    leftover = b""
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk_bytes)
+            data = leftover + block
+            if block:
+                cut = data.rfind(b"\n") + 1
+                data, leftover = data[:cut], data[cut:]
+            if b"#" in data or b"%" in data:
+                data = b"\n".join(line for line in data.splitlines() if not line.lstrip().startswith((b"#", b"%")))
+            # Chunks holding only comments or blank lines have nothing to parse.
+            if data.strip():
+                text = data.replace(b",", b" ").decode('ascii')
+                if n_columns is None:
+                    n_columns = len(next(line for line in text.splitlines() if line.strip()).split())
+                    if n_columns not in (2, 3):
+                        raise ValueError(f"Edge lists need 2 or 3 columns per line, found {n_columns} in {path}.")
+                values = np.fromstring(text, sep=' ')
+                if len(values) % n_columns:
+                    raise ValueError(f"Malformed edge list {path}: every line needs {n_columns} numbers.")
+                yield values.reshape(-1, n_columns)
+            if not block:
+                return
 
 class MemoryElement:
     """
@@ -42,106 +230,690 @@ class MemoryElement:
         self.search_energy = self.search_length * energy_per_cell  # the energy consumed in finding that document
         self.is_mesh = is_mesh
         self.position = position
+        self.vectors = None          # (n, d) float32 block, one stored document per row/cell
+        self.ids = None              # (n,) document ids of the rows
+        self._norms = None           # (n,) squared norms of the rows, reused by every query
+        self.queries_served = 0
+        self.length_spent = 0.0      # total measured search length over all queries served
 
-    def print_memory():
-        return
-    
-    def find_next(query):
-        return
+    def store(self, vectors, ids=None):
+        """
+        Load documents into the element as one contiguous float32 block.
+        Row r lives in cell r of a sqrt(memory_size)-wide square grid of cells.
+        """
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError(f"Expected an (n, d) block of vectors, got shape {vectors.shape}.")
+        if len(vectors) > self.memory_size:
+            raise ValueError(f"{len(vectors)} vectors do not fit in a memory of {self.memory_size} cells.")
+        self.vectors = vectors
+        self.ids = np.arange(len(vectors)) if ids is None else np.asarray(ids)
+        self._norms = np.einsum('ij,ij->i', vectors, vectors)
+
+    def cell_distances(self, rows):
+        """
+        Wire length from the element's port (cell 0) to the cells holding the
+        given rows: Manhattan distance on the cell grid times the cell pitch.
+        Averaged over a full memory this is close to search_length.
+        """
+        side = max(math.ceil(self.memory_size ** 0.5), 1)
+        rows = np.asarray(rows)
+        return ((rows % side) + (rows // side)) * (self.cell_area ** 0.5)
+
+    def print_memory(self):
+        print(f"MemoryElement {self.name} at {self.position} ({'mesh' if self.is_mesh else 'htree'})")
+        stored = 0 if self.vectors is None else len(self.vectors)
+        print(f"  {stored}/{self.memory_size} cells used, modelled search energy {self.search_energy:.3f}")
+        if self.queries_served:
+            measured = self.length_spent / self.queries_served
+            print(f"  {self.queries_served} queries served, measured search length {measured:.3f} (model {self.search_length:.3f})")
+        if stored:
+            for doc_id, vector in zip(self.ids, self.vectors):
+                print(f"  [{doc_id}] {np.array2string(vector, precision=3, threshold=8)}")
+
+    def find_next(self, query, k=1, chunk_bytes=CHUNK_BYTES):
+        """
+        Find the k stored documents nearest each query (squared Euclidean).
+
+        Queries are handled in blocks sized to chunk_bytes, with distances from
+        one matrix product per block. Each query is charged the length to the
+        farthest of its k matched cells (see cell_distances), times
+        energy_per_cell. The element keeps running totals of that measured
+        work to compare against the modelled search_length.
+
+        Args:
+            query: a (d,) vector or a (q, d) batch
+            k: matches per query, at least 1; capped at the number stored
+
+        Returns:
+            (ids, distances, energies): (q, k), (q, k) and (q,) arrays; a
+            single (d,) query gives (k,), (k,) and a float
+        """
+        if self.vectors is None or not len(self.vectors):
+            raise ValueError(f"MemoryElement {self.name} has no stored vectors.")
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}.")
+        queries = np.asarray(query, dtype=np.float32)
+        single = queries.ndim == 1
+        queries = np.atleast_2d(queries)
+        k = min(k, len(self.vectors))
+        rows = np.empty((len(queries), k), dtype=np.int64)
+        distances = np.empty((len(queries), k), dtype=np.float32)
+        for start, stop in _row_chunks(len(queries), len(self.vectors) * 4, chunk_bytes):
+            block = queries[start:stop]
+            scores = self._norms - 2 * (block @ self.vectors.T)
+            if k < len(self.vectors):
+                nearest = np.argpartition(scores, k - 1, axis=1)[:, :k]
+            else:
+                nearest = np.broadcast_to(np.arange(k), (len(block), k))
+            nearest_scores = np.take_along_axis(scores, nearest, axis=1)
+            order = np.argsort(nearest_scores, axis=1)
+            rows[start:stop] = np.take_along_axis(nearest, order, axis=1)
+            block_norms = np.einsum('ij,ij->i', block, block)
+            distances[start:stop] = np.maximum(np.take_along_axis(nearest_scores, order, axis=1) + block_norms[:, None], 0)
+        lengths = self.cell_distances(rows).max(axis=1)
+        self.queries_served += len(queries)
+        self.length_spent += float(lengths.sum())
+        energies = lengths * self.energy_per_cell
+        if single:
+            return self.ids[rows[0]], distances[0], float(energies[0])
+        return self.ids[rows], distances, energies
     
+def _first_level(suffix: str, config: GeometryConfig):
+    """Axis and segment length of the first level of a blueprint suffix."""
+    orientation = suffix[0]
+    if orientation not in '012':
+        raise ValueError(f"Invalid blueprint character '{orientation}'. Only 0, 1 and 2 are allowed.")
+    total_turns = suffix.count(orientation)
+    unit = config.layer_height if orientation == '2' else config.pitch
+    # A final Z split leaves its junction between two layers; the vertical
+    # run is still counted at full length.
+    return int(orientation), (unit * 2**total_turns)/2
+
+def htree_level_table(blueprint: str, config: GeometryConfig = None):
+    """
+    Per-level (axis, segment length) pairs for an H-tree blueprint.
+
+    A level's segment spans half of the subtree below it along its axis, so
+    its length doubles with every later level that splits along the same
+    axis. Children sit at +/- half the segment length from their parent.
+    """
+    return [(template.axis, template.length) for template in subtree_template(blueprint, config).chain()]
+
+class SubtreeTemplate:
+    """
+    The geometry of an H-tree blueprint suffix, relative to its own center.
+
+    A template only stores its root segment and a reference to the shared
+    template of the next suffix. Every subtree with the same suffix is the
+    same template translated by an offset, so an n-level tree needs n
+    templates and coordinates are only expanded when something asks for them.
+    """
+    __slots__ = ('suffix', 'axis', 'length', 'offset', 'child', 'depth', 'wire_length')
+
+    def __init__(self, suffix, axis, length, child):
+        self.suffix = suffix
+        self.axis = axis
+        self.length = length
+        self.child = child
+        self.offset = np.zeros(3)
+        if child is None:
+            self.depth = 0
+            self.wire_length = 0.0
+        else:
+            self.offset[axis] = length/2
+            self.depth = child.depth + 1
+            self.wire_length = length + 2*child.wire_length
+
+    def chain(self):
+        """Yield this template and its descendants, root level first (leaf excluded)."""
+        template = self
+        while template.child is not None:
+            yield template
+            template = template.child
+
+    def descendant(self, depth):
+        """The template depth levels below this one."""
+        template = self
+        for _ in range(depth):
+            template = template.child
+        return template
+
+    def half_extent(self):
+        """Half-size of the box around this subtree's leaves, per axis."""
+        return sum((template.offset for template in self.chain()), np.zeros(3))
+
+    def instance_offsets(self, depth, dtype=np.float64):
+        """
+        Translations of the 2^depth subtrees that sit depth levels below this
+        template's center, in index order.
+        """
+        offsets = np.zeros((1, 3), dtype=dtype)
+        for _, template in zip(range(depth), self.chain()):
+            step = template.offset.astype(dtype)
+            offsets = np.stack((offsets + step, offsets - step), axis=1).reshape(-1, 3)
+        return offsets
+
+    def leaf_offset(self, leaf_index):
+        """Position of one leaf relative to the center, in O(depth)."""
+        position = np.zeros(3)
+        for level, template in enumerate(self.chain()):
+            if (leaf_index >> (self.depth - 1 - level)) & 1:
+                position -= template.offset
+            else:
+                position += template.offset
+        return position
+
+    def expand(self, dtype=np.float64, max_depth=None):
+        """
+        Materialize the subtree one level at a time.
+
+        Level k's 2^k centers are the endpoints of level k-1's segments, so each
+        level is a single array expression instead of 2^k recursive calls.
+        With max_depth only the first max_depth levels are built.
+
+        Returns:
+            segments: (2^n - 1, 6) endpoints, root level first
+            levels: (2^n - 1,) level of each segment
+            leaves: (2^n, 3) memory positions indexed by leaf index (the
+                subtree centers at max_depth when it is given)
+        """
+        depth = self.depth if max_depth is None else min(max_depth, self.depth)
+        n_segments = 2**depth - 1
+        segments = np.empty((n_segments, 6), dtype=dtype)
+        levels = np.empty(n_segments, dtype=np.int16)
+        centers = np.zeros((1, 3), dtype=dtype)
+        start = 0
+        for level, template in zip(range(depth), self.chain()):
+            stop = start + len(centers)
+            offset = template.offset.astype(dtype)
+            np.add(centers, offset, out=segments[start:stop, :3])
+            np.subtract(centers, offset, out=segments[start:stop, 3:])
+            levels[start:stop] = level
+            # Rows are (positive child, negative child), so this view interleaves them as 2i, 2i+1.
+            centers = segments[start:stop].reshape(-1, 3)
+            start = stop
+        return segments, levels, centers.copy()
+
+# Templates kept for reuse; a blueprint of n levels holds n + 1 of them.
+TEMPLATE_CACHE_SIZE = 4096
+
+def subtree_template(suffix: str, config: GeometryConfig = None) -> SubtreeTemplate:
+    """
+    Return the shared template for a blueprint suffix, building and caching
+    the templates of its own suffixes on the way.
+    """
+    return _cached_template(suffix, default_geometry() if config is None else config)
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _cached_template(suffix, config):
+    instrumentation.count('blueprint.templates_built')
+    if suffix == "":
+        return SubtreeTemplate("", None, 0.0, None)
+    axis, length = _first_level(suffix, config)
+    return SubtreeTemplate(suffix, axis, length, _cached_template(suffix[1:], config))
+
+def generate_htree_arrays(blueprint: str, config: GeometryConfig = None, dtype=np.float64):
+    """Build all segments, their levels and the leaf positions of an H-tree centered on the origin."""
+    return subtree_template(blueprint, config).expand(dtype)
+
+def _row_chunks(n_rows, row_bytes, chunk_bytes=CHUNK_BYTES):
+    """Yield (start, stop) row ranges holding roughly chunk_bytes each."""
+    step = max(1, int(chunk_bytes // max(row_bytes, 1)))
+    for start in range(0, n_rows, step):
+        yield start, min(start + step, n_rows)
+
+def iter_traffic(traffic, chunk_bytes=CHUNK_BYTES):
+    """
+    Yield a traffic description as (src, dst, weight) chunks.
+
+    Accepts (src, dst) or (src, dst, weight) index arrays, a dense square
+    matrix (read a block of rows at a time, so np.memmap inputs stay on
+    disk), or any sparse matrix with a tocoo() method.
+    """
+    if isinstance(traffic, tuple):
+        src = np.asarray(traffic[0])
+        dst = np.asarray(traffic[1])
+        weight = np.ones(len(src)) if len(traffic) < 3 else np.asarray(traffic[2], dtype=float)
+        step = max(1, chunk_bytes // 64)
+        for start in range(0, len(src), step):
+            yield src[start:start+step], dst[start:start+step], weight[start:start+step]
+    elif hasattr(traffic, 'tocoo'):
+        coo = traffic.tocoo()
+        yield from iter_traffic((coo.row, coo.col, coo.data), chunk_bytes)
+    else:
+        n_rows = traffic.shape[0]
+        for start, stop in _row_chunks(n_rows, traffic.shape[1] * 8, chunk_bytes):
+            block = np.asarray(traffic[start:stop])
+            rows, cols = np.nonzero(block)
+            yield rows + start, cols, block[rows, cols].astype(float)
+
+@instrumentation.traced('metrics.traffic_energy')
+def traffic_energy(noc, traffic, h_cost=H_ENERGY_PER_UNIT, v_cost=V_ENERGY_PER_UNIT, chunk_bytes=CHUNK_BYTES):
+    """Sum weight * compute_energies(src, dst) over a traffic description for any NoC."""
+    total = 0.0
+    for src, dst, weight in iter_traffic(traffic, chunk_bytes):
+        total += float(np.dot(noc.compute_energies(src, dst, h_cost, v_cost), weight))
+    return total
+
+def segments_to_trace(segments):
+    """
+    Flatten (S,6) segments into x, y, z arrays of (start, end, NaN) triples,
+    the gap-separated form Scatter3d line traces expect.
+    """
+    segments = np.asarray(segments, dtype=float).reshape(-1, 6)
+    trace = np.full((3, len(segments), 3), np.nan)
+    trace[:, :, 0] = segments[:, :3].T
+    trace[:, :, 1] = segments[:, 3:].T
+    return trace[0].ravel(), trace[1].ravel(), trace[2].ravel()
+
+def box_edges(centers, half_extent):
+    """
+    Wireframe edges of axis-aligned boxes sharing one half extent, one box
+    per center. Flat axes are dropped, so a box with no height is drawn as a
+    single rectangle rather than two coincident ones.
+    """
+    half_extent = np.asarray(half_extent, dtype=float)
+    axes = np.flatnonzero(half_extent > 0)
+    signs = np.array(list(itertools.product((-1, 1), repeat=len(axes)))).reshape(-1, len(axes))
+    corners = np.zeros((len(signs), 3))
+    corners[:, axes] = signs * half_extent[axes]
+    pairs = [(i, j) for i, j in itertools.combinations(range(len(signs)), 2)
+             if np.count_nonzero(signs[i] != signs[j]) == 1]
+    edges = np.array([np.concatenate((corners[i], corners[j])) for i, j in pairs]).reshape(-1, 6)
+    centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+    return (edges[None, :, :] + np.tile(centers, 2)[:, None, :]).reshape(-1, 6)
+
+def _segment_metrics(segments, config):
+    """Wire length per orientation and TSV count measured from (S,6) segments."""
+    spans = np.abs(segments[:, :3] - segments[:, 3:])
+    wire_length = dict(zip('xyz', spans.sum(axis=0).tolist()))
+    return {
+        'wire_length': wire_length,
+        'total_wire_length': sum(wire_length.values()),
+        'tsv_count': int(round(wire_length['z'] / config.layer_height)),
+    }
+
+def cross_check_metrics(noc, rtol=1e-9):
+    """
+    Compare a generated NoC's closed-form metrics() against geometry_metrics().
+    Returns the metrics; raises ValueError listing any key that disagrees.
+    """
+    def as_array(value):
+        return np.asarray(list(value.values()) if isinstance(value, dict) else value, dtype=float)
+
+    analytic = noc.metrics()
+    measured = noc.geometry_metrics()
+    mismatched = [key for key, value in measured.items()
+                  if not np.allclose(as_array(analytic[key]), as_array(value), rtol=rtol)]
+    if mismatched:
+        raise ValueError(f"Closed-form metrics disagree with generated geometry for: {', '.join(mismatched)}")
+    return analytic
+
+def _mesh_links(blueprint, index_dtype=np.int64):
+    """
+    Links of an (X,Y,Z) mesh as (low, high) tile index pairs, all X links
+    first, then Y, then Z, each group in tile order of its low end.
+    Returns (links (E,2), link_axis (E,)).
+    """
+    size_x, size_y, size_z = blueprint
+    index = np.arange(size_x * size_y * size_z, dtype=index_dtype).reshape(size_z, size_y, size_x)
+    sources = (index[:, :, :-1].ravel(), index[:, :-1, :].ravel(), index[:-1, :, :].ravel())
+    strides = (1, size_x, size_x*size_y)
+    links = np.empty((sum(len(src) for src in sources), 2), dtype=index_dtype)
+    link_axis = np.empty(len(links), dtype=np.int8)
+    start = 0
+    for axis, (src, stride) in enumerate(zip(sources, strides)):
+        stop = start + len(src)
+        links[start:stop, 0] = src
+        links[start:stop, 1] = src + stride
+        link_axis[start:stop] = axis
+        start = stop
+    return links, link_axis
+
 class Mesh3D:
     """
     A 3D Mesh Generator.
+
+    Tiles are indexed as layer*Y*X + y*X + x. The default generator builds a
+    MemoryElement and line tuple per tile; the vectorized generator instead
+    stores tile centers in self.positions (N,3) and links in self.links (E,2)
+    and only creates MemoryElement views on request through memory_node().
     """
-    def __init__(self):
+    def __init__(self, config: GeometryConfig = None):
+        self.config = default_geometry() if config is None else config
         self.lines = []
         self.memory_nodes = []
+        self.blueprint = None
+        self.extent = (0, 0, 0)  # half-size of the layout, used for the viewer window
+        self.positions = None  # (N,3) tile centers, vectorized mode only
+        self.links = None      # (E,2) tile index pairs, vectorized mode only
+        self.link_axis = None  # (E,) 0/1/2 for X/Y/Z links, vectorized mode only
+        self._memory_views = {}
+
+    def _corner(self, blueprint):
+        config = self.config
+        corner_x = -(blueprint[0] * config.pe_size/2 + (config.gutter_width/2 * blueprint[0] - 1))
+        corner_y = -(blueprint[1] * config.pe_size/2 + (config.gutter_width/2 * blueprint[1] - 1))
+        corner_z = -(blueprint[2] * config.layer_height/2)
+        return (corner_x, corner_y, corner_z)
 
     def find_corner(self, blueprint):
-        global X_SIZE
-        global Y_SIZE
-        global Z_SIZE
-        corner_x = -(blueprint[0] * PE_SIZE/2 + (GUTTER_WIDTH/2 * blueprint[0] - 1))
-        corner_y = -(blueprint[1] * PE_SIZE/2 + (GUTTER_WIDTH/2 * blueprint[1] - 1))
-        corner_z = -(blueprint[2] * LAYER_HEIGHT/2)
-        X_SIZE = abs(corner_x)
-        Y_SIZE = abs(corner_y)
-        Z_SIZE = abs(corner_z)
+        corner_x, corner_y, corner_z = self._corner(blueprint)
+        self.extent = (abs(corner_x), abs(corner_y), abs(corner_z))
         return (corner_x, corner_y, corner_z)
 
-    def gen_noc_layout(self, blueprint):
+    @instrumentation.traced('layout.mesh')
+    def gen_noc_layout(self, blueprint, vectorized=False):
         """
         Create a Mesh network according to the blueprint (X,Y,Z tuple)
+
+        With vectorized=True the layout is kept as NumPy arrays (see
+        _gen_noc_arrays), which is the only practical option for meshes with
+        hundreds of thousands of tiles.
         """
+        self.blueprint = tuple(int(dim) for dim in blueprint)
+        instrumentation.count('layout.tiles', self.tile_count())
+        if vectorized:
+            self._gen_noc_arrays(self.blueprint)
+            return
+        self.positions = self.links = self.link_axis = None
         start_corner = self.find_corner(blueprint)
+        pitch = self.config.pitch
+        layer_height = self.config.layer_height
         for layer in range(blueprint[2]):
             for y_mem in range(blueprint[1]):
                 for x_mem in range (blueprint[0]):
-                    position = (start_corner[0]+(PE_SIZE+GUTTER_WIDTH)*x_mem, start_corner[1]+(PE_SIZE+GUTTER_WIDTH)*y_mem, start_corner[2]+layer*LAYER_HEIGHT)
+                    position = (start_corner[0]+pitch*x_mem, start_corner[1]+pitch*y_mem, start_corner[2]+layer*layer_height)
                     name = layer*blueprint[1]*blueprint[0]+y_mem*blueprint[0]+x_mem
                     self.memory_nodes.append(MemoryElement(name, True, position)) # Create memory nodes with a distinct name. TEMP naming system.
                     if layer != blueprint[2]-1:
-                        self.lines.append((position[0], position[1], position[2], position[0], position[1], position[2] + LAYER_HEIGHT))
+                        self.lines.append((position[0], position[1], position[2], position[0], position[1], position[2] + layer_height))
                     if y_mem != blueprint[1]-1:
-                        self.lines.append((position[0], position[1], position[2], position[0], position[1] + (PE_SIZE+GUTTER_WIDTH), position[2]))
+                        self.lines.append((position[0], position[1], position[2], position[0], position[1] + pitch, position[2]))
                     if x_mem != blueprint[0]-1:
-                        self.lines.append((position[0], position[1], position[2], position[0] + (PE_SIZE+GUTTER_WIDTH), position[1], position[2]))
+                        self.lines.append((position[0], position[1], position[2], position[0] + pitch, position[1], position[2]))
+        return
+
+    def _gen_noc_arrays(self, blueprint):
+        """
+        Array-backed mesh generation. Produces the same tile positions and
+        naming as the per-tile loop, with links grouped by axis (X, then Y,
+        then Z) and each link stored as (lower index, higher index).
+        """
+        size_x, size_y, size_z = blueprint
+        start_corner = self.find_corner(blueprint)
+        n_tiles = size_x * size_y * size_z
+        index_dtype = np.int32 if n_tiles < 2**31 else np.int64
+
+        positions = np.empty((size_z, size_y, size_x, 3))
+        positions[..., 0] = start_corner[0] + self.config.pitch * np.arange(size_x)
+        positions[..., 1] = (start_corner[1] + self.config.pitch * np.arange(size_y))[:, None]
+        positions[..., 2] = (start_corner[2] + self.config.layer_height * np.arange(size_z))[:, None, None]
+        self.positions = positions.reshape(n_tiles, 3)
+
+        self.links, self.link_axis = _mesh_links(blueprint, index_dtype)
+        self._memory_views = {}
         return
 
+    def memory_node(self, index):
+        """
+        Return the MemoryElement for a tile index. In vectorized mode the
+        element is created the first time it is asked for and then reused.
+        """
+        if self.positions is None:
+            return self.memory_nodes[index]
+        index = int(index)
+        if index not in self._memory_views:
+            self._memory_views[index] = MemoryElement(index, True, tuple(self.positions[index].tolist()))
+        return self._memory_views[index]
+
+    def tile_positions(self):
+        """Return the (N,3) array of tile centers for either generation mode."""
+        if self.positions is not None:
+            return self.positions
+        return np.array([node.position for node in self.memory_nodes], dtype=float).reshape(-1, 3)
+
+    def segments(self, rows=None):
+        """Return links (all of them, or the given rows) as an (E,6) array of (x1,y1,z1, x2,y2,z2)."""
+        if self.links is not None:
+            links = self.links if rows is None else self.links[rows]
+            return np.hstack((self.positions[links[:, 0]], self.positions[links[:, 1]]))
+        lines = np.array(self.lines, dtype=float).reshape(-1, 6)
+        return lines if rows is None else lines[rows]
+
     def find_distance(self, node_b, node_a):
         """
         Computes the distances along the shortest wire path between nodes.
         Returns distance in an (x+y,z) tuple, to allow for after-the-fact vertical cost changes.
         """
-        dist_h = abs(node_b.position[0] - node_a.position[0]) + abs(node_b.position[1] + node_a.position[1])
+        dist_h = abs(node_b.position[0] - node_a.position[0]) + abs(node_b.position[1] - node_a.position[1])
         dist_v = abs(node_b.position[2] - node_a.position[2])
         return (dist_h, dist_v)
     
-    def compute_energy(self, node_a, node_b):
+    def compute_energy(self, node_a, node_b, h_cost=H_ENERGY_PER_UNIT, v_cost=V_ENERGY_PER_UNIT):
         """
         Takes two arbitrary memories, computes the power consumption to send a bit between them.        
+        Energy is linear in wire length, with separate per-unit costs for horizontal wire and TSVs.
         """
-        dists = self.find_distance(self, node_a, node_b)
-        
-        ### TODO: Fill in whatever logic/model we base our energy consumption on... Do we actually care about values, or just linear/quadratic scaling?
-        return
+        dist_h, dist_v = self.find_distance(node_a, node_b)
+        return dist_h * h_cost + dist_v * v_cost
+
+    def _require_layout(self):
+        if self.blueprint is None:
+            raise ValueError("No Mesh generated. Call gen_noc_layout() first.")
+        return self.blueprint
+
+    def tile_count(self):
+        size_x, size_y, size_z = self._require_layout()
+        return size_x * size_y * size_z
+
+    def link_graph(self):
+        """
+        The router graph behind the layout: every tile is a router.
+
+        Returns:
+            links: (E,2) router index pairs, laid out as in _mesh_links
+            lengths: (E,) wire length of each link
+            vertical: (E,) True for TSV (Z) links
+            tile_routers: (N,) router of each tile
+        """
+        blueprint = self._require_layout()
+        if self.links is not None:
+            links, link_axis = self.links, self.link_axis
+        else:
+            links, link_axis = _mesh_links(blueprint)
+        vertical = link_axis == 2
+        lengths = np.where(vertical, float(self.config.layer_height), float(self.config.pitch))
+        return links, lengths, vertical, np.arange(self.tile_count())
+
+    def tile_coordinates(self, indices):
+        """Split tile indices into integer (x, y, layer) grid coordinates."""
+        size_x, size_y, _ = self._require_layout()
+        indices = np.asarray(indices, dtype=np.int64)
+        return indices % size_x, (indices // size_x) % size_y, indices // (size_x * size_y)
+
+    def find_distances(self, src, dst):
+        """
+        Batch version of find_distance on tile indices.
+        Returns (dist_h, dist_v) arrays of wire length under dimension-ordered routing.
+        """
+        src_x, src_y, src_z = self.tile_coordinates(src)
+        dst_x, dst_y, dst_z = self.tile_coordinates(dst)
+        dist_h = (np.abs(dst_x - src_x) + np.abs(dst_y - src_y)) * float(self.config.pitch)
+        dist_v = np.abs(dst_z - src_z) * float(self.config.layer_height)
+        instrumentation.count('distance.pairs', dist_h.size)
+        return dist_h, dist_v
+
+    def compute_energies(self, src, dst, h_cost=H_ENERGY_PER_UNIT, v_cost=V_ENERGY_PER_UNIT):
+        """Batch version of compute_energy on tile indices."""
+        dist_h, dist_v = self.find_distances(src, dst)
+        return dist_h * h_cost + dist_v * v_cost
+
+    def traffic_energy(self, traffic, h_cost=H_ENERGY_PER_UNIT, v_cost=V_ENERGY_PER_UNIT, chunk_bytes=CHUNK_BYTES):
+        """
+        Total energy of a traffic pattern, worked through in bounded-size chunks.
+
+        Args:
+            traffic: (src, dst) or (src, dst, weight) index arrays, a dense (N,N)
+                matrix (a np.memmap works), or a scipy sparse matrix
+        """
+        return traffic_energy(self, traffic, h_cost, v_cost, chunk_bytes)
+
+    def all_pairs_distances(self, out=None, dtype=np.float32, chunk_bytes=CHUNK_BYTES):
+        """
+        Distances between every pair of tiles as a (2,N,N) array of [dist_h, dist_v].
+
+        Rows are filled a block at a time so the working set stays near
+        chunk_bytes. If out is a file path the result is written to a
+        memory-mapped .npy file (reopen with np.load(out, mmap_mode='r')).
+        """
+        n_tiles = self.tile_count()
+        if out is None:
+            result = np.empty((2, n_tiles, n_tiles), dtype=dtype)
+        else:
+            result = np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=(2, n_tiles, n_tiles))
+        all_x, all_y, all_z = self.tile_coordinates(np.arange(n_tiles))
+        pitch = float(self.config.pitch)
+        layer_height = float(self.config.layer_height)
+        for start, stop in _row_chunks(n_tiles, n_tiles * 8 * 3, chunk_bytes):
+            rows = slice(start, stop)
+            result[0, rows] = (np.abs(all_x[rows, None] - all_x) + np.abs(all_y[rows, None] - all_y)) * pitch
+            result[1, rows] = np.abs(all_z[rows, None] - all_z) * layer_height
+        if out is not None:
+            result.flush()
+        return result
     
+    @instrumentation.traced('metrics.mesh')
+    def metrics(self, blueprint=None):
+        """
+        Closed-form topology metrics for an (X,Y,Z) mesh, without generating it.
+
+        The mesh has no root, so root distances are measured to the tile at
+        (X//2, Y//2, Z//2). Keys match HTree3D.metrics where the concepts
+        overlap; see cross_check_metrics to compare against generated geometry.
+        """
+        size_x, size_y, size_z = self._require_layout() if blueprint is None else tuple(int(dim) for dim in blueprint)
+        pitch = self.config.pitch
+        layer_height = self.config.layer_height
+        wire_length = {
+            'x': float((size_x - 1) * size_y * size_z * pitch),
+            'y': float(size_x * (size_y - 1) * size_z * pitch),
+            'z': float(size_x * size_y * (size_z - 1) * layer_height),
+        }
+        corner = self._corner((size_x, size_y, size_z))
+        far_corner = (corner[0] + (size_x - 1) * pitch, corner[1] + (size_y - 1) * pitch, corner[2] + (size_z - 1) * layer_height)
+
+        def mean_offset(n):
+            center = n // 2
+            return (center * (center + 1) + (n - 1 - center) * (n - center)) / (2 * n)
+
+        def max_offset(n):
+            return max(n // 2, n - 1 - n // 2)
+
+        return {
+            'tiles': size_x * size_y * size_z,
+            'wire_length': wire_length,
+            'total_wire_length': sum(wire_length.values()),
+            'tsv_count': size_x * size_y * (size_z - 1),
+            'link_lengths': {'x': float(pitch), 'y': float(pitch), 'z': float(layer_height)},
+            'bounding_box': (tuple(float(c) for c in corner), tuple(float(c) for c in far_corner)),
+            'avg_root_distance': (mean_offset(size_x) + mean_offset(size_y)) * pitch + mean_offset(size_z) * layer_height,
+            'max_root_distance': float((max_offset(size_x) + max_offset(size_y)) * pitch + max_offset(size_z) * layer_height),
+        }
+
+    @instrumentation.traced('metrics.mesh.avg_distance')
+    def avg_distance(self, blueprint=None):
+        """
+        Expected (dist_h, dist_v) between two uniformly random tiles, in closed
+        form: E|i - j| = (n^2 - 1) / 3n along an axis of n tiles.
+        """
+        size_x, size_y, size_z = self._require_layout() if blueprint is None else tuple(int(dim) for dim in blueprint)
+        mean_gap = lambda n: (n * n - 1) / (3 * n)
+        return ((mean_gap(size_x) + mean_gap(size_y)) * self.config.pitch,
+                mean_gap(size_z) * self.config.layer_height)
+
+    @instrumentation.traced('metrics.mesh.geometry')
+    def geometry_metrics(self):
+        """The subset of metrics() measured from the generated lines and tiles."""
+        size_x, size_y, size_z = self._require_layout()
+        positions = self.tile_positions()
+        root = positions[(size_z // 2) * size_y * size_x + (size_y // 2) * size_x + size_x // 2]
+        root_distance = np.abs(positions - root).sum(axis=1)
+        return dict(_segment_metrics(self.segments(), self.config),
+                    tiles=len(positions),
+                    bounding_box=(tuple(positions.min(axis=0).tolist()), tuple(positions.max(axis=0).tolist())),
+                    avg_root_distance=float(root_distance.mean()),
+                    max_root_distance=float(root_distance.max()))
+
+    @instrumentation.traced('figure.mesh')
     def create_plotly_figure(self, title: str = "3D Mesh Visualization", 
-                           isometric: bool = False) -> go.Figure:
+                           isometric: bool = False, render_budget: int = RENDER_BUDGET) -> go.Figure:
         """
         Create a Plotly 3D figure from the generated Mesh.
+
+        Meshes with more than render_budget links are drawn as one outline
+        per layer plus a fixed random sample of links and tiles, so the
+        figure stays interactive.
         
         Returns:
             Plotly Figure object with interactive 3D visualization
         """
-        if not self.lines:
+        if not self.lines and self.positions is None:
             raise ValueError("No Mesh generated. Call gen_noc_layout() first.")
         
+        import plotly.graph_objects as go
         fig = go.Figure()
+        rng = np.random.default_rng(0)
+
+        n_links = len(self.links) if self.links is not None else len(self.lines)
+        if n_links <= render_budget:
+            segments = self.segments()
+            line_name = 'Routing Lines'
+        else:
+            size_x, size_y, size_z = self.blueprint
+            corner = self._corner(self.blueprint)
+            half_extent = ((size_x - 1) * self.config.pitch / 2, (size_y - 1) * self.config.pitch / 2, 0)
+            layer_centers = np.zeros((size_z, 3))
+            layer_centers[:, 0] = corner[0] + half_extent[0]
+            layer_centers[:, 1] = corner[1] + half_extent[1]
+            layer_centers[:, 2] = corner[2] + self.config.layer_height * np.arange(size_z)
+            outlines = box_edges(layer_centers, half_extent)
+            x_lines, y_lines, z_lines = segments_to_trace(outlines)
+            fig.add_trace(go.Scatter3d(
+                x=x_lines,
+                y=y_lines,
+                z=z_lines,
+                mode='lines',
+                line=dict(color="white", width = 2),
+                name='Layer Outlines',
+                hoverinfo='skip'
+            ))
+            sample = np.sort(rng.choice(n_links, size=max(render_budget - len(outlines), 0), replace=False))
+            segments = self.segments(sample)
+            line_name = f'Routing Lines ({len(sample)} of {n_links} shown)'
 
-        x_lines = []
-        y_lines = []
-        z_lines = []
-        for line in self.lines:
-            x1, y1, z1, x2, y2, z2 = line
-            x_lines.extend([x1, x2, None])
-            y_lines.extend([y1, y2, None])
-            z_lines.extend([z1, z2, None])
-                    
+        x_lines, y_lines, z_lines = segments_to_trace(segments)
         fig.add_trace(go.Scatter3d(
             x=x_lines,
             y=y_lines,
             z=z_lines,
             mode='lines',
             line=dict(color="yellow", width = 1),
-            name='Routing Lines',
+            name=line_name,
             hoverinfo='skip'
         ))
         
-        if self.memory_nodes:
-            x_nodes = [node.position[0] for node in self.memory_nodes]
-            y_nodes = [node.position[1] for node in self.memory_nodes]
-            z_nodes = [node.position[2] for node in self.memory_nodes]
+        if self.memory_nodes or self.positions is not None:
+            tile_positions = self.tile_positions()
+            node_name = 'Memory Nodes'
+            if len(tile_positions) > render_budget:
+                sample = np.sort(rng.choice(len(tile_positions), size=render_budget, replace=False))
+                node_name = f'Memory Nodes ({render_budget} of {len(tile_positions)} shown)'
+                tile_positions = tile_positions[sample]
+            x_nodes = tile_positions[:, 0]
+            y_nodes = tile_positions[:, 1]
+            z_nodes = tile_positions[:, 2]
             
             fig.add_trace(go.Scatter3d(
                 x=x_nodes,
@@ -154,7 +926,7 @@ class Mesh3D:
                     opacity=0.8,
                     line=dict(width=0)  # Remove white outline
                 ),
-                name='Memory Nodes',
+                name=node_name,
                 hoverinfo='x+y+z'
             ))
         
@@ -168,7 +940,7 @@ class Mesh3D:
             scene=dict(
                 xaxis=dict(
                     title=dict(text='X', font=dict(color='white')), 
-                    range=[-1.5*X_SIZE, 1.5*X_SIZE],
+                    range=[-1.5*self.extent[0], 1.5*self.extent[0]],
                     backgroundcolor='rgb(40, 40, 40)',
                     gridcolor='rgb(120, 120, 120)',
                     showbackground=True,
@@ -177,7 +949,7 @@ class Mesh3D:
                 ),
                 yaxis=dict(
                     title=dict(text='Y', font=dict(color='white')), 
-                    range=[-1.5*Y_SIZE, 1.5*Y_SIZE],
+                    range=[-1.5*self.extent[1], 1.5*self.extent[1]],
                     backgroundcolor='rgb(40, 40, 40)',
                     gridcolor='rgb(120, 120, 120)',
                     showbackground=True,
@@ -186,7 +958,7 @@ class Mesh3D:
                 ),
                 zaxis=dict(
                     title=dict(text='Z', font=dict(color='white')), 
-                    range=[-1.5*Z_SIZE, 1.5*Z_SIZE],
+                    range=[-1.5*self.extent[2], 1.5*self.extent[2]],
                     backgroundcolor='rgb(40, 40, 40)',
                     gridcolor='rgb(120, 120, 120)',
                     showbackground=True,
@@ -213,216 +985,344 @@ class Mesh3D:
             )
         )
         
+        instrumentation.count('figure.traces', len(fig.data))
+        instrumentation.count('figure.segments', len(segments))
         return fig
 
 class HTree3D:
     """
     A 3D H-tree generator.
+
+    Level k of a blueprint holds 2^k segments. Children of the segment with
+    index i at level k are numbered 2i (positive side) and 2i+1 (negative
+    side), so the bits of a leaf index read the root split first.
     """
     
-    def __init__(self):
-        self.lines = []  # Store all line segments as (x1,y1,z1, x2,y2,z2, layer)
+    def __init__(self, config: GeometryConfig = None):
+        self.config = default_geometry() if config is None else config
         self.colors = ['red', 'orange', 'green']  # Color cycle
         self.nodes = []
         self.memories = []
+        self.blueprint = ""
+        self.template = None         # shared SubtreeTemplate of the whole blueprint
+        self._segments = None        # (S,6) segment endpoints, ordered by level
+        self._segment_levels = None  # (S,) level of each segment, 0 is the root
+        self._leaf_positions = None  # (2^n,3) memory positions by leaf index
+        self._lines = None
+        self._memory_views = {}
+        self._distance_table = None
+
+    @property
+    def lines(self):
+        """All line segments as (x1,y1,z1, x2,y2,z2, layer) tuples, built on first use."""
+        if self._lines is None:
+            if self.template is None:
+                return []
+            self._expand()
+            self._lines = [(*row, int(level)) for row, level in zip(self._segments.tolist(), self._segment_levels)]
+        return self._lines
 
+    @instrumentation.traced('layout.htree')
     def gen_noc_layout(self, blueprint: str) -> None:
         """
         Generate H-tree based on a blueprint string.
+
+        Only the shared subtree templates are built here; coordinates are
+        expanded the first time segments(), leaf_positions() or lines is used.
         """
+        self.blueprint = blueprint
+        self._segments = self._segment_levels = self._leaf_positions = None
+        self._lines = None
+        self._memory_views = {}
+        self._distance_table = None
         if len(blueprint) <= 0:
+            self.template = None
             return
 
-        self._configurable_generate_level((0,0,0), blueprint, 0)
+        with instrumentation.span('blueprint.parse', levels=len(blueprint)):
+            self.template = subtree_template(blueprint, self.config)
+        instrumentation.count('layout.tiles', 2**len(blueprint))
+
+    def _expand(self):
+        if self._segments is None and self.template is not None:
+            with instrumentation.span('layout.htree.expand', levels=self.template.depth):
+                self._segments, self._segment_levels, self._leaf_positions = self.template.expand()
+            instrumentation.count('layout.segments', len(self._segments))
+
+    def segments(self):
+        """Return all segments as an (S,6) array, root level first."""
+        self._expand()
+        return self._segments
+
+    def segment_levels(self):
+        """Return the level of every row of segments()."""
+        self._expand()
+        return self._segment_levels
+
+    def leaf_positions(self):
+        """Return the (2^n,3) array of memory positions, indexed by leaf index."""
+        self._expand()
+        return self._leaf_positions
 
-    def _configurable_generate_level(self,center, blueprint, layer) -> None:
-        """Recursive structure for building abritrarily oriented (but legal) 3d htrees
-        each layer passes a 1-shorter slice of instructions to the next set of levels.
+    def leaf_position(self, index):
+        """Position of a single leaf, computed from the templates without expanding the tree."""
+        if self._leaf_positions is not None:
+            return self._leaf_positions[index]
+        return self.template.leaf_offset(int(index))
+
+    def memory_node(self, index):
+        """Return a MemoryElement view of a leaf, created on first request."""
+        index = int(index)
+        if index not in self._memory_views:
+            self._memory_views[index] = MemoryElement(index, False, tuple(self.leaf_position(index).tolist()))
+        return self._memory_views[index]
+
+    def distance_table(self):
         """
-        global LAYER_HEIGHT
-        if blueprint == "":
-            return
+        Per-level wire lengths for leaf-to-leaf paths.
 
-        orientation = blueprint[0]
-        total_turns = 0
-        for ch in blueprint[0]:
-            if ch == orientation:
-                total_turns += 1
-
-        x = center[0]
-        y = center[1]
-        z = center[2]
-
-        if orientation == '0': ### X DIRECTION ###
-            length = ((PE_SIZE + GUTTER_WIDTH)* 2**(total_turns))/2
-            sub_side = (x+length, y, z)
-            pos_side = (x-length, y, z)
-
-        elif orientation == '1': ### Y DIRECTION ###
-            length = ((PE_SIZE + GUTTER_WIDTH)* 2**(total_turns))/2
-            sub_side = (x, y+length, z)
-            pos_side = (x , y-length, z)
-        
-        elif orientation == '2': ### Z DIRECTION ###
-            if total_turns > 1:
-                length = (LAYER_HEIGHT* 2**(total_turns))/2
-                sub_side = (x, y, z+LAYER_HEIGHT)
-                pos_side = (x , y, z-LAYER_HEIGHT)
-            else:
-                # Last split, we need to handle our inefficiency here.
-                ######## TODO: ######################################################################## 
-                print("CANNOT HANDLE LAST VERTICAL RUN CORRECTLY.")
-                length = (LAYER_HEIGHT* 2**(total_turns))/2
-                sub_side = (x, y, z+LAYER_HEIGHT)
-                pos_side = (x , y, z-LAYER_HEIGHT)
-
-
-        self.add_line(sub_side,pos_side, layer)
-        self._configurable_generate_level(sub_side, blueprint[1:], layer+1)
-        self._configurable_generate_level(pos_side, blueprint[1:], layer+1)
-        print("CREATE NODES AND MEMORIES")
-        return
-    
-    def add_line(self, point1: Tuple[float, float, float], 
-                 point2: Tuple[float, float, float], layer) -> None:
-        """Add a line segment to the tree."""
-        self.lines.append((*point1, *point2, layer))
-        # Store points with their associated layer for size scaling
-        
+        Two leaves whose indices first differ at level L (the highest differing
+        bit) meet on a level-L segment. Their path crosses that whole segment
+        and one half of every deeper segment on each side, which adds up to
+        the sum of the segment lengths from level L down. Returns the
+        (horizontal, vertical) suffix sums indexed by L, with a trailing zero
+        for identical leaves.
+        """
+        if self._distance_table is None:
+            if self.template is None:
+                raise ValueError("No H-tree generated. Call gen_noc_layout() first.")
+            lengths = np.array([template.length for template in self.template.chain()] + [0.0])
+            vertical = np.array([template.axis == 2 for template in self.template.chain()] + [False])
+            suffix_h = np.cumsum((lengths * ~vertical)[::-1])[::-1]
+            suffix_v = np.cumsum((lengths * vertical)[::-1])[::-1]
+            self._distance_table = (suffix_h, suffix_v)
+        return self._distance_table
+
+    def lca_levels(self, src, dst):
+        """Level of the lowest common ancestor segment of two leaf indices (depth for identical leaves)."""
+        diff = np.bitwise_xor(np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64))
+        # frexp's exponent is the bit length of each difference, exact below 2^53.
+        bit_length = np.frexp(diff.astype(np.float64))[1]
+        return self.template.depth - bit_length
+
+    def find_distances(self, src, dst):
+        """
+        Batch leaf-to-leaf wire distance on leaf indices, O(1) per pair.
+        Returns (dist_h, dist_v) arrays, like Mesh3D.find_distances.
+        """
+        suffix_h, suffix_v = self.distance_table()
+        levels = self.lca_levels(src, dst)
+        instrumentation.count('distance.pairs', levels.size)
+        return suffix_h[levels], suffix_v[levels]
 
     def find_distance(self, node_b, node_a):
-        return
+        """
+        Computes the wire distance between two memories along the tree.
+        Returns distance in an (x+y,z) tuple, to allow for after-the-fact vertical cost changes.
+        """
+        dist_h, dist_v = self.find_distances(node_b.name, node_a.name)
+        return (float(dist_h), float(dist_v))
     
-    def compute_energy(node_b, node_a):
-        return
+    def compute_energy(self, node_a, node_b, h_cost=H_ENERGY_PER_UNIT, v_cost=V_ENERGY_PER_UNIT):
+        """
+        Takes two arbitrary memories, computes the power consumption to send a bit between them.
+        """
+        dist_h, dist_v = self.find_distance(node_a, node_b)
+        return dist_h * h_cost + dist_v * v_cost
 
+    def compute_energies(self, src, dst, h_cost=H_ENERGY_PER_UNIT, v_cost=V_ENERGY_PER_UNIT):
+        """Batch version of compute_energy on leaf indices."""
+        dist_h, dist_v = self.find_distances(src, dst)
+        return dist_h * h_cost + dist_v * v_cost
+
+    def traffic_energy(self, traffic, h_cost=H_ENERGY_PER_UNIT, v_cost=V_ENERGY_PER_UNIT, chunk_bytes=CHUNK_BYTES):
+        """Total energy of a traffic pattern; see iter_traffic for the accepted forms."""
+        return traffic_energy(self, traffic, h_cost, v_cost, chunk_bytes)
+
+    def tile_count(self):
+        if self.template is None:
+            raise ValueError("No H-tree generated. Call gen_noc_layout() first.")
+        return 2**self.template.depth
+
+    def link_graph(self):
+        """
+        The router graph behind the layout, in heap order.
+
+        Router (2^k - 1) + i sits at the center of segment i of level k, and
+        the leaves (memories) are routers (2^n - 1) + leaf. Each half-segment
+        is a link from a router to its child, so link u - 1 joins router u to
+        its parent (u - 1) // 2 and is half as long as the parent's segment.
+
+        Returns:
+            links, lengths, vertical, tile_routers, as in Mesh3D.link_graph
+        """
+        n_tiles = self.tile_count()
+        chain = list(self.template.chain())
+        children = np.arange(1, 2 * n_tiles - 1)
+        child_levels = np.frexp((children + 1).astype(np.float64))[1] - 1
+        half_lengths = np.array([template.length / 2 for template in chain])
+        vertical_levels = np.array([template.axis == 2 for template in chain])
+        links = np.column_stack(((children - 1) // 2, children))
+        return links, half_lengths[child_levels - 1], vertical_levels[child_levels - 1], np.arange(n_tiles) + n_tiles - 1
+
+    @instrumentation.traced('metrics.htree')
+    def metrics(self, blueprint=None):
+        """
+        Closed-form topology metrics from the blueprint string in O(levels).
+
+        Level k contributes 2^k segments of its length. Every leaf is the same
+        distance from the root: half of one segment per level.
+        """
+        blueprint = self.blueprint if blueprint is None else blueprint
+        if not blueprint:
+            raise ValueError("No H-tree generated. Call gen_noc_layout() first.")
+        table = htree_level_table(blueprint, self.config)
+        wire_length = {'x': 0.0, 'y': 0.0, 'z': 0.0}
+        extent = [0.0, 0.0, 0.0]
+        for level, (axis, length) in enumerate(table):
+            wire_length['xyz'[axis]] += 2**level * length
+            extent[axis] += length/2
+        root_distance = sum(length/2 for _, length in table)
+        return {
+            'tiles': 2**len(table),
+            'wire_length': wire_length,
+            'total_wire_length': sum(wire_length.values()),
+            'tsv_count': int(round(wire_length['z'] / self.config.layer_height)),
+            'segment_lengths': [length for _, length in table],
+            'level_axes': ['xyz'[axis] for axis, _ in table],
+            'bounding_box': (tuple(-e for e in extent), tuple(extent)),
+            'avg_root_distance': root_distance,
+            'max_root_distance': root_distance,
+        }
+
+    @instrumentation.traced('metrics.htree.avg_distance')
+    def avg_distance(self):
+        """
+        Expected (dist_h, dist_v) between two uniformly random leaves: the common
+        ancestor sits at level L with probability 2^-(L+1), and the leaves
+        coincide with probability 2^-n.
+        """
+        suffix_h, suffix_v = self.distance_table()
+        depth = self.template.depth
+        probability = np.append(0.5 ** np.arange(1, depth + 1), 0.5 ** depth)
+        return float(np.dot(probability, suffix_h)), float(np.dot(probability, suffix_v))
+
+    @instrumentation.traced('metrics.htree.geometry')
+    def geometry_metrics(self):
+        """The subset of metrics() measured from the expanded segments and leaves."""
+        segments = self.segments()
+        levels = self.segment_levels()
+        leaves = self.leaf_positions()
+        lengths = np.abs(segments[:, :3] - segments[:, 3:]).sum(axis=1)
+        level_lengths = np.bincount(levels, weights=lengths) / np.bincount(levels)
+        return dict(_segment_metrics(segments, self.config),
+                    tiles=len(leaves),
+                    segment_lengths=level_lengths.tolist(),
+                    bounding_box=(tuple(leaves.min(axis=0).tolist()), tuple(leaves.max(axis=0).tolist())),
+                    avg_root_distance=float(level_lengths.sum() / 2),
+                    max_root_distance=float(level_lengths.sum() / 2))
+
+    def _render_depth(self, render_budget):
+        """
+        Deepest level count whose segments and junction markers, plus one
+        outline box per subtree cut off below it, fit in render_budget drawn
+        elements (line segments and points).
+        """
+        depth = self.template.depth
+        if 2 * (2**depth - 1) <= render_budget:
+            return depth
+        shown = 0
+        for candidate in range(1, depth):
+            box_cost = len(box_edges(np.zeros(3), self.template.descendant(candidate).half_extent()))
+            if 2 * (2**candidate - 1) + 2**candidate * box_cost > render_budget:
+                break
+            shown = candidate
+        return shown
+
+    @instrumentation.traced('figure.htree')
     def create_plotly_figure(self, title: str = "3D H-Tree Visualization", 
-                           isometric: bool = False) -> go.Figure:
+                           isometric: bool = False, render_budget: int = RENDER_BUDGET) -> go.Figure:
         """
         Create a Plotly 3D figure from the generated H-tree.
+
+        Only as many levels as fit in render_budget segments are expanded;
+        the subtrees below the last drawn level are shown as outline boxes.
         
         Returns:
             Plotly Figure object with interactive 3D visualization
         """
-        if not self.lines:
-            raise ValueError("No H-tree generated. Call generate_htree() first.")
+        if self.template is None or self.template.depth == 0:
+            raise ValueError("No H-tree generated. Call gen_noc_layout() first.")
+        extent = [high + self.config.pe_size for high in self.metrics()['bounding_box'][1]]
         
         # Create the 3D line plot
+        import plotly.graph_objects as go
         fig = go.Figure()
         
-        # Group lines by orientation for color coding
         # Red for X-direction, Orange for Y-direction, Green for Z-direction
         orientation_colors = {
             'x': 'red',
             'y': 'orange', 
             'z': 'green'
         }
-        
-        # Group lines by both orientation and layer for individual control
-        lines_by_orientation_and_layer = {}
-        
-        for line in self.lines:
-            x1, y1, z1, x2, y2, z2, layer = line
-            
-            # Determine orientation by checking which coordinate varies
-            if abs(x1 - x2) > 1e-10:  # Line varies in X dimension
-                orientation = 'x'
-            elif abs(y1 - y2) > 1e-10:  # Line varies in Y dimension
-                orientation = 'y'
-            elif abs(z1 - z2) > 1e-10:  # Line varies in Z dimension
-                orientation = 'z'
-            else:
-                continue  # Skip degenerate lines (shouldn't happen)
-            
-            key = (orientation, layer)
-            if key not in lines_by_orientation_and_layer:
-                lines_by_orientation_and_layer[key] = []
-            lines_by_orientation_and_layer[key].append((x1, y1, z1, x2, y2, z2))
-        
-        # Add traces for each orientation/layer combination
         orientation_names = {'x': 'X', 'y': 'Y', 'z': 'Z'}
-        
-        # Sort by layer first, then by orientation to preserve layer order
-        for (orientation, layer), lines in sorted(lines_by_orientation_and_layer.items(), key=lambda x: (x[0][1], x[0][0])):
-            x_lines, y_lines, z_lines = [], [], []
-            
-            for line_data in lines:
-                x1, y1, z1, x2, y2, z2 = line_data
-                x_lines.extend([x1, x2, None])  # None creates breaks between lines
-                y_lines.extend([y1, y2, None])
-                z_lines.extend([z1, z2, None])
-            
-            # Use consistent line width for all orientations
-            base_width = 12
-            color = orientation_colors[orientation]
-            
+
+        shown = self._render_depth(render_budget)
+        segments, _, cut_centers = self.template.expand(max_depth=shown)
+        level_axes = ['xyz'[template.axis] for template in self.template.chain()]
+
+        # Every level has a single orientation, so each level is one trace.
+        base_width = 12
+        for layer in range(shown):
+            orientation = level_axes[layer]
+            x_lines, y_lines, z_lines = segments_to_trace(segments[2**layer - 1:2**(layer + 1) - 1])
             fig.add_trace(go.Scatter3d(
                 x=x_lines,
                 y=y_lines,
                 z=z_lines,
                 mode='lines',
                 line=dict(
-                    color=color,
+                    color=orientation_colors[orientation],
                     width=max(base_width*(0.75**(layer-1)),1)
                 ),
                 name=f'Layer {layer} ({orientation_names[orientation]})',
                 hoverinfo='skip'
             ))
 
-            points_by_layer = {}
-            for point_data in all_points:
-                point, layer = point_data
-                if layer not in points_by_layer:
-                    points_by_layer[layer] = []
-                points_by_layer[layer].append(point)
-            
-            base_size = 12  # Starting size for level 1 junctions
-            
-            # Add special origin junction at (0,0,0) first so it renders with proper depth
-            all_x_points.append(0)
-            all_y_points.append(0)
-            all_z_points.append(0)
-            all_sizes.append(base_size)
-            all_colors.append('white')
-            
-            # Collect all points into single arrays for one trace
-            for layer in sorted(points_by_layer.keys()):
-                points = points_by_layer[layer]
-                
-                # Calculate junction size: scale with line width
-                junction_size = base_size * (0.85 ** (layer - 1))  # Same scaling as line width
-
-                
-                # Add to combined arrays
-                for point in points:
-                    point_key = (round(point[0], 10), round(point[1], 10), round(point[2], 10))
-                    
-                    # Determine junction color based on the line it sits at the center of
-                    if point_key in junction_center_orientations:
-                        orientation = junction_center_orientations[point_key]
-                        color = orientation_colors[orientation]
-                    else:
-                        color = 'white'  # Fallback for points not at center of any line
-                                                
-                    all_x_points.append(point[0])
-                    all_y_points.append(point[1])
-                    all_z_points.append(point[2])
-                    all_sizes.append(junction_size)
-                    all_colors.append(color)
-            
-            # Add all junctions (including origin) as a single trace
+        if shown < self.template.depth:
+            x_lines, y_lines, z_lines = segments_to_trace(
+                box_edges(cut_centers, self.template.descendant(shown).half_extent()))
             fig.add_trace(go.Scatter3d(
-                x=all_x_points,
-                y=all_y_points,
-                z=all_z_points,
+                x=x_lines,
+                y=y_lines,
+                z=z_lines,
+                mode='lines',
+                line=dict(color='gray', width=1),
+                name=f'Layers {shown}-{self.template.depth - 1} (collapsed)',
+                hoverinfo='skip'
+            ))
+
+        # Junctions sit at the center of each segment, colored by that segment's orientation.
+        # One trace per level keeps marker size and color scalar, so plotly validates a handful of
+        # values instead of one per junction. The origin junction goes first so it renders with proper depth.
+        base_size = 12  # Starting size for level 1 junctions
+        centers = (segments[:, :3] + segments[:, 3:]) / 2
+        for layer in range(shown):
+            level_centers = centers[2**layer - 1:2**(layer + 1) - 1]
+            fig.add_trace(go.Scatter3d(
+                x=level_centers[:, 0],
+                y=level_centers[:, 1],
+                z=level_centers[:, 2],
                 mode='markers',
                 marker=dict(
-                    size=all_sizes,
-                    color=all_colors,
+                    size=base_size if layer == 0 else base_size * (0.85 ** (layer - 1)),
+                    color='white' if layer == 0 else orientation_colors[level_axes[layer]],
                     opacity=0.8,
                     line=dict(width=0)  # Remove white outline
                 ),
                 name='Junctions',
+                legendgroup='junctions',
+                showlegend=layer == 0,
                 hoverinfo='x+y+z'
             ))
         
@@ -436,7 +1336,7 @@ class HTree3D:
             scene=dict(
                 xaxis=dict(
                     title=dict(text='X', font=dict(color='white')), 
-                    range=[-X_SIZE, X_SIZE],
+                    range=[-extent[0], extent[0]],
                     backgroundcolor='rgb(40, 40, 40)',
                     gridcolor='rgb(120, 120, 120)',
                     showbackground=True,
@@ -445,7 +1345,7 @@ class HTree3D:
                 ),
                 yaxis=dict(
                     title=dict(text='Y', font=dict(color='white')), 
-                    range=[-Y_SIZE, Y_SIZE],
+                    range=[-extent[1], extent[1]],
                     backgroundcolor='rgb(40, 40, 40)',
                     gridcolor='rgb(120, 120, 120)',
                     showbackground=True,
@@ -454,7 +1354,7 @@ class HTree3D:
                 ),
                 zaxis=dict(
                     title=dict(text='Z', font=dict(color='white')), 
-                    range=[-Z_SIZE, Z_SIZE],
+                    range=[-extent[2], extent[2]],
                     backgroundcolor='rgb(40, 40, 40)',
                     gridcolor='rgb(120, 120, 120)',
                     showbackground=True,
@@ -481,6 +1381,8 @@ class HTree3D:
             )
         )
         
+        instrumentation.count('figure.traces', len(fig.data))
+        instrumentation.count('figure.segments', len(segments))
         return fig
 
 def create_viz(blueprint, network_type: bool, isometric: bool = False) -> go.Figure:
@@ -498,9 +1400,44 @@ def create_viz(blueprint, network_type: bool, isometric: bool = False) -> go.Fig
 
     return noc.create_plotly_figure(title, isometric)
 
-def show_with_dark_background(fig: go.Figure):
-    html_content = fig.to_html(include_plotlyjs='cdn')
-    dark_css = """
+def build_layout(network_type, blueprint, config: GeometryConfig = None, expand: bool = False):
+    """
+    Build one layout (network_type 1 = Htree, 0 = Mesh, as in create_viz).
+    Meshes use the vectorized generator. H-trees only build their templates
+    unless expand=True, which is worth asking for inside a worker process.
+    """
+    if network_type == 1:
+        noc = HTree3D(config)
+        noc.gen_noc_layout(blueprint)
+        if expand:
+            noc.segments()
+    else:
+        noc = Mesh3D(config)
+        noc.gen_noc_layout(blueprint, vectorized=True)
+    return noc
+
+def build_layouts(jobs, use_processes: bool = False, max_workers=None, expand: bool = False):
+    """
+    Build many layouts concurrently and return them in job order.
+
+    Args:
+        jobs: iterable of (network_type, blueprint) or (network_type, blueprint, GeometryConfig)
+        use_processes: use a process pool instead of threads. Threads share
+            memory and the NumPy generators release the GIL for most of their
+            work; processes scale further but pickle every result back.
+    """
+    jobs = [tuple(job) + (None,) * (3 - len(job)) for job in jobs]
+    if not jobs:
+        return []
+    network_types, blueprints, configs = zip(*jobs)
+    if use_processes:
+        # Imported here: multiprocessing is a noticeable share of a cold start that only needs geometry.
+        from concurrent.futures import ProcessPoolExecutor
+    executor_type = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_type(max_workers=max_workers) as pool:
+        return list(pool.map(build_layout, network_types, blueprints, configs, [expand] * len(jobs)))
+
+DARK_CSS = """
     <style>
         body { 
             background-color: black !important; 
@@ -515,14 +1452,121 @@ def show_with_dark_background(fig: go.Figure):
     </style>
     """
 
-    html_content = html_content.replace('<head>', '<head>' + dark_css)
-    
-    # Save to a temporary file and open it
-    with tempfile.NamedTemporaryFile(mode='w', suffix='_dark_htree.html', delete=False) as f:
-        f.write(html_content)
+# NumPy dtypes plotly.js can decode from base64 typed arrays.
+_TYPED_ARRAY_CODES = {'float64': 'f8', 'float32': 'f4', 'int32': 'i4', 'uint32': 'u4',
+                      'int16': 'i2', 'uint16': 'u2', 'int8': 'i1', 'uint8': 'u1'}
+
+def cached_plotlyjs():
+    """
+    Path of the plotly.js bundle shipped with the installed plotly package,
+    copied once into PLOTLYJS_CACHE_DIR. No network access is needed.
+    """
+    import plotly.offline
+    path = os.path.join(PLOTLYJS_CACHE_DIR, f"plotly-{plotly.offline.get_plotlyjs_version()}.min.js")
+    if not os.path.exists(path):
+        os.makedirs(PLOTLYJS_CACHE_DIR, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=PLOTLYJS_CACHE_DIR, suffix='.tmp', delete=False, encoding='utf-8') as f:
+            f.write(plotly.offline.get_plotlyjs())
+            temp_path = f.name
+        os.replace(temp_path, path)
+    return path
+
+def _write_typed_array(out, array):
+    """Write a numeric array as a plotly.js typed array, base64-encoding it a chunk at a time."""
+    if array.dtype.name not in _TYPED_ARRAY_CODES:
+        fits_int32 = array.dtype.kind in 'biu' and (array.size == 0 or (array.min() >= -2**31 and array.max() < 2**31))
+        array = array.astype(np.int32 if fits_int32 else np.float64)
+    array = np.ascontiguousarray(array)
+    out.write(f'{{"dtype":"{_TYPED_ARRAY_CODES[array.dtype.name]}","bdata":"')
+    raw = array.reshape(-1).view(np.uint8)
+    step = 3 * (HTML_WRITE_BUFFER // 4)  # a multiple of 3 keeps every chunk free of padding
+    for start in range(0, len(raw), step):
+        out.write(base64.b64encode(raw[start:start + step]).decode('ascii'))
+    out.write('"')
+    if array.ndim > 1:
+        out.write(f',"shape":"{", ".join(str(dim) for dim in array.shape)}"')
+    out.write('}')
+
+def _write_js_value(out, value):
+    """Stream a figure dict as a JavaScript literal, writing numeric arrays as typed arrays."""
+    if isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+        _write_typed_array(out, value)
+    elif isinstance(value, dict):
+        out.write('{')
+        for i, (key, item) in enumerate(value.items()):
+            if i:
+                out.write(',')
+            out.write(json.dumps(str(key)))
+            out.write(':')
+            _write_js_value(out, item)
+        out.write('}')
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        numeric = np.asarray(value) if len(value) > 16 else None
+        if numeric is not None and numeric.dtype.kind in 'biuf':
+            _write_typed_array(out, numeric)
+            return
+        out.write('[')
+        for i, item in enumerate(value):
+            if i:
+                out.write(',')
+            _write_js_value(out, item)
+        out.write(']')
+    else:
+        if isinstance(value, np.generic):
+            value = value.item()
+        # Written as JavaScript, so NaN is allowed; "</" is escaped to keep the script tag intact.
+        out.write(json.dumps(value).replace('</', '<\\/'))
+
+@instrumentation.traced('html.write')
+def write_html(fig: go.Figure, path, plotlyjs: str = 'shared', dark: bool = True, div_id: str = 'htree-plot'):
+    """
+    Stream a figure to an HTML file without building the document in memory.
+
+    Traces are serialized one at a time with coordinates as base64 typed
+    arrays. plotly.js comes from the local cache: plotlyjs='shared' copies
+    the bundle next to the output once and every exported file in that
+    directory references it; plotlyjs='inline' embeds it for a single
+    self-contained file.
+    """
+    bundle = cached_plotlyjs()
+    with open(path, 'w', encoding='utf-8', buffering=HTML_WRITE_BUFFER) as out:
+        out.write('<html>\n<head>\n<meta charset="utf-8" />\n')
+        if dark:
+            out.write(DARK_CSS)
+        if plotlyjs == 'inline':
+            out.write('<script type="text/javascript">\n')
+            with open(bundle, encoding='utf-8') as js:
+                shutil.copyfileobj(js, out, HTML_WRITE_BUFFER)
+            out.write('\n</script>\n')
+        else:
+            shared_copy = os.path.join(os.path.dirname(os.path.abspath(path)), os.path.basename(bundle))
+            if not os.path.exists(shared_copy):
+                shutil.copyfile(bundle, shared_copy)
+            out.write(f'<script type="text/javascript" src="{os.path.basename(bundle)}"></script>\n')
+        out.write(f'</head>\n<body>\n<div id="{div_id}" class="plotly-graph-div"></div>\n')
+        out.write(f'<script type="text/javascript">\nPlotly.newPlot("{div_id}", [')
+        for i, trace in enumerate(fig.data):
+            if i:
+                out.write(',\n')
+            _write_js_value(out, trace.to_plotly_json())
+        out.write('],\n')
+        _write_js_value(out, fig.layout.to_plotly_json())
+        out.write(',\n{"responsive": true});\n</script>\n</body>\n</html>\n')
+    instrumentation.count('html.traces', len(fig.data))
+    if instrumentation.ENABLED:
+        instrumentation.count('html.bytes', os.path.getsize(path))
+    return path
+
+def show_with_dark_background(fig: go.Figure):
+    # Exports share one directory so the plotly.js bundle is only copied there once.
+    export_dir = os.path.join(tempfile.gettempdir(), "3dhtree_html")
+    os.makedirs(export_dir, exist_ok=True)
+    with tempfile.NamedTemporaryFile(suffix='_dark_htree.html', dir=export_dir, delete=False) as f:
         temp_path = f.name
+    write_html(fig, temp_path)
     
     # Open the dark-themed version in browser
+    import webbrowser
     webbrowser.open(f'file://{temp_path}')
 
 def choose_network_type():
@@ -605,7 +1649,7 @@ def main():
     if save_html in ['y', 'yes']:
         projection_suffix = "_isometric" if isometric else "_perspective"
         filename = f"htree_3d_{len(final_blueprint)}_levels{projection_suffix}.html"
-        fig.write_html(filename)
+        write_html(fig, filename)
         print(f"Saved as {filename}")
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+# Recording is off until enable() is called or HTREE_TRACE names a Chrome trace file to write at exit
+# ("{pid}" in it is replaced by the process id). While off, span() hands back a shared no-op context
+# manager and count() returns at once, so instrumented code pays one flag check.
+ENABLED = False
+TRACE_ENV = "HTREE_TRACE"
+# Pid of the process that first read TRACE_ENV, passed on to child processes through the environment.
+# Without "{pid}" in the path only that process writes the file, so worker processes (which inherit
+# TRACE_ENV) cannot overwrite it; their spans reach it through drain() and merge().
+TRACE_OWNER_ENV = "HTREE_TRACE_OWNER"
+
+_spans = []     # (name, start_ns, duration_ns, pid, thread id, args)
+_counts = {}
+_lock = threading.Lock()
+
+
+class _NullSpan:
+    """What span() returns while recording is off."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        _spans.append((self.name, self.start, end - self.start, os.getpid(), threading.get_ident(), self.args))
+        return False
+
+    def set(self, **args):
+        """Attach values found out inside the span (segment counts, sizes) to it."""
+        self.args.update(args)
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    """Drop everything recorded so far."""
+    with _lock:
+        _spans.clear()
+        _counts.clear()
+
+
+def span(name, **args):
+    """
+    Context manager timing one stage. Keyword arguments are stored with the
+    span, and more can be attached with .set() before it closes.
+    """
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def traced(name=None):
+    """Decorator recording a span (named after the function by default) for every call."""
+    def decorate(function):
+        label = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return function(*args, **kwargs)
+            with _Span(label, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, n=1):
+    """Add n to a named counter (objects built, segments drawn, pairs measured...)."""
+    if not ENABLED:
+        return
+    with _lock:
+        _counts[name] = _counts.get(name, 0) + n
+
+
+def drain():
+    """Return and clear what this process recorded, e.g. to send it back from a worker process."""
+    with _lock:
+        recorded = (list(_spans), dict(_counts))
+        _spans.clear()
+        _counts.clear()
+    return recorded
+
+
+def merge(recorded):
+    """Add spans and counts returned by drain() in another process."""
+    spans, counts = recorded
+    with _lock:
+        _spans.extend(spans)
+        for name, value in counts.items():
+            _counts[name] = _counts.get(name, 0) + value
+
+
+def summary():
+    """
+    Per span name: calls, total, mean and max milliseconds; plus the counters.
+
+    Returns:
+        {'spans': {name: {...}}, 'counts': {name: value}}
+    """
+    spans = {}
+    for name, _, duration, _, _, _ in list(_spans):
+        entry = spans.setdefault(name, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['calls'] += 1
+        entry['total_ms'] += duration / 1e6
+        entry['max_ms'] = max(entry['max_ms'], duration / 1e6)
+    for entry in spans.values():
+        entry['mean_ms'] = entry['total_ms'] / entry['calls']
+    return {'spans': spans, 'counts': dict(_counts)}
+
+
+def _events():
+    """Recorded spans with start times in microseconds from the earliest one."""
+    spans = list(_spans)
+    origin = min((start for _, start, _, _, _, _ in spans), default=0)
+    return [(name, (start - origin) / 1e3, duration / 1e3, pid, thread, args)
+            for name, start, duration, pid, thread, args in spans]
+
+
+def export_json(path):
+    """Write the summary and every recorded span (times in microseconds) as JSON."""
+    document = dict(summary(), events=[
+        {'name': name, 'start_us': start, 'duration_us': duration, 'pid': pid, 'thread': thread, 'args': args}
+        for name, start, duration, pid, thread, args in _events()])
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=1, default=str)
+    return path
+
+
+def export_chrome_trace(path):
+    """
+    Write spans as complete ("X") events and every counter as one counter
+    ("C") event, in the trace event format chrome://tracing and Perfetto open.
+    """
+    events = [{'name': name, 'ph': 'X', 'ts': start, 'dur': duration, 'pid': pid, 'tid': thread, 'args': args}
+              for name, start, duration, pid, thread, args in _events()]
+    end = max((event['ts'] + event['dur'] for event in events), default=0.0)
+    events += [{'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {'value': value}}
+               for name, value in _counts.items()]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+    return path
+
+
+def export(path):
+    """export_json, or export_chrome_trace when the file name ends in .trace.json."""
+    return export_chrome_trace(path) if path.endswith('.trace.json') else export_json(path)
+
+
+def report(out=print):
+    """Print the summary, slowest stages first."""
+    result = summary()
+    for name, entry in sorted(result['spans'].items(), key=lambda item: -item[1]['total_ms']):
+        out(f"{name:<28} {entry['calls']:>8} calls {entry['total_ms']:12.3f} ms total {entry['mean_ms']:10.3f} ms mean")
+    for name, value in sorted(result['counts'].items()):
+        out(f"{name:<28} {value:>12}")
+
+
+def _export_at_exit(path, owner):
+    if "{pid}" in path or os.getpid() == owner:
+        export_chrome_trace(path.replace("{pid}", str(os.getpid())))
+
+
+if os.environ.get(TRACE_ENV):
+    enable()
+    atexit.register(_export_at_exit, os.environ[TRACE_ENV], int(os.environ.setdefault(TRACE_OWNER_ENV, str(os.getpid()))))
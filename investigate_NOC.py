@@ -2,9 +2,29 @@ import sys
 import logging
 import datetime
 import os
+import argparse
+import csv
+import hashlib
+import json
+import math
+import numpy as np
 sys.path.append('./3dHtree')  # Add the 3dHtree directory to path
 sys.path.append('../HNSW-NoC/hnsw.py')  # Add the 3dHtree directory to path
-from htreevis import Mesh3D, HTree3D, MemoryElement
+import htreevis
+import instrumentation
+from htreevis import Mesh3D, HTree3D, MemoryElement, GeometryConfig, DataGraph
+from blueprint_explorer import default_blueprint
+
+# Fields of a config record, as listed in dummyInput.txt.
+CONFIG_FIELDS = ['N_MEMORIES', 'MEMORY_CAPACITY', 'N_LAYERS', 'PE_SIDE_LENGTH', 'GUTTER_WIDTH', 'LAYER_HEIGHT', 'PATH_TO_DATA']
+# Metrics reported for each topology, prefixed with mesh_ / htree_ in the output.
+TOPOLOGY_FIELDS = ['tiles', 'wire_length_x', 'wire_length_y', 'wire_length_z', 'total_wire_length', 'tsv_count',
+                   'avg_root_distance', 'max_root_distance', 'avg_distance_h', 'avg_distance_v', 'avg_energy']
+# Filled in when PATH_TO_DATA names an edge-list file.
+DATA_FIELDS = ['data_vertices', 'data_edges', 'mesh_traffic_energy', 'htree_traffic_energy']
+RESULT_FIELDS = (['record_id'] + CONFIG_FIELDS + ['mesh_dims', 'htree_blueprint', 'search_energy']
+                 + [f'{prefix}_{field}' for prefix in ('mesh', 'htree') for field in TOPOLOGY_FIELDS]
+                 + DATA_FIELDS + ['error'])
 
 
 # Set up logging
@@ -22,17 +42,240 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-logger = setup_logging()
+# Handlers are only attached by setup_logging() when run as a script, so importing this module
+# neither creates a log file nor reconfigures the caller's logging.
+logger = logging.getLogger(__name__)
+
+def read_config_records(paths):
+    """
+    Yield config records (dicts keyed by CONFIG_FIELDS) from dummyInput-style
+    files: a comma-separated header line of field names followed by one
+    record per line. Files ending in .jsonl hold one JSON object per line.
+    """
+    for path in paths:
+        with open(path, newline='') as f:
+            if path.endswith('.jsonl'):
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            else:
+                rows = csv.reader(line for line in f if line.strip() and not line.lstrip().startswith('#'))
+                header = [field.strip() for field in next(rows, [])]
+                for row in rows:
+                    yield dict(zip(header, (value.strip() for value in row)))
+
+def record_id(record):
+    """Stable id of a record's contents, used to skip finished work on restart."""
+    canonical = json.dumps({field: str(record.get(field, '')) for field in CONFIG_FIELDS}, sort_keys=True)
+    return hashlib.sha1(canonical.encode()).hexdigest()[:16]
+
+def mesh_dimensions(n_memories, n_layers):
+    """The most nearly square (X, Y, n_layers) mesh holding n_memories tiles."""
+    if n_memories < 1 or n_layers < 1:
+        raise ValueError(f"Need at least one memory and one layer, got {n_memories} memories over {n_layers} layers.")
+    if n_memories % n_layers:
+        raise ValueError(f"{n_memories} memories do not split evenly over {n_layers} layers.")
+    per_layer = n_memories // n_layers
+    size_x = next(d for d in range(math.isqrt(per_layer), 0, -1) if per_layer % d == 0)
+    return (per_layer // size_x, size_x, n_layers)
+
+def _topology_metrics(prefix, metrics, avg_distance):
+    avg_h, avg_v = avg_distance
+    values = {
+        'tiles': metrics['tiles'],
+        'wire_length_x': metrics['wire_length']['x'],
+        'wire_length_y': metrics['wire_length']['y'],
+        'wire_length_z': metrics['wire_length']['z'],
+        'total_wire_length': metrics['total_wire_length'],
+        'tsv_count': metrics['tsv_count'],
+        'avg_root_distance': metrics['avg_root_distance'],
+        'max_root_distance': metrics['max_root_distance'],
+        'avg_distance_h': avg_h,
+        'avg_distance_v': avg_v,
+        'avg_energy': avg_h * htreevis.H_ENERGY_PER_UNIT + avg_v * htreevis.V_ENERGY_PER_UNIT,
+    }
+    return {f'{prefix}_{key}': value for key, value in values.items()}
+
+def _data_traffic(path, mesh, mesh_dims, htree, n_memories):
+    """
+    Traffic energy of the PATH_TO_DATA edge list on both topologies, with
+    vertices assigned to tiles in index order in equal contiguous blocks.
+    """
+    graph = DataGraph.load(path)
+    src, dst, weight = graph.edges()
+    n_vertices = max(graph.n_vertices, 1)
+    tile_src = src.astype(np.int64) * n_memories // n_vertices
+    tile_dst = dst.astype(np.int64) * n_memories // n_vertices
+    # The mesh is not generated: XYZ-routed distances follow from the tile coordinates alone.
+    size_x, size_y, _ = mesh_dims
+    mesh_energy = 0.0
+    for chunk_src, chunk_dst, chunk_weight in htreevis.iter_traffic((tile_src, tile_dst, weight)):
+        (src_y, src_x), (dst_y, dst_x) = np.divmod(chunk_src, size_x), np.divmod(chunk_dst, size_x)
+        (src_z, src_y), (dst_z, dst_y) = np.divmod(src_y, size_y), np.divmod(dst_y, size_y)
+        dist_h = (np.abs(dst_x - src_x) + np.abs(dst_y - src_y)) * float(mesh.config.pitch)
+        dist_v = np.abs(dst_z - src_z) * float(mesh.config.layer_height)
+        mesh_energy += float(np.dot(dist_h * htreevis.H_ENERGY_PER_UNIT + dist_v * htreevis.V_ENERGY_PER_UNIT, chunk_weight))
+    return {
+        'data_vertices': graph.n_vertices,
+        'data_edges': graph.n_edges,
+        'mesh_traffic_energy': mesh_energy,
+        'htree_traffic_energy': htree.traffic_energy((tile_src, tile_dst, weight)),
+    }
+
+def _error_row(record, error):
+    """The result row of a record that failed with error."""
+    result = {field: record.get(field, '') for field in CONFIG_FIELDS}
+    result['record_id'] = record_id(record)
+    result['error'] = f"{type(error).__name__}: {error}"
+    return result
+
+@instrumentation.traced('record')
+def run_record(record):
+    """Build the mesh and H-tree a config record describes and return one result row."""
+    result = {field: record.get(field, '') for field in CONFIG_FIELDS}
+    result['record_id'] = record_id(record)
+    try:
+        n_memories = int(record['N_MEMORIES'])
+        n_layers = int(record.get('N_LAYERS') or 1)
+        config = GeometryConfig(float(record.get('PE_SIDE_LENGTH') or htreevis.PE_SIZE),
+                                float(record.get('GUTTER_WIDTH') or htreevis.GUTTER_WIDTH),
+                                float(record.get('LAYER_HEIGHT') or htreevis.LAYER_HEIGHT))
+        memory = MemoryElement(0, True, (0, 0, 0), memory_size=int(record.get('MEMORY_CAPACITY') or 128))
+        result['search_energy'] = memory.search_energy
+
+        # Both topologies are evaluated in closed form, so neither is materialized.
+        mesh = Mesh3D(config)
+        dims = mesh_dimensions(n_memories, n_layers)
+        result['mesh_dims'] = 'x'.join(str(dim) for dim in dims)
+        result.update(_topology_metrics('mesh', mesh.metrics(dims), mesh.avg_distance(dims)))
+
+        htree = HTree3D(config)
+        htree.gen_noc_layout(default_blueprint(n_memories, n_layers))
+        result['htree_blueprint'] = htree.blueprint
+        result.update(_topology_metrics('htree', htree.metrics(), htree.avg_distance()))
 
-def main():
-    # load dummyInput as an input file.
-    # parse standard variables - N_MEMORIES, MEMORY_CAPACITY, N_LAYERS, PE_SIDE_LENGTH, GUTTER_WIDTH, LAYER_HEIGHT, PATH_TO_DATA, CLUSTER_METHOD
+        if record.get('PATH_TO_DATA'):
+            result.update(_data_traffic(record['PATH_TO_DATA'], mesh, dims, htree, n_memories))
+    except (KeyError, ValueError, OSError) as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
 
-    # Call noc.py to create the graphs themselves.
-    pass
+def _traced_run_record(record):
+    """run_record in a worker process, returning the spans it recorded alongside the result."""
+    instrumentation.enable()
+    instrumentation.reset()
+    return run_record(record), instrumentation.drain()
+
+class ResultWriter:
+    """
+    Appends result rows to a JSON Lines or CSV file, flushing after every
+    row. Reopening an existing file reports the record ids already written
+    without an error, after dropping a partial last line left by an
+    interrupted run; failed records are run again.
+    """
+    def __init__(self, path, fmt='jsonl'):
+        self.path = path
+        self.fmt = fmt
+        self.done = set()
+        if os.path.exists(path):
+            self._trim_partial_line()
+            with open(path, newline='') as f:
+                rows = csv.DictReader(f) if fmt == 'csv' else (json.loads(line) for line in f if line.strip())
+                self.done = {row['record_id'] for row in rows if not row.get('error')}
+        write_header = fmt == 'csv' and (not os.path.exists(path) or os.path.getsize(path) == 0)
+        self.file = open(path, 'a', newline='')
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS, restval='')
+            if write_header:
+                self.csv.writeheader()
+
+    def _trim_partial_line(self):
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def write(self, result):
+        if self.fmt == 'csv':
+            self.csv.writerow(result)
+        else:
+            self.file.write(json.dumps(result) + '\n')
+        self.file.flush()
+        if not result.get('error'):
+            self.done.add(result['record_id'])
+
+    def close(self):
+        self.file.close()
+
+def run_batch(config_paths, output_path, fmt='jsonl', workers=None):
+    """
+    Run every config record across a process pool, streaming results to
+    output_path. Records already present in the output without an error
+    are skipped, so an interrupted sweep resumes where it stopped. A record
+    whose worker raises is written as a failed row and the batch goes on.
+    """
+    writer = ResultWriter(output_path, fmt)
+    pending = {}
+    for record in read_config_records(config_paths):
+        key = record_id(record)
+        if key not in writer.done:
+            pending.setdefault(key, record)
+    logger.info(f"{len(pending)} records to run, {len(writer.done)} already in {output_path}")
+    # Parse every edge list once here, so workers only memory-map its CSR cache instead of racing to write it.
+    for path in sorted({record['PATH_TO_DATA'] for record in pending.values() if record.get('PATH_TO_DATA')}):
+        try:
+            DataGraph.load(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not cache {path}: {e}")
+    # Worker processes exit without running atexit hooks, so traced workers send their spans back with each result.
+    traced = instrumentation.ENABLED
+    # Imported here so that importing this module for its record helpers does not load multiprocessing.
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_traced_run_record if traced else run_record, record): record for record in pending.values()}
+            for count, future in enumerate(as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = _error_row(futures[future], e)
+                else:
+                    if traced:
+                        result, recorded = result
+                        instrumentation.merge(recorded)
+                writer.write(result)
+                if result.get('error'):
+                    logger.warning(f"Record {result['record_id']} failed: {result['error']}")
+                if count % 100 == 0 or count == len(futures):
+                    logger.info(f"{count}/{len(futures)} records done")
+    finally:
+        writer.close()
+
+def main(argv=None):
+    # load dummyInput-style config files and run every record without prompting.
+    # parse standard variables - N_MEMORIES, MEMORY_CAPACITY, N_LAYERS, PE_SIDE_LENGTH, GUTTER_WIDTH, LAYER_HEIGHT, PATH_TO_DATA
+    # (an optional edge-list file whose traffic is costed on both topologies)
+    parser = argparse.ArgumentParser(description="Headless batch evaluation of mesh and H-tree NoCs.")
+    parser.add_argument("configs", nargs='*', default=[os.path.join(os.path.dirname(os.path.abspath(__file__)), "dummyInput.txt")],
+                        help="Config files with a dummyInput.txt-style header (or .jsonl records)")
+    parser.add_argument("-o", "--output", default="noc_results.jsonl", help="Result file; existing rows are kept and skipped")
+    parser.add_argument("--format", choices=['jsonl', 'csv'], default=None, help="Defaults from the output file extension")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--trace", default=None,
+                        help="Record timing spans and counts to this file (Chrome trace format if it ends in .trace.json)")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    if args.trace:
+        instrumentation.enable()
+    run_batch(args.configs, args.output, fmt, args.workers)
+    if args.trace:
+        instrumentation.export(args.trace)
+        instrumentation.report(logger.info)
 
 if __name__ == "__main__":
+    logger = setup_logging()
     logger.info("Starting NOC analysis session")
-    
-    # Run the interactive explorer
-    main()
\ No newline at end of file
+
+    # Run the batch analysis
+    main()
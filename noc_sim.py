@@ -0,0 +1,276 @@
+import argparse
+import heapq
+
+import numpy as np
+
+import htreevis
+from htreevis import DataGraph, Mesh3D, HTree3D, iter_traffic
+
+# Synthetic traffic patterns understood by generate_traffic.
+PATTERNS = ('uniform', 'transpose', 'bitcomplement', 'hotspot')
+
+
+def _hop_steps(counts):
+    """For per-packet hop counts, return (packet, step) for every hop, packets in order."""
+    owner = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, step
+
+
+def mesh_routes(noc: Mesh3D, src, dst):
+    """
+    XYZ dimension-ordered routes on a mesh, as channels in CSR form.
+
+    Channel 2*link + d is link (numbered as in Mesh3D.link_graph) traversed
+    towards its high end (d=0) or its low end (d=1).
+
+    Returns:
+        (ptr, channels): packet p crosses channels[ptr[p]:ptr[p+1]] in order
+    """
+    size_x, size_y, size_z = noc.blueprint
+    sx, sy, sz = noc.tile_coordinates(src)
+    dx, dy, dz = noc.tile_coordinates(dst)
+    hx, hy, hz = np.abs(dx - sx), np.abs(dy - sy), np.abs(dz - sz)
+    ptr = np.zeros(len(hx) + 1, dtype=np.int64)
+    np.cumsum(hx + hy + hz, out=ptr[1:])
+    channels = np.empty(ptr[-1], dtype=np.int64)
+    offset_y = size_z * size_y * (size_x - 1)
+    offset_z = offset_y + size_z * (size_y - 1) * size_x
+    # (hops, start coordinate, end coordinate, hop offset within the route, link id of the low end)
+    dimensions = (
+        (hx, sx, dx, np.zeros_like(hx), lambda p, low: (sz[p] * size_y + sy[p]) * (size_x - 1) + low),
+        (hy, sy, dy, hx, lambda p, low: offset_y + (sz[p] * (size_y - 1) + low) * size_x + dx[p]),
+        (hz, sz, dz, hx + hy, lambda p, low: offset_z + (low * size_y + dy[p]) * size_x + dx[p]),
+    )
+    for hops, start, end, before, link_of in dimensions:
+        owner, step = _hop_steps(hops)
+        forward = end[owner] > start[owner]
+        low = np.where(forward, start[owner] + step, start[owner] - step - 1)
+        position = ptr[owner] + before[owner] + step
+        channels[position] = 2 * link_of(owner, low) + ~forward
+    return ptr, channels
+
+
+def htree_routes(noc: HTree3D, src, dst):
+    """
+    Up-then-down routes between H-tree leaves through their lowest common
+    ancestor, as channels in CSR form. Link u-1 joins router u to its
+    parent (router numbering as in HTree3D.link_graph); channel 2*(u-1)
+    runs down it and 2*(u-1)+1 up it, matching the low/high convention of
+    mesh_routes since links are stored as (parent, child).
+    """
+    depth = noc.template.depth
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    climb = depth - noc.lca_levels(src, dst)
+    ptr = np.zeros(len(src) + 1, dtype=np.int64)
+    np.cumsum(2 * climb, out=ptr[1:])
+    channels = np.empty(ptr[-1], dtype=np.int64)
+    owner, step = _hop_steps(climb)
+    level = depth - step
+    channels[ptr[owner] + step] = 2 * ((2**level - 1) + (src[owner] >> step) - 1) + 1
+    level = depth - climb[owner] + 1 + step
+    channels[ptr[owner] + climb[owner] + step] = 2 * ((2**level - 1) + (dst[owner] >> (depth - level)) - 1)
+    return ptr, channels
+
+
+def routes(noc, src, dst):
+    """Routes of the topology's native routing; see mesh_routes and htree_routes."""
+    if isinstance(noc, HTree3D):
+        return htree_routes(noc, src, dst)
+    return mesh_routes(noc, src, dst)
+
+
+def permutation_destinations(noc, pattern, src):
+    """Destinations of the permutation patterns: transpose and bitcomplement (see generate_traffic)."""
+    n_tiles = noc.tile_count()
+    src = np.asarray(src, dtype=np.int64)
+    if pattern == 'bitcomplement':
+        return n_tiles - 1 - src
+    if pattern == 'transpose':
+        if isinstance(noc, Mesh3D) and noc.blueprint[0] == noc.blueprint[1]:
+            x, y, z = noc.tile_coordinates(src)
+            return y + x * noc.blueprint[0] + z * noc.blueprint[0] * noc.blueprint[1]
+        if n_tiles & (n_tiles - 1) == 0:
+            bits = n_tiles.bit_length() - 1
+            half = bits // 2
+            return ((src & (2**half - 1)) << (bits - half)) | (src >> half)
+        raise ValueError("transpose traffic needs a square mesh or a power-of-two tile count.")
+    raise ValueError(f"{pattern!r} is not a permutation pattern.")
+
+
+def generate_traffic(noc, pattern, rate, cycles, hotspot_fraction=0.1, hotspots=(0,), seed=0):
+    """
+    Packets offered over [0, cycles) as (src, dst, inject_time) arrays, sorted by time.
+
+    A named pattern injects rate packets per tile per cycle (Poisson) with
+    destinations from PATTERNS: uniform over the other tiles, transpose
+    (swap the high and low halves of the tile index bits; swap x and y on a
+    square mesh), bitcomplement (N-1-src) or hotspot (hotspot_fraction of
+    packets go to the hotspots, the rest are uniform). Anything else is
+    taken as a traffic matrix in tile indices, a DataGraph or any form
+    iter_traffic accepts: packets are then drawn per pair in proportion to
+    its weight, at the same total rate.
+    """
+    rng = np.random.default_rng(seed)
+    n_tiles = noc.tile_count()
+    n_packets = rng.poisson(rate * n_tiles * cycles)
+    times = np.sort(rng.random(n_packets) * cycles)
+    if isinstance(pattern, str):
+        src = rng.integers(0, n_tiles, n_packets)
+        if pattern == 'uniform' or pattern == 'hotspot':
+            dst = (src + rng.integers(1, max(n_tiles, 2), n_packets)) % n_tiles
+            if pattern == 'hotspot':
+                hot = rng.random(n_packets) < hotspot_fraction
+                dst[hot] = np.asarray(hotspots)[rng.integers(0, len(hotspots), hot.sum())]
+        elif pattern in PATTERNS:
+            dst = permutation_destinations(noc, pattern, src)
+        else:
+            raise ValueError(f"Unknown traffic pattern {pattern!r}; expected one of {PATTERNS}.")
+    else:
+        if isinstance(pattern, DataGraph):
+            pattern = pattern.edges()
+        pairs = [np.concatenate(column) for column in zip(*iter_traffic(pattern))]
+        weights = pairs[2] / pairs[2].sum()
+        chosen = rng.choice(len(weights), size=n_packets, p=weights)
+        src, dst = pairs[0][chosen].astype(np.int64), pairs[1][chosen].astype(np.int64)
+    return src, dst, times
+
+
+def simulate(noc, src, dst, inject_times, packet_flits=4, bandwidth=1.0, router_delay=1.0, wire_delay=0.01,
+             h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT):
+    """
+    Event-driven simulation of packets over the topology's links.
+
+    Each direction of each link is a channel serving packets first come,
+    first served from an unbounded router queue; a packet holds a channel
+    for packet_flits / bandwidth cycles. With virtual cut-through, the head
+    moves on after router_delay plus wire_delay cycles per unit of wire
+    length, and the tail arrives one serialization time after the head
+    enters the last channel. Events sit on a single heap ordered by time.
+
+    Returns a dict of per-packet arrays (latency, queueing delay, hops,
+    delivery time, energy) plus the number of events processed.
+    """
+    ptr, channels = routes(noc, src, dst)
+    _, lengths, vertical, _ = noc.link_graph()
+    channel_delay = (router_delay + wire_delay * np.repeat(lengths, 2)).tolist()
+    serialization = packet_flits / bandwidth
+    free = [0.0] * (2 * len(lengths))
+    hops = np.diff(ptr)
+    route = channels.tolist()
+    first = ptr[:-1].tolist()
+    last = (ptr[1:] - 1).tolist()
+    delivered = np.asarray(inject_times, dtype=float).copy()
+    waited = [0.0] * len(delivered)
+    heap = [(time, packet, start) for packet, (time, start, count) in
+            enumerate(zip(delivered.tolist(), first, hops.tolist())) if count]
+    heapq.heapify(heap)
+    heappush, heappop = heapq.heappush, heapq.heappop
+    events = 0
+    while heap:
+        time, packet, position = heappop(heap)
+        events += 1
+        channel = route[position]
+        start = free[channel]
+        if start > time:
+            waited[packet] += start - time
+        else:
+            start = time
+        free[channel] = start + serialization
+        if position == last[packet]:
+            delivered[packet] = start + serialization + channel_delay[channel]
+        else:
+            heappush(heap, (start + channel_delay[channel], packet, position + 1))
+    dist_h, dist_v = noc.find_distances(src, dst)
+    return {
+        'latency': delivered - inject_times,
+        'queueing': np.array(waited),
+        'hops': hops,
+        'delivered': delivered,
+        'energy': (dist_h * h_cost + dist_v * v_cost) * packet_flits,
+        'events': events,
+    }
+
+
+def run(noc, pattern, rate, cycles=1000, warmup=200, percentiles=(50, 90, 99), seed=0, **kwargs):
+    """
+    Offer traffic at one injection rate and summarize it.
+
+    Latency statistics cover packets injected after warmup; all of them
+    are simulated to delivery. Accepted throughput counts deliveries inside
+    [warmup, cycles) per tile per cycle, so it falls behind the offered rate
+    once the network saturates. Extra keywords go to simulate.
+    """
+    src, dst, times = generate_traffic(noc, pattern, rate, cycles, seed=seed)
+    result = simulate(noc, src, dst, times, **kwargs)
+    measured = times >= warmup
+    latency = result['latency'][measured]
+    window = (cycles - warmup) * noc.tile_count()
+    in_window = (result['delivered'] >= warmup) & (result['delivered'] < cycles)
+    summary = {
+        'offered': rate,
+        'accepted': float(in_window.sum() / window),
+        'packets': int(measured.sum()),
+        'events': result['events'],
+        'mean_latency': float(latency.mean()) if len(latency) else float('nan'),
+        'mean_queueing': float(result['queueing'][measured].mean()) if len(latency) else float('nan'),
+        'mean_energy': float(result['energy'][measured].mean()) if len(latency) else float('nan'),
+    }
+    if len(latency):
+        summary.update({f'p{p}_latency': float(value) for p, value in zip(percentiles, np.percentile(latency, percentiles))})
+    return summary
+
+
+def saturation_sweep(noc, pattern, rates, cycles=1000, warmup=200, latency_factor=3.0, **kwargs):
+    """
+    Run increasing injection rates until the network saturates.
+
+    The network counts as saturated once mean latency passes latency_factor
+    times the latency at the lowest rate (close to zero load). Returns
+    (summaries, saturation rate), the latter being the highest rate that was
+    still unsaturated.
+    """
+    summaries = []
+    saturation = None
+    zero_load = None
+    for rate in sorted(rates):
+        summary = run(noc, pattern, rate, cycles, warmup, **kwargs)
+        summaries.append(summary)
+        if zero_load is None:
+            zero_load = summary['mean_latency']
+        if summary['mean_latency'] > latency_factor * zero_load:
+            break
+        saturation = rate
+    return summaries, saturation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Packet-level latency and throughput of a mesh or H-tree NoC.")
+    topology = parser.add_mutually_exclusive_group(required=True)
+    topology.add_argument("--blueprint", help="H-tree blueprint string, e.g. 01201")
+    topology.add_argument("--mesh", type=int, nargs=3, metavar=("X", "Y", "Z"))
+    parser.add_argument("--pattern", default='uniform', help=f"One of {PATTERNS}, or an edge-list file of tile traffic")
+    parser.add_argument("--rates", type=float, nargs='+', default=[0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32])
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--flits", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.blueprint:
+        noc = HTree3D()
+        noc.gen_noc_layout(args.blueprint)
+    else:
+        noc = Mesh3D()
+        noc.gen_noc_layout(tuple(args.mesh), vectorized=True)
+    pattern = args.pattern if args.pattern in PATTERNS else DataGraph.load(args.pattern)
+    summaries, saturation = saturation_sweep(noc, pattern, args.rates, args.cycles, args.warmup, packet_flits=args.flits)
+    for summary in summaries:
+        print(f"rate={summary['offered']:.4g} accepted={summary['accepted']:.4g} "
+              f"latency mean={summary['mean_latency']:.1f} p99={summary.get('p99_latency', float('nan')):.1f} "
+              f"({summary['events']} events)")
+    print(f"saturation throughput: {saturation} packets/tile/cycle")
+
+
+if __name__ == "__main__":
+    main()
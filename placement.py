@@ -0,0 +1,340 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import htreevis
+from htreevis import DataGraph, Mesh3D, HTree3D, iter_traffic
+
+
+def bisection_levels(noc):
+    """
+    The recursive bisection a topology's tiles follow.
+
+    Returns (tile_order, levels): tile_order lists tile indices so that every
+    part of every level is a contiguous run of it, and levels[k] holds the
+    part boundaries (positions in tile_order, 0 and N included) after k+1
+    splits. H-tree parts are the subtrees of each level, so the order is the
+    leaf index itself. Mesh boxes are split in half across their longest
+    physical side until every box is a single tile.
+    """
+    n_tiles = noc.tile_count()
+    if isinstance(noc, HTree3D):
+        depth = noc.template.depth
+        return np.arange(n_tiles), [np.arange(0, n_tiles + 1, n_tiles >> k) for k in range(1, depth + 1)]
+
+    dims = np.array(noc.blueprint, dtype=np.int64)
+    scale = np.array([noc.config.pitch, noc.config.pitch, noc.config.layer_height], dtype=float)
+    coords = np.column_stack(noc.tile_coordinates(np.arange(n_tiles)))
+    low = np.zeros((n_tiles, 3), dtype=np.int64)
+    high = np.broadcast_to(dims, (n_tiles, 3)).copy()
+    rows = np.arange(n_tiles)
+    code = np.zeros(n_tiles, dtype=np.int64)
+    n_bits = 0
+    while (high - low).max() > 1:
+        extent = high - low
+        axis = np.argmax(np.where(extent > 1, extent * scale, -1.0), axis=1)
+        mid = low[rows, axis] + extent[rows, axis] // 2
+        upper = (extent[rows, axis] > 1) & (coords[rows, axis] >= mid)
+        low[rows[upper], axis[upper]] = mid[upper]
+        lower = ~upper & (extent[rows, axis] > 1)
+        high[rows[lower], axis[lower]] = mid[lower]
+        code = code * 2 + upper
+        n_bits += 1
+    tile_order = np.argsort(code, kind='stable')
+    sorted_code = code[tile_order]
+    levels = []
+    for k in range(1, n_bits + 1):
+        prefix = sorted_code >> (n_bits - k)
+        cuts = np.flatnonzero(prefix[1:] != prefix[:-1]) + 1
+        levels.append(np.concatenate(([0], cuts, [n_tiles])))
+    return tile_order, levels
+
+
+def partner_maps(noc):
+    """
+    Tile pairings used by local refinement, each an involution over tile
+    indices (tiles without a partner map to themselves). H-tree tiles pair
+    with their sibling at every level, deepest first; mesh tiles pair with
+    a neighbour along each axis, on even and odd offsets.
+    """
+    n_tiles = noc.tile_count()
+    tiles = np.arange(n_tiles)
+    if isinstance(noc, HTree3D):
+        return [tiles ^ (1 << bit) for bit in range(noc.template.depth)]
+    size_x, size_y, size_z = noc.blueprint
+    maps = []
+    for coord, size, stride in zip(noc.tile_coordinates(tiles), (size_x, size_y, size_z), (1, size_x, size_x * size_y)):
+        for parity in (0, 1):
+            offset = coord - parity
+            up = (offset >= 0) & (offset % 2 == 0) & (coord + 1 < size)
+            down = (offset >= 0) & (offset % 2 == 1)
+            partner = tiles.copy()
+            partner[up] += stride
+            partner[down] -= stride
+            if np.any(partner != tiles):
+                maps.append(partner)
+    return maps
+
+
+def _bfs_distances(indptr, indices, seeds, n_vertices):
+    """Hop distance from the nearest seed (-1 if unreached), one frontier at a time."""
+    dist = np.full(n_vertices, -1, dtype=np.int32)
+    dist[seeds] = 0
+    frontier = np.asarray(seeds)
+    step = 0
+    while frontier.size:
+        step += 1
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            break
+        offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        neighbors = indices[offsets]
+        frontier = np.unique(neighbors[dist[neighbors] < 0])
+        dist[frontier] = step
+    return dist
+
+
+def _split_order(graph, src, order, vertex_bounds):
+    """
+    Reorder vertices within each part so its halves are contiguous.
+
+    order[r] is the vertex of rank r and part j holds ranks
+    vertex_bounds[j]:vertex_bounds[j+1]. Inside each part, vertices are
+    sorted by BFS distance from a pseudo-peripheral vertex of the subgraph
+    the part induces (a level-structure bisection); every part is handled
+    in the same frontier sweep.
+    """
+    n_vertices = graph.n_vertices
+    sizes = np.diff(vertex_bounds)
+    part_of_rank = np.repeat(np.arange(len(sizes)), sizes)
+    part = np.empty(n_vertices, dtype=np.int64)
+    part[order] = part_of_rank
+    keep = part[src] == part[graph.indices]
+    indptr = np.zeros(n_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src[keep], minlength=n_vertices), out=indptr[1:])
+    indices = graph.indices[keep]
+
+    starts = vertex_bounds[:-1][sizes > 0]
+    dist = _bfs_distances(indptr, indices, order[starts], n_vertices)
+    # The farthest vertex of each part (lowest rank on ties) seeds the second sweep.
+    dist_by_rank = dist[order]
+    farthest = np.maximum.reduceat(dist_by_rank, starts)
+    is_far = dist_by_rank == np.repeat(farthest, np.diff(np.append(starts, n_vertices)))
+    hits = np.flatnonzero(is_far)
+    dist = _bfs_distances(indptr, indices, order[hits[np.searchsorted(hits, starts)]], n_vertices)
+    key = dist[order].astype(np.int64)
+    key[key < 0] = n_vertices
+    return order[np.lexsort((np.arange(n_vertices), key, part_of_rank))]
+
+
+def _vertex_bounds(tile_bounds, n_vertices, n_tiles):
+    """
+    Rank boundaries that spread n_vertices as evenly as possible over
+    tile-order positions; with fewer vertices than tiles, one vertex per
+    position from the start of the order, so the used tiles stay together.
+    """
+    tile_bounds = np.asarray(tile_bounds, dtype=np.int64)
+    if n_vertices < n_tiles:
+        return np.minimum(tile_bounds, n_vertices)
+    return tile_bounds * n_vertices // n_tiles
+
+
+def recursive_bisection(graph: DataGraph, noc):
+    """
+    Assign every vertex of graph to a tile of noc by recursive bisection.
+
+    Each level of the topology's bisection (see bisection_levels) splits
+    every vertex part the same way the tiles split, so strongly connected
+    vertices end up under the same H-tree subtree or mesh box. Tiles get
+    floor or ceil of V/N vertices each. With fewer vertices than tiles,
+    the vertices take the first V tiles of the bisection order, which fill
+    whole subtrees or boxes in turn, and the remaining tiles stay empty.
+
+    Returns:
+        (V,) array of tile indices
+    """
+    tile_order, levels = bisection_levels(noc)
+    n_tiles = len(tile_order)
+    n_vertices = graph.n_vertices
+    if n_vertices == 0:
+        return np.empty(0, dtype=np.int64)
+    src = graph.edges()[0]
+    order = np.arange(n_vertices)
+    parent_bounds = np.array([0, n_tiles])
+    for bounds in levels:
+        order = _split_order(graph, src, order, _vertex_bounds(parent_bounds, n_vertices, n_tiles))
+        parent_bounds = bounds
+    tile_of = np.empty(n_vertices, dtype=np.int64)
+    position = np.searchsorted(_vertex_bounds(np.arange(n_tiles + 1), n_vertices, n_tiles), np.arange(n_vertices), 'right') - 1
+    tile_of[order] = tile_order[position]
+    return tile_of
+
+
+def _chunk_map(function, traffic, workers):
+    """Apply function to every (src, dst, weight) chunk of traffic on a thread pool."""
+    chunks = iter_traffic(traffic)
+    if workers == 1:
+        return list(map(lambda chunk: function(*chunk), chunks))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda chunk: function(*chunk), chunks))
+
+
+def placement_energy(noc, edges, tile_of, h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT, workers=None):
+    """Traffic-weighted energy of the graph edges (src, dst, weight) under a placement."""
+    def energy(src, dst, weight):
+        return float(np.dot(noc.compute_energies(tile_of[src], tile_of[dst], h_cost, v_cost), weight))
+    return sum(_chunk_map(energy, edges, workers))
+
+
+def _move_gains(noc, edges, tile_of, partner, h_cost, v_cost, workers):
+    """Energy saved by moving each vertex alone to its tile's partner, plus the current total."""
+    n_vertices = len(tile_of)
+
+    def gains(src, dst, weight):
+        tile_src, tile_dst = tile_of[src], tile_of[dst]
+        now = noc.compute_energies(tile_src, tile_dst, h_cost, v_cost) * weight
+        gain_src = now - noc.compute_energies(partner[tile_src], tile_dst, h_cost, v_cost) * weight
+        gain_dst = now - noc.compute_energies(tile_src, partner[tile_dst], h_cost, v_cost) * weight
+        return (np.bincount(src, gain_src, n_vertices) + np.bincount(dst, gain_dst, n_vertices), now.sum())
+
+    results = _chunk_map(gains, edges, workers)
+    return sum(gain for gain, _ in results), sum(total for _, total in results)
+
+
+def _pair_moves(tile_of, gain, partner, n_tiles):
+    """
+    Pair the vertices of each tile with those of its partner tile, both in
+    descending gain order, and return (vertices, new tiles, pair gain) for
+    every swap (or move into a free slot) whose combined gain is positive.
+    """
+    counts = np.bincount(tile_of, minlength=n_tiles)
+    capacity = max(int(counts.max()), 1)
+    by_tile = np.lexsort((-gain, tile_of))
+    rank = np.arange(len(tile_of)) - (np.cumsum(counts) - counts)[tile_of[by_tile]]
+    slots = np.full((n_tiles, capacity), -1, dtype=np.int64)
+    slots[tile_of[by_tile], rank] = by_tile
+
+    tiles = np.flatnonzero(partner > np.arange(n_tiles))
+    first, second = slots[tiles], slots[partner[tiles]]
+    gain_first = np.where(first >= 0, gain[first], 0.0)
+    gain_second = np.where(second >= 0, gain[second], 0.0)
+    total = gain_first + gain_second
+    accept = ((first >= 0) | (second >= 0)) & (total > 0)
+    pair_tiles = np.broadcast_to(tiles[:, None], first.shape)
+    moved_first = accept & (first >= 0)
+    moved_second = accept & (second >= 0)
+    vertices = np.concatenate((first[moved_first], second[moved_second]))
+    targets = np.concatenate((partner[pair_tiles[moved_first]], pair_tiles[moved_second]))
+    pair_gain = np.concatenate((total[moved_first], total[moved_second]))
+    return vertices, targets, pair_gain
+
+
+def refine(noc, edges, tile_of, passes=2, h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT, workers=None):
+    """
+    Improve a placement with batched pairwise swaps between partner tiles.
+
+    For each partner map, every vertex's gain from moving to the partner
+    tile is computed in one pass over the edges (split across threads);
+    all positive-gain pairs are then swapped at once. Gains assume the rest
+    of the placement stays put, so a batch that does not lower the exact
+    energy is retried with only its better half of swaps, and dropped after
+    a few tries. Tile loads never change by more than the pairing allows,
+    so the placement stays balanced.
+
+    Returns:
+        (refined tile_of, energy)
+    """
+    tile_of = tile_of.copy()
+    if not len(tile_of):
+        return tile_of, 0.0
+    n_tiles = noc.tile_count()
+    maps = partner_maps(noc)
+    energy = None
+    for _ in range(passes):
+        improved = False
+        for partner in maps:
+            gain, energy = _move_gains(noc, edges, tile_of, partner, h_cost, v_cost, workers)
+            vertices, targets, pair_gain = _pair_moves(tile_of, gain, partner, n_tiles)
+            for _ in range(4):
+                if not len(vertices):
+                    break
+                previous = tile_of[vertices]
+                tile_of[vertices] = targets
+                new_energy = placement_energy(noc, edges, tile_of, h_cost, v_cost, workers)
+                if new_energy < energy:
+                    energy = new_energy
+                    improved = True
+                    break
+                tile_of[vertices] = previous
+                keep = pair_gain > np.median(pair_gain)
+                vertices, targets, pair_gain = vertices[keep], targets[keep], pair_gain[keep]
+        if not improved:
+            break
+    if energy is None:
+        energy = placement_energy(noc, edges, tile_of, h_cost, v_cost, workers)
+    return tile_of, energy
+
+
+def place(graph: DataGraph, noc, refine_passes=2, h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT, workers=None):
+    """
+    Place the vertices of graph onto the memory tiles of a generated Mesh3D
+    or HTree3D, minimizing traffic-weighted wire energy over its edges.
+
+    Returns a dict with the (V,) tile_of assignment and the total energy
+    (from the NoC's traffic_energy) of the edges for the naive in-order
+    placement, after bisection and after refinement.
+    """
+    n_tiles = noc.tile_count()
+    edges = graph.edges()
+    naive = _vertex_bounds(np.arange(n_tiles + 1), graph.n_vertices, n_tiles)
+    naive_tile_of = bisection_levels(noc)[0][np.searchsorted(naive, np.arange(graph.n_vertices), 'right') - 1]
+    bisected = recursive_bisection(graph, noc)
+    tile_of, _ = refine(noc, edges, bisected, refine_passes, h_cost, v_cost, workers)
+
+    def total(assignment):
+        return noc.traffic_energy((assignment[edges[0]], assignment[edges[1]], edges[2]), h_cost, v_cost)
+
+    return {
+        'tile_of': tile_of,
+        'naive_energy': total(naive_tile_of),
+        'bisection_energy': total(bisected),
+        'energy': total(tile_of),
+    }
+
+
+def tile_vertices(tile_of, n_tiles):
+    """Group a placement by tile: returns (indptr, vertices) so tile t holds vertices[indptr[t]:indptr[t+1]]."""
+    indptr = np.zeros(n_tiles + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tile_of, minlength=n_tiles), out=indptr[1:])
+    return indptr, np.argsort(tile_of, kind='stable')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Place a DataGraph edge list onto the tiles of a mesh or H-tree.")
+    parser.add_argument("graph", help="Edge-list file (src dst [weight] per line)")
+    parser.add_argument("--symmetric", action="store_true", help="Treat every edge as undirected")
+    topology = parser.add_mutually_exclusive_group(required=True)
+    topology.add_argument("--blueprint", help="H-tree blueprint string, e.g. 01201")
+    topology.add_argument("--mesh", type=int, nargs=3, metavar=("X", "Y", "Z"))
+    parser.add_argument("--passes", type=int, default=2, help="Refinement passes")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    graph = DataGraph.load(args.graph, symmetric=args.symmetric)
+    if args.blueprint:
+        noc = HTree3D()
+        noc.gen_noc_layout(args.blueprint)
+    else:
+        noc = Mesh3D()
+        noc.gen_noc_layout(tuple(args.mesh), vectorized=True)
+    result = place(graph, noc, args.passes, workers=args.workers)
+    print(f"{graph.n_vertices} vertices on {noc.tile_count()} tiles")
+    for key in ('naive_energy', 'bisection_energy', 'energy'):
+        print(f"  {key}: {result[key]:.6g}")
+
+
+if __name__ == "__main__":
+    main()
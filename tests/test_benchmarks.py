@@ -0,0 +1,30 @@
+import benchmarks
+
+
+def _record(seconds, iqr, peak=0):
+    return {'case': 'metrics', 'topology': 'mesh', 'tiles': 8, 'seconds': seconds, 'seconds_iqr': iqr, 'peak_bytes': peak}
+
+
+def test_compare_flags_small_slowdowns_beyond_the_noise():
+    baseline = {'results': [_record(0.001, 0.00005)]}
+    assert [metric for _, metric, _, _ in benchmarks.compare([_record(0.002, 0.00005)], baseline)] == ['seconds']
+    assert benchmarks.compare([_record(0.0012, 0.00005)], baseline) == []
+    assert benchmarks.compare([_record(0.002, 0.0005)], baseline) == []
+
+
+def test_run_suite_measures_median_and_spread():
+    calls = []
+
+    def prepare(topology, n_tiles):
+        calls.append(n_tiles)
+        return lambda: None
+
+    benchmarks.CASES['noop'] = (('mesh',), prepare, None)
+    try:
+        results = benchmarks.run_suite((8, 2**20), ['noop'], repeat=1, report=None)
+    finally:
+        del benchmarks.CASES['noop']
+    assert [result['tiles'] for result in results] == [8, 2**20]
+    assert all(result['seconds_iqr'] >= 0 for result in results)
+    # At least MIN_REPEAT timed runs plus the tracemalloc run at every size.
+    assert calls == [8] * (benchmarks.MIN_REPEAT + 1) + [2**20] * (benchmarks.MIN_REPEAT + 1)
@@ -0,0 +1,95 @@
+import importlib
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+plots = importlib.import_module('3DBetternessPlots')
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_loads_no_plotting_or_symbolic_library():
+    code = ("import importlib, sys; importlib.import_module('3DBetternessPlots'); import htreevis, investigate_NOC; "
+            "print(sorted({m.split('.')[0] for m in sys.modules} & {'sympy', 'scipy', 'matplotlib', 'seaborn', 'plotly'}))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_explicit_default_expression_shares_the_cache_key():
+    sp = pytest.importorskip('sympy')
+    A, L = plots.A_sym, plots.L_sym
+    assert plots.z_expr == sp.sqrt(A * L) / (sp.sqrt(A) + L**sp.Rational(3, 2) / 2)
+    assert plots._expr_key(plots.z_expr) == plots._expr_key(None) == plots.Z_EXPR_TEXT
+    assert plots._expr_key(plots.z_expr * 2) != plots.Z_EXPR_TEXT
+
+
+def test_refined_surface_fill_stays_within_rtol():
+    func = lambda A, L: np.sqrt(A * L) / (np.sqrt(A) + L**1.5 / 2)
+    a_vals, l_vals, Z, exact = plots._refine_surface(func, (1, plots.TILES), (1, plots.LAYER_MAX), 65, 3, 1.0, 1e-3)
+    truth = func(*np.meshgrid(a_vals, l_vals))
+    assert np.array_equal(Z[exact], truth[exact])
+    assert np.max(np.abs(Z - truth) / truth) < 2e-3
+    assert exact.mean() < 0.5
+
+
+def _binned_by_loop(x, y, z, nx, ny, reduce):
+    """Per-cell reduction of z by an explicit loop over the cells, NaN where a cell is empty."""
+    x_edges = np.linspace(x.min(), x.max(), nx + 1)
+    y_edges = np.linspace(y.min(), y.max(), ny + 1)
+    Z = np.full((ny, nx), np.nan)
+    for j in range(ny):
+        for i in range(nx):
+            inside = ((x >= x_edges[i]) & ((x < x_edges[i + 1]) | (i == nx - 1))
+                      & (y >= y_edges[j]) & ((y < y_edges[j + 1]) | (j == ny - 1)))
+            if inside.any():
+                Z[j, i] = reduce(z[inside])
+    return Z
+
+
+@pytest.mark.parametrize("statistic, reduce", [('mean', np.mean), ('min', np.min), ('max', np.max)])
+def test_bin_scattered_matches_a_loop_over_cells(statistic, reduce):
+    rng = np.random.default_rng(0)
+    x, y, z = rng.random(500), rng.random(500) * 3, rng.standard_normal(500)
+    _, _, Z = plots.bin_scattered(x, y, z, 9, 7, statistic, fill_empty=False, chunk_size=37)
+    expected = _binned_by_loop(x, y, z, 9, 7, reduce)
+    assert np.array_equal(np.isnan(Z), np.isnan(expected))
+    assert np.allclose(Z[~np.isnan(Z)], expected[~np.isnan(expected)])
+
+
+def test_bin_scattered_rejects_unknown_statistics():
+    with pytest.raises(ValueError):
+        plots.bin_scattered([0.0, 1.0], [0.0, 1.0], [1.0, 2.0], 2, 2, 'median')
+
+
+def test_bin_scattered_fills_empty_cells_from_their_neighbours():
+    pytest.importorskip('scipy')
+    rng = np.random.default_rng(1)
+    x, y = rng.random(4000), rng.random(4000)
+    # A hole in the middle of the domain; z is a plane, which linear interpolation reproduces exactly.
+    keep = (np.abs(x - 0.5) > 0.2) | (np.abs(y - 0.5) > 0.2)
+    x, y = np.concatenate((x[keep], [0, 1, 0, 1])), np.concatenate((y[keep], [0, 0, 1, 1]))
+    z = 2 * x - y
+    X, Y, Z = plots.bin_scattered(x, y, z, 10, 10, 'mean', fill_empty=True)
+    expected = _binned_by_loop(x, y, z, 10, 10, np.mean)
+    empty = np.isnan(expected)
+    assert empty.sum() >= 4 and not np.isnan(Z).any()
+    assert np.allclose(Z[~empty], expected[~empty])
+    assert np.allclose(Z[empty], 2 * X[empty] - Y[empty], atol=0.05)
+
+
+def test_surface_cache_is_written_whole_and_reused(tmp_path, monkeypatch):
+    calls = []
+
+    def z_func(A, L):
+        calls.append(np.size(A))
+        return np.sqrt(A * L) / (np.sqrt(A) + L**1.5 / 2)
+
+    monkeypatch.setattr(plots, '_symbolic', lambda: {'z_func': z_func})
+    first = plots.evaluate_surface(coarse=17, depth=2, cache_dir=str(tmp_path))
+    assert [p.suffix for p in tmp_path.iterdir()] == ['.npz']
+    evaluated = len(calls)
+    second = plots.evaluate_surface(coarse=17, depth=2, cache_dir=str(tmp_path))
+    assert len(calls) == evaluated
+    assert all(np.array_equal(a, b) for a, b in zip(first, second))
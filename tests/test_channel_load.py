@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+import channel_load
+import noc_sim
+from htreevis import Mesh3D
+
+
+def _mesh(dims):
+    noc = Mesh3D()
+    noc.gen_noc_layout(dims, vectorized=True)
+    return noc
+
+
+def _route_loads(noc, src, dst, weight):
+    """Loads counted by walking every XYZ route, as an (E,2) array like channel_loads."""
+    ptr, channels = noc_sim.mesh_routes(noc, src, dst)
+    packet = np.repeat(np.arange(len(src)), np.diff(ptr))
+    n_links = len(noc.link_graph()[0])
+    return np.bincount(channels, weight[packet], 2 * n_links).reshape(-1, 2)
+
+
+@pytest.mark.parametrize("dims", [(3, 4, 2), (5, 1, 3), (1, 1, 1)])
+def test_matrix_loads_match_walked_routes(dims):
+    noc = _mesh(dims)
+    rng = np.random.default_rng(0)
+    src, dst = rng.integers(0, noc.tile_count(), (2, 500))
+    weight = rng.random(500)
+    loads = channel_load.channel_loads(noc, (src, dst, weight), chunk_bytes=1024)
+    assert np.allclose(loads, _route_loads(noc, src, dst, weight))
+
+
+@pytest.mark.parametrize("dims", [(3, 4, 2), (4, 4, 1)])
+def test_uniform_loads_match_all_pairs(dims):
+    noc = _mesh(dims)
+    tiles = np.arange(noc.tile_count())
+    src, dst = np.repeat(tiles, len(tiles)), np.tile(tiles, len(tiles))
+    weight = np.full(len(src), 1.0 / (len(tiles) - 1))
+    assert np.allclose(channel_load.channel_loads(noc, 'uniform'), _route_loads(noc, src, dst, weight))
+
+
+@pytest.mark.parametrize("dims, pattern", [((4, 4, 2), 'transpose'), ((3, 4, 2), 'bitcomplement')])
+def test_permutation_loads_match_walked_routes(dims, pattern):
+    noc = _mesh(dims)
+    tiles = np.arange(noc.tile_count())
+    dst = noc_sim.permutation_destinations(noc, pattern, tiles)
+    assert np.allclose(channel_load.channel_loads(noc, pattern), _route_loads(noc, tiles, dst, np.ones(len(tiles))))
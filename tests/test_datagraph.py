@@ -0,0 +1,48 @@
+import numpy as np
+
+from htreevis import DataGraph
+
+
+def test_comment_only_edge_list_loads_as_an_empty_graph(tmp_path):
+    path = tmp_path / "edges.txt"
+    path.write_text("# no edges yet\n% still none\n\n")
+    graph = DataGraph.load(str(path), cache=False)
+    assert graph.n_vertices == 0 and graph.n_edges == 0
+
+
+def test_header_longer_than_a_chunk(tmp_path):
+    path = tmp_path / "edges.txt"
+    path.write_text("".join(f"# header line {i}\n" for i in range(20)) + "0 1\n1 2 \n% mid comment\n2,0\n")
+    graph = DataGraph.load(str(path), cache=False, chunk_bytes=16)
+    src, dst, _ = graph.edges()
+    assert sorted(zip(src.tolist(), dst.tolist())) == [(0, 1), (1, 2), (2, 0)]
+    assert np.array_equal(graph.degree(), [1, 1, 1])
+
+
+def _load_edges(path):
+    graph = DataGraph.load(path)
+    return graph.indptr.tolist(), graph.indices.tolist()
+
+
+def test_concurrent_loads_share_one_complete_cache(tmp_path):
+    from concurrent.futures import ProcessPoolExecutor
+
+    path = tmp_path / "edges.txt"
+    src, dst = np.random.default_rng(0).integers(0, 500, (2, 5000))
+    path.write_text("".join(f"{a} {b}\n" for a, b in zip(src, dst)))
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(_load_edges, [str(path)] * 8))
+    expected = DataGraph.from_edges(src, dst)
+    assert all(result == (expected.indptr.tolist(), expected.indices.tolist()) for result in results)
+    assert sorted(p.name for p in (tmp_path / "edges.txt.csr").iterdir()) == ["indices.npy", "indptr.npy", "meta.json"]
+    assert _load_edges(str(path)) == results[0]
+
+
+def test_save_replaces_an_older_cache(tmp_path):
+    cache_dir = str(tmp_path / "graph.csr")
+    DataGraph.from_edges([0, 1], [1, 2], weights=[1.0, 2.0]).save(cache_dir, {'version': 1})
+    DataGraph.from_edges([0], [3]).save(cache_dir, {'version': 2})
+    assert DataGraph.open_cache(cache_dir, {'version': 1}) is None
+    graph = DataGraph.open_cache(cache_dir, {'version': 2})
+    assert graph.weights is None and graph.indices.tolist() == [3]
+    assert sorted(p.name for p in (tmp_path / "graph.csr").iterdir()) == ["indices.npy", "indptr.npy", "meta.json", "weights.npy"]
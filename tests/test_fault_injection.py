@@ -0,0 +1,69 @@
+import heapq
+
+import numpy as np
+import pytest
+
+import fault_injection
+from htreevis import Mesh3D, HTree3D
+
+
+def _mesh(dims):
+    noc = Mesh3D()
+    noc.gen_noc_layout(dims, vectorized=True)
+    return noc
+
+
+def _htree(blueprint):
+    noc = HTree3D()
+    noc.gen_noc_layout(blueprint)
+    return noc
+
+
+def _dijkstra(noc, source, failed_links, failed_tiles):
+    """Surviving wire length from one tile to every tile, with a binary heap."""
+    links, lengths, _, tile_routers = noc.link_graph()
+    dead = set(tile_routers[failed_tiles].tolist())
+    adjacent = {}
+    for (a, b), length, failed in zip(links.tolist(), lengths.tolist(), failed_links):
+        if not failed and a not in dead and b not in dead:
+            adjacent.setdefault(a, []).append((b, length))
+            adjacent.setdefault(b, []).append((a, length))
+    best = {int(tile_routers[source]): 0.0}
+    heap = [(0.0, int(tile_routers[source]))]
+    while heap:
+        dist, router = heapq.heappop(heap)
+        if dist > best[router]:
+            continue
+        for neighbour, length in adjacent.get(router, ()):
+            if dist + length < best.get(neighbour, np.inf):
+                best[neighbour] = dist + length
+                heapq.heappush(heap, (dist + length, neighbour))
+    result = np.array([best.get(int(router), np.inf) for router in tile_routers])
+    result[failed_tiles] = np.inf
+    return result
+
+
+@pytest.mark.parametrize("noc", [_mesh((4, 3, 3)), _htree("01201")], ids=["mesh", "htree"])
+def test_shortest_distances_match_dijkstra(noc):
+    rng = np.random.default_rng(3)
+    failed_links, failed_tiles = fault_injection.random_faults(noc, 0.15, 0.3, 0.05, rng)
+    sources = np.setdiff1d(np.arange(noc.tile_count()), failed_tiles)[:6]
+    dist = fault_injection.shortest_distances(noc, sources, failed_links, failed_tiles, 'length', chunk_bytes=4096)
+    for row, source in zip(dist, sources):
+        assert np.allclose(row, _dijkstra(noc, source, failed_links, failed_tiles))
+
+
+def test_fault_free_degradation_is_neutral():
+    result = fault_injection.degradation(_mesh((3, 3, 2)), n_sources=8, rng=0)
+    assert result['connected_fraction'] == 1.0
+    assert np.isclose(result['distance_ratio'], 1.0) and np.isclose(result['energy_ratio'], 1.0)
+
+
+def test_zero_costs_still_measure_length():
+    noc = _mesh((4, 3, 2))
+    failed_links, failed_tiles = fault_injection.random_faults(noc, 0.2, rng=1)
+    costed = fault_injection.degradation(noc, failed_links, failed_tiles, n_sources=8, rng=0)
+    free = fault_injection.degradation(noc, failed_links, failed_tiles, n_sources=8, rng=0, h_cost=0.0, v_cost=0.0)
+    assert np.isfinite(free['avg_distance'])
+    assert np.isclose(free['distance_ratio'], costed['distance_ratio'])
+    assert free['avg_energy'] == 0.0
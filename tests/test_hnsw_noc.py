@@ -0,0 +1,21 @@
+import numpy as np
+
+import hnsw_noc
+from htreevis import Mesh3D
+
+
+def _single_layer_graph(n_nodes, degree, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n_nodes, 4)).astype(np.float32)
+    norms = np.einsum('ij,ij->i', vectors, vectors)
+    table = hnsw_noc._knn_layer(vectors, norms, np.arange(n_nodes), degree, n_nodes, hnsw_noc.CHUNK_BYTES)
+    return hnsw_noc.HNSWGraph(vectors, np.zeros(n_nodes, dtype=np.int64), [table])
+
+
+def test_search_probes_every_node_at_most_once():
+    graph = _single_layer_graph(60, 8)
+    queries = np.random.default_rng(1).standard_normal((40, 4)).astype(np.float32)
+    noc = Mesh3D()
+    noc.gen_noc_layout((2, 2, 2), vectorized=True)
+    result = hnsw_noc.simulate(graph, queries, noc, np.arange(60) % 8, k=5, ef=48)
+    assert result['probes'].max() <= 59
+    assert hnsw_noc.recall(result['ids'], queries, graph.vectors, 5) > 0.9
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from htreevis import Mesh3D, HTree3D, MemoryElement, cross_check_metrics
+
+BLUEPRINTS = ("0", "2", "01", "012", "0120", "00112", "2102")
+MESHES = ((1, 1, 1), (3, 1, 1), (1, 1, 4), (3, 5, 2), (4, 4, 4))
+
+
+def _htree(blueprint):
+    noc = HTree3D()
+    noc.gen_noc_layout(blueprint)
+    return noc
+
+
+def _mesh(dims):
+    noc = Mesh3D()
+    noc.gen_noc_layout(dims, vectorized=True)
+    return noc
+
+
+def _brute_force_avg_distance(noc):
+    tiles = np.arange(noc.tile_count())
+    src, dst = np.repeat(tiles, len(tiles)), np.tile(tiles, len(tiles))
+    dist_h, dist_v = noc.find_distances(src, dst)
+    return float(np.mean(dist_h)), float(np.mean(dist_v))
+
+
+@pytest.mark.parametrize("blueprint", BLUEPRINTS)
+def test_htree_metrics_match_geometry(blueprint):
+    noc = _htree(blueprint)
+    assert cross_check_metrics(noc)['tiles'] == 2**len(blueprint)
+    assert np.allclose(noc.avg_distance(), _brute_force_avg_distance(noc))
+
+
+@pytest.mark.parametrize("dims", MESHES)
+def test_mesh_metrics_match_geometry(dims):
+    noc = _mesh(dims)
+    assert cross_check_metrics(noc)['tiles'] == int(np.prod(dims))
+    assert np.allclose(noc.avg_distance(), _brute_force_avg_distance(noc))
+    assert np.allclose(Mesh3D().avg_distance(dims), noc.avg_distance())
+
+
+@pytest.fixture
+def memory():
+    element = MemoryElement(0, True, (0, 0, 0))
+    element.store(np.arange(12, dtype=np.float32).reshape(6, 2))
+    return element
+
+
+@pytest.mark.parametrize("k", [0, -1])
+def test_find_next_rejects_k_below_one(memory, k):
+    with pytest.raises(ValueError, match="k must be at least 1"):
+        memory.find_next(np.zeros(2), k=k)
+
+
+def test_find_next_caps_k_at_stored_count(memory):
+    ids, distances, _ = memory.find_next(np.zeros(2), k=10)
+    assert ids.shape == distances.shape == (6,)
+    assert list(ids) == [0, 1, 2, 3, 4, 5]
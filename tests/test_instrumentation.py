@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent("""
+    import multiprocessing, os, sys
+    from concurrent.futures import ProcessPoolExecutor
+    import instrumentation
+
+    if __name__ == '__main__':
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context('spawn')) as pool:
+            list(pool.map(instrumentation.count, ['worker'] * 4))
+        print(os.path.exists(os.environ['HTREE_TRACE']))
+        instrumentation.count('parent')
+""")
+
+
+def test_only_the_tracing_process_writes_the_trace(tmp_path):
+    trace = tmp_path / "trace.json"
+    env = {k: v for k, v in os.environ.items() if k != "HTREE_TRACE_OWNER"}
+    env.update(HTREE_TRACE=str(trace), PYTHONPATH=ROOT)
+    script = tmp_path / "run.py"
+    script.write_text(SCRIPT)
+    out = subprocess.run([sys.executable, str(script)], env=env, cwd=tmp_path,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "False"
+    names = {event["name"] for event in json.loads(trace.read_text())["traceEvents"]}
+    assert "parent" in names and "worker" not in names
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import investigate_NOC
+from investigate_NOC import mesh_dimensions, run_record, ResultWriter
+
+
+@pytest.mark.parametrize("n_memories, n_layers", [(0, 1), (16, 0), (16, -2)])
+def test_mesh_dimensions_rejects_empty(n_memories, n_layers):
+    with pytest.raises(ValueError):
+        mesh_dimensions(n_memories, n_layers)
+
+
+def test_bad_record_is_an_error_row():
+    result = run_record({'N_MEMORIES': '1024', 'N_LAYERS': '0'})
+    assert result['error'].startswith('ValueError')
+
+
+def test_data_traffic(tmp_path):
+    edges = tmp_path / "edges.txt"
+    edges.write_text("0 1\n1 2\n2 3\n")
+    result = run_record({'N_MEMORIES': '16', 'N_LAYERS': '1', 'PATH_TO_DATA': str(edges)})
+    assert not result.get('error')
+    assert result['data_edges'] == 3
+    assert result['mesh_traffic_energy'] > 0 and result['htree_traffic_energy'] > 0
+
+
+def test_failed_rows_are_retried(tmp_path):
+    path = tmp_path / "results.jsonl"
+    path.write_text(json.dumps({'record_id': 'ok'}) + "\n" + json.dumps({'record_id': 'bad', 'error': 'boom'}) + "\n")
+    writer = ResultWriter(str(path))
+    writer.close()
+    assert writer.done == {'ok'}
+
+
+def _crash_on_64(record):
+    if record['N_MEMORIES'] == '64':
+        raise ZeroDivisionError("worker crashed")
+    return run_record(record)
+
+
+def test_batch_survives_a_crashing_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(investigate_NOC, 'run_record', _crash_on_64)
+    config = tmp_path / "config.txt"
+    config.write_text("N_MEMORIES, N_LAYERS\n16, 1\n64, 2\n")
+    output = tmp_path / "results.jsonl"
+    investigate_NOC.run_batch([str(config)], str(output), workers=1)
+    rows = {row['N_MEMORIES']: row for row in map(json.loads, output.read_text().splitlines())}
+    assert not rows['16'].get('error')
+    assert rows['64']['error'].startswith('ZeroDivisionError')
+
+
+def test_batch_caches_each_edge_list_before_the_workers_start(tmp_path):
+    edges = tmp_path / "edges.txt"
+    edges.write_text("0 1\n1 2\n2 3\n")
+    config = tmp_path / "config.txt"
+    config.write_text(f"N_MEMORIES, N_LAYERS, PATH_TO_DATA\n16, 1, {edges}\n64, 2, {edges}\n16, 1, {tmp_path / 'missing.txt'}\n")
+    output = tmp_path / "results.jsonl"
+    investigate_NOC.run_batch([str(config)], str(output), workers=2)
+    rows = list(map(json.loads, output.read_text().splitlines()))
+    assert sorted(row['data_edges'] for row in rows if not row.get('error')) == [3, 3]
+    assert [row['error'].split(':')[0] for row in rows if row.get('error')] == ['FileNotFoundError']
+    assert (tmp_path / "edges.txt.csr" / "meta.json").exists()
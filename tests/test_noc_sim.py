@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import noc_sim
+from htreevis import Mesh3D, HTree3D
+
+
+def _mesh(dims):
+    noc = Mesh3D()
+    noc.gen_noc_layout(dims, vectorized=True)
+    return noc
+
+
+def _htree(blueprint):
+    noc = HTree3D()
+    noc.gen_noc_layout(blueprint)
+    return noc
+
+
+@pytest.mark.parametrize("noc", [_mesh((3, 4, 2)), _mesh((1, 1, 1)), _htree("01201")], ids=["mesh", "tile", "htree"])
+def test_routes_walk_links_from_source_to_destination(noc):
+    links, lengths, _, tile_routers = noc.link_graph()
+    tiles = np.arange(noc.tile_count())
+    src, dst = np.repeat(tiles, len(tiles)), np.tile(tiles, len(tiles))
+    ptr, channels = noc_sim.routes(noc, src, dst)
+    dist_h, dist_v = noc.find_distances(src, dst)
+    for packet in range(len(src)):
+        router = tile_routers[src[packet]]
+        length = 0.0
+        for channel in channels[ptr[packet]:ptr[packet + 1]]:
+            link, direction = divmod(int(channel), 2)
+            assert links[link, direction] == router
+            router = links[link, 1 - direction]
+            length += lengths[link]
+        assert router == tile_routers[dst[packet]]
+        assert np.isclose(length, dist_h[packet] + dist_v[packet])
+
+
+def test_permutation_patterns_are_permutations():
+    for noc in (_mesh((4, 4, 2)), _htree("0120")):
+        tiles = np.arange(noc.tile_count())
+        for pattern in ('transpose', 'bitcomplement'):
+            assert np.array_equal(np.sort(noc_sim.permutation_destinations(noc, pattern, tiles)), tiles)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import placement
+from htreevis import DataGraph, Mesh3D, HTree3D
+
+
+def _nocs():
+    htree = HTree3D()
+    htree.gen_noc_layout("012012")
+    mesh = Mesh3D()
+    mesh.gen_noc_layout((4, 4, 4), vectorized=True)
+    return [htree, mesh]
+
+
+def _random_graph(n_vertices, n_edges, seed=0):
+    src, dst = np.random.default_rng(seed).integers(0, n_vertices, (2, n_edges))
+    return DataGraph.from_edges(src, dst, n_vertices=n_vertices, symmetric=True)
+
+
+@pytest.mark.parametrize("noc", _nocs(), ids=["htree", "mesh"])
+def test_empty_graph_places_nothing(noc):
+    graph = DataGraph.from_edges(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), n_vertices=0)
+    result = placement.place(graph, noc)
+    assert len(result['tile_of']) == 0 and result['energy'] == 0.0
+
+
+@pytest.mark.parametrize("noc", _nocs(), ids=["htree", "mesh"])
+def test_small_graph_uses_a_compact_set_of_tiles(noc):
+    tile_of = placement.recursive_bisection(_random_graph(10, 30), noc)
+    assert sorted(tile_of.tolist()) == sorted(placement.bisection_levels(noc)[0][:10].tolist())
+
+
+@pytest.mark.parametrize("noc", _nocs(), ids=["htree", "mesh"])
+def test_placement_is_balanced_and_beats_naive(noc):
+    result = placement.place(_random_graph(200, 800), noc)
+    counts = np.bincount(result['tile_of'], minlength=noc.tile_count())
+    assert counts.min() == 3 and counts.max() == 4
+    assert result['energy'] <= result['bisection_energy'] <= result['naive_energy']
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+import verilog_parse
+
+NETLIST = """\
+// A small two-level design with a bus, a comment and a cell stub.
+module top (a, b, c, y);
+  input [1:0] a;
+  input b, c;
+  output y;
+  wire n1, n2, n3; // nets; one per gate output
+  /* the first level; of gates */
+  NAND2_X1 u1 (.A(a[0]), .B(b), .ZN(n1));
+  NOR2_X1 u2 (.A(a[1]), .B(c), .ZN(n2));
+  AND2_X1 u3 (.A(n1), // first input; from u1
+               .B(n2), /* second; from u2 */ .Z(n3));
+  INV_X1 u4 (.A(n3), .ZN(y));
+  BUF_X1 u5 (.A(n1), .Z());
+  TIE_X1 u6 (.A(1'b0), .Z(unused));
+endmodule
+
+module NAND2_X1 (A, B, ZN);
+  input A, B;
+  output ZN;
+endmodule
+"""
+
+
+def _reference_depth(netlist):
+    """Logic depth by memoized depth-first search over each cell's drivers."""
+    src, dst = netlist.edges()
+    drivers = [[] for _ in range(netlist.n_cells)]
+    for a, b in zip(src.tolist(), dst.tolist()):
+        drivers[b].append(a)
+    depth = {}
+
+    def visit(cell):
+        if cell not in depth:
+            depth[cell] = 1 + max((visit(driver) for driver in drivers[cell]), default=0)
+        return depth[cell]
+
+    return np.array([visit(cell) for cell in range(netlist.n_cells)])
+
+
+def test_parse_small_netlist(tmp_path):
+    path = tmp_path / "top.v"
+    path.write_text(NETLIST)
+    netlist = verilog_parse.parse_netlist(str(path))
+    assert netlist.cell_names == ['u1', 'u2', 'u3', 'u4', 'u5', 'u6']
+    assert netlist.type_names == ['NAND2_X1', 'NOR2_X1', 'AND2_X1', 'INV_X1', 'BUF_X1', 'TIE_X1']
+    assert sorted(netlist.net_names[i] for i in netlist.inputs) == ['a[0]', 'a[1]', 'b', 'c']
+    assert [netlist.net_names[i] for i in netlist.outputs] == ['y']
+    assert sorted(zip(*(side.tolist() for side in netlist.edges()))) == [(0, 2), (0, 4), (1, 2), (2, 3)]
+    assert np.array_equal(netlist.logic_depth(), _reference_depth(netlist))
+    assert netlist.stats()['logic_depth'] == 3
+
+
+def test_chunked_parse_matches_whole_file(tmp_path):
+    path = tmp_path / "top.v"
+    path.write_text(NETLIST)
+    whole = verilog_parse.parse_netlist(str(path), chunk_bytes=len(NETLIST) + 1)
+    for chunk_bytes in range(1, 80):
+        netlist = verilog_parse.parse_netlist(str(path), chunk_bytes=chunk_bytes)
+        assert netlist.cell_names == whole.cell_names
+        assert netlist.net_names == whole.net_names
+        assert np.array_equal(netlist.pin_net, whole.pin_net)
+
+
+def test_block_comment_marker_inside_a_line_comment_does_not_stall_the_cut(tmp_path):
+    assert verilog_parse._statement_cut("// see /* old\na;\nb;\nc (") == len("// see /* old\na;\nb;")
+    assert verilog_parse._statement_cut("a;\nb; // c; /* d") == len("a;\nb;")
+    assert verilog_parse._statement_cut("a; /* b; // c */ d;\n/* e;") == len("a; /* b; // c */ d;")
+
+    path = tmp_path / "chain.v"
+    cells = "".join(f"  BUF_X1 u{i} (.A(n{i}), .Z(n{i + 1}));\n" for i in range(2000))
+    path.write_text(f"module chain (n0, n2000);\n  // see /* old\n  input n0;\n  output n2000;\n{cells}endmodule\n")
+    leftovers = []
+    original = verilog_parse._statement_cut
+
+    def recording_cut(data):
+        cut = original(data)
+        leftovers.append(len(data) - cut)
+        return cut
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(verilog_parse, '_statement_cut', recording_cut)
+        netlist = verilog_parse.parse_netlist(str(path), chunk_bytes=256)
+    assert max(leftovers) < 256
+    assert netlist.n_cells == 2000 and netlist.stats()['logic_depth'] == 2000
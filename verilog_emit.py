@@ -0,0 +1,157 @@
+import argparse
+
+import numpy as np
+
+from htreevis import Mesh3D, HTree3D, _mesh_links
+
+# Instances formatted per write; keeps the pending text small however large the NoC.
+INSTANCES_PER_WRITE = 16384
+# Output file buffer size in bytes.
+WRITE_BUFFER = 2**20
+
+MESH_PORTS = ('XP', 'XM', 'YP', 'YM', 'ZP', 'ZM')
+
+# Port declarations of the cells the netlists instantiate, so a netlist elaborates on its own.
+CELL_LIBRARY = """// Cell interfaces used by generated NoC netlists.
+module MEM_TILE(input clk, input rst, input in, output out);
+endmodule
+
+module NOC_ROUTER_MESH(input clk, input rst,
+	input XP_in, output XP_out, input XM_in, output XM_out,
+	input YP_in, output YP_out, input YM_in, output YM_out,
+	input ZP_in, output ZP_out, input ZM_in, output ZM_out,
+	input L_in, output L_out);
+endmodule
+
+module NOC_ROUTER_HTREE(input clk, input rst,
+	input P_in, output P_out, input C0_in, output C0_out, input C1_in, output C1_out);
+endmodule
+
+"""
+
+
+def _port(name, link, high_end):
+    """
+    Connections of one router port on a link. lf[i] carries link i towards
+    its high end (links[i][1]) and lb[i] towards its low end.
+    """
+    if link < 0:
+        return f".{name}_in(1'b0), .{name}_out()"
+    if high_end:
+        return f".{name}_in(lf[{link}]), .{name}_out(lb[{link}])"
+    return f".{name}_in(lb[{link}]), .{name}_out(lf[{link}])"
+
+
+def _mesh_port_links(noc: Mesh3D, links):
+    """(N,6) link index on each router port in MESH_PORTS order, -1 where the port is unused."""
+    link_axis = noc.link_axis if noc.link_axis is not None else _mesh_links(noc.blueprint)[1]
+    port_links = np.full((noc.tile_count(), 6), -1, dtype=np.int64)
+    ids = np.arange(len(links))
+    for axis in range(3):
+        on_axis = link_axis == axis
+        port_links[links[on_axis, 0], 2 * axis] = ids[on_axis]
+        port_links[links[on_axis, 1], 2 * axis + 1] = ids[on_axis]
+    return port_links
+
+
+def _mesh_instances(noc: Mesh3D, links):
+    """Yield netlist text for the mesh's routers and tiles, INSTANCES_PER_WRITE at a time."""
+    port_links = _mesh_port_links(noc, links)
+    n_tiles = noc.tile_count()
+    for start in range(0, n_tiles, INSTANCES_PER_WRITE):
+        stop = min(start + INSTANCES_PER_WRITE, n_tiles)
+        # Format a port column at a time; rows are then joined without per-port calls.
+        columns = [[_port(name, link, index % 2 == 1) for link in port_links[start:stop, index].tolist()]
+                   for index, name in enumerate(MESH_PORTS)]
+        yield "".join(
+            f"NOC_ROUTER_MESH r{tile} (.clk(clk), .rst(rst), {xp}, {xm}, {yp}, {ym}, {zp}, {zm}, .L_in(tl_out[{tile}]), .L_out(tl_in[{tile}]));\n"
+            f"MEM_TILE m{tile} (.clk(clk), .rst(rst), .in(tl_in[{tile}]), .out(tl_out[{tile}]));\n"
+            for tile, xp, xm, yp, ym, zp, zm in zip(range(start, stop), *columns))
+
+
+def _htree_instances(noc: HTree3D):
+    """
+    Yield netlist text for the H-tree: a router at every junction (heap
+    numbering of HTree3D.link_graph, so router u's parent link is u-1 and
+    its child links are 2u and 2u+1) and a memory tile on every leaf.
+    """
+    n_tiles = noc.tile_count()
+    n_routers = n_tiles - 1
+    for start in range(0, n_routers, INSTANCES_PER_WRITE):
+        stop = min(start + INSTANCES_PER_WRITE, n_routers)
+        yield "".join(
+            f"NOC_ROUTER_HTREE r{router} (.clk(clk), .rst(rst), {_port('P', router - 1, True)}, "
+            f"{_port('C0', 2 * router, False)}, {_port('C1', 2 * router + 1, False)});\n"
+            for router in range(start, stop))
+    for start in range(0, n_tiles, INSTANCES_PER_WRITE):
+        stop = min(start + INSTANCES_PER_WRITE, n_tiles)
+        yield "".join(
+            f"MEM_TILE m{tile} (.clk(clk), .rst(rst), .in(lf[{tile + n_routers - 1}]), .out(lb[{tile + n_routers - 1}]));\n"
+            for tile in range(start, stop))
+
+
+def write_verilog(noc, path, module_name=None, include_cells=True, buffer_size=WRITE_BUFFER):
+    """
+    Write a generated Mesh3D or HTree3D as a structural Verilog netlist.
+
+    Every link of noc.link_graph() becomes a pair of one-bit wires,
+    lf[i] and lb[i], one per direction and indexed by link. Each router
+    and memory tile is one instance. Text is formatted a block of
+    instances at a time and streamed through a buffered file, so memory
+    use stays flat however many tiles there are.
+
+    Returns a dict with the module name and the router, tile and link counts.
+    """
+    links = noc.link_graph()[0]
+    n_tiles = noc.tile_count()
+    is_tree = isinstance(noc, HTree3D)
+    if module_name is None:
+        module_name = f"noc_htree_{noc.blueprint}" if is_tree else "noc_mesh_" + "x".join(str(size) for size in noc.blueprint)
+    n_links = len(links)
+    with open(path, 'w', buffering=buffer_size) as out:
+        if include_cells:
+            out.write(CELL_LIBRARY)
+        out.write(f"module {module_name}(\n\tinput clk,\n\tinput rst);\n\n")
+        out.write("// One wire per link direction: lf[i] runs towards link i's high end, lb[i] back.\n")
+        if n_links:
+            out.write(f"wire [{n_links - 1}:0] lf;\nwire [{n_links - 1}:0] lb;\n")
+        if is_tree:
+            out.write("\n// Junction routers, then memory tiles on the leaves.\n")
+            chunks = _htree_instances(noc)
+        else:
+            out.write(f"wire [{n_tiles - 1}:0] tl_in;\nwire [{n_tiles - 1}:0] tl_out;\n\n// One router and memory tile per grid position.\n")
+            chunks = _mesh_instances(noc, links)
+        for chunk in chunks:
+            out.write(chunk)
+        out.write("\nendmodule\n")
+    return {
+        'module': module_name,
+        'routers': n_tiles - 1 if is_tree else n_tiles,
+        'tiles': n_tiles,
+        'links': n_links,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emit a structural Verilog netlist for a mesh or H-tree NoC.")
+    topology = parser.add_mutually_exclusive_group(required=True)
+    topology.add_argument("--blueprint", help="H-tree blueprint string, e.g. 01201")
+    topology.add_argument("--mesh", type=int, nargs=3, metavar=("X", "Y", "Z"))
+    parser.add_argument("-o", "--output", required=True, help="Netlist file to write")
+    parser.add_argument("--module", default=None, help="Module name (derived from the topology by default)")
+    parser.add_argument("--no-cells", action="store_true", help="Leave out the cell interface declarations")
+    args = parser.parse_args()
+
+    if args.blueprint:
+        noc = HTree3D()
+        noc.gen_noc_layout(args.blueprint)
+    else:
+        noc = Mesh3D()
+        noc.gen_noc_layout(tuple(args.mesh), vectorized=True)
+    summary = write_verilog(noc, args.output, args.module, not args.no_cells)
+    print(f"Wrote {summary['module']} to {args.output}: {summary['routers']} routers, "
+          f"{summary['tiles']} tiles, {summary['links']} links")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import re
+from array import array
+
+import numpy as np
+
+import htreevis
+from htreevis import DataGraph, Mesh3D, HTree3D, CHUNK_BYTES
+import placement
+
+# Pins treated as cell outputs, besides any pin whose name ends in "out".
+OUTPUT_PINS = frozenset(('Y', 'Z', 'ZN', 'Q', 'QN', 'CO', 'OUT'))
+# Statements that are declarations rather than cell instances.
+KEYWORDS = frozenset(('module', 'input', 'output', 'inout', 'wire', 'reg', 'assign', 'parameter', 'localparam', 'supply0', 'supply1', 'tri'))
+
+_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.S)
+# As _COMMENT, plus a block comment opened but not closed.
+_COMMENT_OR_OPEN = re.compile(r'//[^\n]*|/\*.*?\*/|/\*', re.S)
+_INSTANCE = re.compile(r'\s*([A-Za-z_][\w$]*)\s*(?:#\s*\((?:[^()]|\([^()]*\))*\)\s*)?(\\\S+|[A-Za-z_][\w$]*(?:\s*\[\d+\])?)\s*\((.*)\)\s*$', re.S)
+_PIN = re.compile(r'\.([\w$]+)\s*\(\s*([^()]*?)\s*\)')
+_PORT = re.compile(r'\b(input|output|inout)\b\s*(?:wire\s+|reg\s+)?(?:\[\s*(\d+)\s*:\s*(\d+)\s*\]\s*)?([\w$]+(?:\s*,\s*(?!input|output|inout)[\w$]+)*)')
+
+
+def _statement_cut(data):
+    """
+    End of the last complete statement in data: just past the last ';'
+    outside comments and before any comment still open at the end of data
+    (a block comment without its '*/' or a line comment without its
+    newline). Comments are found left to right, as _COMMENT strips them.
+    """
+    cut = position = 0
+    for match in _COMMENT_OR_OPEN.finditer(data):
+        end = data.rfind(';', position, match.start())
+        if end >= 0:
+            cut = end + 1
+        text = match.group()
+        closed = (len(text) >= 4 and text.endswith('*/')) if text.startswith('/*') else match.end() < len(data)
+        if not closed:
+            return cut
+        position = match.end()
+    end = data.rfind(';', position)
+    return end + 1 if end >= 0 else cut
+
+
+def _statements(path, chunk_bytes):
+    """Yield comment-free statements of a Verilog file, reading it chunk_bytes at a time."""
+    leftover = ""
+    with open(path, 'r', errors='replace') as f:
+        while True:
+            block = f.read(chunk_bytes)
+            data = leftover + block
+            if block:
+                cut = _statement_cut(data)
+                data, leftover = data[:cut], data[cut:]
+            text = _COMMENT.sub(' ', data).replace('endmodule', ';')
+            yield from text.split(';')
+            if not block:
+                return
+
+
+def _expand_ports(match):
+    """Net names declared by one input/output match, with bus ranges expanded bit by bit."""
+    names = [name.strip() for name in match.group(4).split(',')]
+    if match.group(2) is None:
+        return names
+    high, low = int(match.group(2)), int(match.group(3))
+    bits = range(min(high, low), max(high, low) + 1)
+    return [f"{name}[{bit}]" for name in names for bit in bits]
+
+
+class GateNetlist:
+    """
+    A flat gate-level netlist held in arrays.
+
+    Cells are numbered in file order with an interned type per cell; nets
+    are numbered by first appearance. Every pin connection is one entry of
+    pin_cell / pin_net / pin_output, so the whole design is a handful of
+    integer arrays rather than a syntax tree.
+    """
+    def __init__(self, cell_names, cell_types, type_names, net_names, pin_cell, pin_net, pin_output, inputs, outputs):
+        self.cell_names = cell_names
+        self.cell_types = cell_types
+        self.type_names = type_names
+        self.net_names = net_names
+        self.pin_cell = pin_cell
+        self.pin_net = pin_net
+        self.pin_output = pin_output
+        self.inputs = inputs    # net ids of the top module's inputs
+        self.outputs = outputs  # net ids of the top module's outputs
+        self._edges = None
+
+    @property
+    def n_cells(self):
+        return len(self.cell_types)
+
+    @property
+    def n_nets(self):
+        return len(self.net_names)
+
+    def net_drivers(self):
+        """Driving cell of every net (-1 for primary inputs and undriven nets)."""
+        drivers = np.full(self.n_nets, -1, dtype=np.int64)
+        drivers[self.pin_net[self.pin_output]] = self.pin_cell[self.pin_output]
+        return drivers
+
+    def edges(self):
+        """Driver-to-sink cell pairs, one per input pin on a net with a driving cell."""
+        if self._edges is None:
+            sinks = ~self.pin_output
+            drivers = self.net_drivers()[self.pin_net[sinks]]
+            driven = drivers >= 0
+            self._edges = (drivers[driven], self.pin_cell[sinks][driven])
+        return self._edges
+
+    def graph(self, symmetric=False):
+        """The cell connectivity as a DataGraph (driver -> sink), e.g. for placement."""
+        src, dst = self.edges()
+        return DataGraph.from_edges(src, dst, n_vertices=self.n_cells, symmetric=symmetric)
+
+    def fanout(self):
+        """(cell fan-out, net fan-out): input pins fed by each cell's outputs and by each net."""
+        net_fanout = np.bincount(self.pin_net[~self.pin_output], minlength=self.n_nets)
+        cell_fanout = np.bincount(self.pin_cell[self.pin_output], net_fanout[self.pin_net[self.pin_output]], self.n_cells)
+        return cell_fanout.astype(np.int64), net_fanout
+
+    def logic_depth(self):
+        """
+        Depth of every cell: 1 for cells fed only by primary inputs, else one
+        more than the deepest driver. Cells are levelized a whole frontier at
+        a time (Kahn's algorithm). Cells on combinational loops keep -1.
+        """
+        src, dst = self.edges()
+        graph = DataGraph.from_edges(src, dst, n_vertices=self.n_cells)
+        remaining = np.bincount(dst, minlength=self.n_cells)
+        depth = np.full(self.n_cells, -1, dtype=np.int64)
+        frontier = np.flatnonzero(remaining == 0)
+        depth[frontier] = 1
+        while len(frontier):
+            starts = graph.indptr[frontier]
+            counts = graph.indptr[frontier + 1] - starts
+            offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+            sinks = graph.indices[offsets]
+            np.maximum.at(depth, sinks, np.repeat(depth[frontier], counts) + 1)
+            np.subtract.at(remaining, sinks, 1)
+            sinks = np.unique(sinks)
+            frontier = sinks[remaining[sinks] == 0]
+        depth[remaining > 0] = -1
+        return depth
+
+    def stats(self):
+        """Cell, net and pin counts, logic depth and fan-out figures, and the cell-type histogram."""
+        depth = self.logic_depth()
+        cell_fanout, net_fanout = self.fanout()
+        type_counts = np.bincount(self.cell_types, minlength=len(self.type_names))
+        return {
+            'cells': self.n_cells,
+            'nets': self.n_nets,
+            'pins': len(self.pin_cell),
+            'edges': len(self.edges()[0]),
+            'logic_depth': int(depth.max(initial=0)),
+            'cyclic_cells': int(np.count_nonzero(depth < 0)),
+            'max_fanout': int(cell_fanout.max(initial=0)),
+            'mean_fanout': float(cell_fanout.mean()) if self.n_cells else 0.0,
+            'max_net_fanout': int(net_fanout.max(initial=0)),
+            'cell_types': {name: int(count) for name, count in zip(self.type_names, type_counts)},
+        }
+
+
+def parse_netlist(path, output_pins=OUTPUT_PINS, chunk_bytes=CHUNK_BYTES):
+    """
+    Stream a flat structural Verilog file into a GateNetlist.
+
+    Statements are cut at ';' and matched one at a time with regular
+    expressions: declarations only contribute the top module's ports;
+    everything else with named pin connections (.PIN(net)) is a cell
+    instance. Pins in output_pins, or ending in "out", drive their net.
+    Constants and unconnected pins are skipped. Ports come from the modules
+    that contain instances, so cell interface stubs in the same file are
+    ignored.
+    """
+    nets = {}
+    types = {}
+    cell_names = []
+    cell_types = array('q')
+    pin_cell, pin_net, pin_output = array('q'), array('q'), array('b')
+    inputs, outputs = [], []
+    module_ports = ([], [])
+    module_has_cells = False
+
+    def net_id(name):
+        index = nets.get(name)
+        if index is None:
+            index = nets[name] = len(nets)
+        return index
+
+    def close_module():
+        if module_has_cells:
+            inputs.extend(net_id(name) for name in module_ports[0])
+            outputs.extend(net_id(name) for name in module_ports[1])
+
+    for statement in _statements(path, chunk_bytes):
+        statement = statement.strip()
+        if not statement:
+            continue
+        keyword = statement.split(None, 1)[0].split('(', 1)[0]
+        if keyword in KEYWORDS:
+            if keyword == 'module':
+                close_module()
+                module_ports = ([], [])
+                module_has_cells = False
+            if keyword in ('module', 'input', 'output', 'inout'):
+                for match in _PORT.finditer(statement):
+                    module_ports[0 if match.group(1) == 'input' else 1].extend(_expand_ports(match))
+            continue
+        match = _INSTANCE.match(statement)
+        if match is None:
+            continue
+        cell_type, cell_name, connections = match.groups()
+        cell = len(cell_names)
+        cell_names.append(cell_name)
+        cell_types.append(types.setdefault(cell_type, len(types)))
+        module_has_cells = True
+        for pin, net in _PIN.findall(connections):
+            if not net or "'" in net or net[0].isdigit():
+                continue
+            for name in (net[1:-1].split(',') if net.startswith('{') else (net,)):
+                name = name.strip().replace(' ', '')
+                if not name or "'" in name:
+                    continue
+                pin_cell.append(cell)
+                pin_net.append(net_id(name))
+                pin_output.append(pin in output_pins or pin.lower().endswith('out'))
+    close_module()
+
+    net_names = [None] * len(nets)
+    for name, index in nets.items():
+        net_names[index] = name
+    return GateNetlist(cell_names, np.frombuffer(cell_types, dtype=np.int64), list(types), net_names,
+                       np.frombuffer(pin_cell, dtype=np.int64), np.frombuffer(pin_net, dtype=np.int64),
+                       np.frombuffer(pin_output, dtype=np.int8).astype(bool),
+                       np.array(inputs, dtype=np.int64), np.array(outputs, dtype=np.int64))
+
+
+def wire_cost(netlist: GateNetlist, noc, tile_of, h_cost=htreevis.H_ENERGY_PER_UNIT, v_cost=htreevis.V_ENERGY_PER_UNIT):
+    """
+    Wire cost of a placement of cells onto NoC tiles: every driver-to-sink
+    connection is charged the topology's distance between the two tiles.
+
+    Returns a dict with total energy, horizontal and vertical wire length,
+    and the share of connections that stay inside one tile.
+    """
+    src, dst = netlist.edges()
+    tile_src, tile_dst = tile_of[src], tile_of[dst]
+    dist_h, dist_v = noc.find_distances(tile_src, tile_dst)
+    return {
+        'energy': noc.traffic_energy((tile_src, tile_dst), h_cost, v_cost),
+        'wire_length_h': float(np.sum(dist_h)),
+        'wire_length_v': float(np.sum(dist_v)),
+        'local_fraction': float(np.mean(tile_src == tile_dst)) if len(src) else 1.0,
+    }
+
+
+def place_netlist(netlist: GateNetlist, noc, refine_passes=1):
+    """Place cells onto the NoC's tiles with placement.place on the undirected cell graph; returns tile_of."""
+    return placement.place(netlist.graph(symmetric=True), noc, refine_passes)['tile_of']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse a flat gate netlist and estimate its wire cost on a NoC.")
+    parser.add_argument("netlist", help="Structural Verilog file")
+    topology = parser.add_mutually_exclusive_group()
+    topology.add_argument("--blueprint", help="H-tree blueprint string, e.g. 01201")
+    topology.add_argument("--mesh", type=int, nargs=3, metavar=("X", "Y", "Z"))
+    args = parser.parse_args()
+
+    netlist = parse_netlist(args.netlist)
+    stats = netlist.stats()
+    print(f"{stats['cells']} cells, {stats['nets']} nets, logic depth {stats['logic_depth']}, "
+          f"max fan-out {stats['max_fanout']} (mean {stats['mean_fanout']:.2f})")
+    if args.blueprint or args.mesh:
+        if args.blueprint:
+            noc = HTree3D()
+            noc.gen_noc_layout(args.blueprint)
+        else:
+            noc = Mesh3D()
+            noc.gen_noc_layout(tuple(args.mesh), vectorized=True)
+        cost = wire_cost(netlist, noc, place_netlist(netlist, noc))
+        print(f"placed on {noc.tile_count()} tiles: energy {cost['energy']:.6g}, "
+              f"{cost['local_fraction']:.1%} of connections stay in one tile")
+
+
+if __name__ == "__main__":
+    main()